@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     ExpenseCategory, Expense, ProfitLossSnapshot, 
-    TaxSettings, AccountingAuditLog, FinancialForecast
+    TaxSettings, AccountingAuditLog, FinancialForecast, ClosedPeriod
 )
 
 @admin.register(ExpenseCategory)
@@ -46,3 +46,9 @@ class FinancialForecastAdmin(admin.ModelAdmin):
     list_display = ['job_type', 'projected_revenue', 'forecast_date', 'created_at']
     list_filter = ['forecast_date', 'created_at']
     search_fields = ['job_type']
+
+@admin.register(ClosedPeriod)
+class ClosedPeriodAdmin(admin.ModelAdmin):
+    list_display = ['period_type', 'period_start', 'period_end', 'closed_at', 'closed_by', 'needs_recompute']
+    list_filter = ['period_type', 'needs_recompute']
+    readonly_fields = ['closed_at', 'last_recomputed_at']
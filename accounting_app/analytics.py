@@ -2,18 +2,68 @@
 Analytics utilities for product and sales person performance tracking
 """
 from django.db.models import Sum, Count, Avg, Q, F
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
-from django.contrib.auth.models import User, Group
-from datetime import datetime, timedelta
+from django.contrib.auth.models import User
+from django.db.models.functions import TruncMonth
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
 from sales_app.models import Invoice, Sale, Product, CashInvoice, CashSale, CashProduct
+from sales_app.rollups import SalesRollup
+from sales_app.catalog import products_by_name, sales_by_product
+from sales_app.cache_utils import SalesCache, CacheNamespace
+from core.jobs import enqueue
+from .periods import PeriodClosing
 from .models import (
     ProductPerformance, SalesPersonPerformance, CashDepartmentPerformance, 
     DepartmentFinancialSnapshot, CashServicePerformance
 )
 
 
+class AnalyticsResultStore:
+    """
+    Memoized analytics results keyed by (metric, period, start, end, data generation).
+
+    The data generation is the current generation of the sales, cash and
+    products cache namespaces, which are bumped whenever invoices, sales or
+    products change. Repeated views of the same period are served from the
+    shared cache, and a result is recomputed only after the data it was
+    built from has changed.
+
+    Whether a result has been written to its performance table is recorded
+    next to it, so a reader that needs the table current persists a result
+    that a read-only caller computed first.
+    """
+    
+    NAMESPACES = [CacheNamespace.SALES, CacheNamespace.CASH, CacheNamespace.PRODUCTS]
+    TIMEOUT = SalesCache.CACHE_TIMEOUT_LONG
+    
+    @classmethod
+    def key(cls, metric, start_date, end_date, period=None):
+        return CacheNamespace.key(
+            cls.NAMESPACES, f'analytics_{metric}_{period or "custom"}_{start_date}_{end_date}'
+        )
+    
+    @classmethod
+    def get_or_compute(cls, metric, start_date, end_date, compute, period=None, on_persist=None):
+        """
+        Return the stored result, or compute, store and return it. With
+        `on_persist`, on_persist(result) is called once per data generation,
+        whether the result was computed here or cached by another caller.
+        """
+        key = cls.key(metric, start_date, end_date, period)
+        result = cache.get(key)
+        if result is None:
+            result = compute()
+            cache.set(key, result, cls.TIMEOUT)
+        if on_persist is not None and not cache.get(f'{key}_persisted'):
+            on_persist(result)
+            cache.set(f'{key}_persisted', True, cls.TIMEOUT)
+        return result
+
+
 class AnalyticsEngine:
     """Core analytics engine for performance calculations"""
     
@@ -42,31 +92,43 @@ class AnalyticsEngine:
     def calculate_product_performance(start_date, end_date, update_db=True):
         """Calculate product performance metrics for a given period"""
         # Get all sales within the date range
-        sales_data = Sale.objects.filter(
-            invoice__date_of_sale__range=[start_date, end_date]
-        ).values('item').annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum('total_price'),
-            avg_price=Avg('unit_price'),
-            sale_count=Count('id'),
-            invoice_count=Count('invoice', distinct=True)
-        ).order_by('-total_revenue')
+        # Grouped on the product key; lines without a product by item name
+        sales_data = sales_by_product(
+            Sale.objects.filter(invoice__date_of_sale__range=[start_date, end_date]),
+            {
+                'total_quantity': Sum('quantity'),
+                'total_revenue': Sum('total_price'),
+                'avg_price': Avg('unit_price'),
+                'sale_count': Count('id'),
+                'invoice_count': Count('invoice', distinct=True),
+            },
+            '-total_revenue',
+        )
+        
+        # Load every product sold in the period with one query per key kind
+        by_id = Product.objects.only('id', 'name', 'price').in_bulk(
+            [item['product_id'] for item in sales_data if item['product_id']]
+        )
+        by_name = products_by_name(
+            [item['item'] for item in sales_data if not item['product_id']], fields=['price']
+        )
         
         performance_data = []
         
         for item_data in sales_data:
             product_name = item_data['item']
-            if not product_name:
-                continue
-                
+            
             # Calculate profit (simplified - using current product cost if available)
-            try:
-                product = Product.objects.get(name=product_name)
+            if item_data['product_id']:
+                product = by_id.get(item_data['product_id'])
+            else:
+                product = by_name.get(product_name)
+            if product is not None:
                 # Assume 30% cost margin for profit calculation if no cost field
                 estimated_cost_per_unit = float(product.price) * 0.7 if product.price else 0
                 total_cost = estimated_cost_per_unit * item_data['total_quantity']
                 total_profit = float(item_data['total_revenue']) - total_cost
-            except Product.DoesNotExist:
+            else:
                 total_profit = float(item_data['total_revenue']) * 0.3  # 30% profit margin estimate
             
             perf_data = {
@@ -81,133 +143,64 @@ class AnalyticsEngine:
             }
             
             performance_data.append(perf_data)
-            
-            # Update database if requested
-            if update_db:
-                ProductPerformance.objects.update_or_create(
-                    product_name=product_name,
-                    period_start=start_date,
-                    period_end=end_date,
-                    defaults=perf_data
-                )
         
-        return performance_data
-    
-    @staticmethod
-    def calculate_salesperson_performance(start_date, end_date, update_db=True):
-        """Calculate sales person performance metrics for a given period"""
-        # Get managers and cashiers
-        managers_group = Group.objects.get(name='Managers')
-        cashiers_group = Group.objects.get(name='Cashiers')
-        
-        sales_users = User.objects.filter(
-            Q(groups=managers_group) | Q(groups=cashiers_group)
-        ).distinct()
+        # One row per product name, the unique key of ProductPerformance
+        performance_data = AnalyticsEngine._merge_by_label(
+            performance_data, 'product_name',
+            sums=['total_quantity_sold', 'total_revenue', 'total_profit', 'number_of_sales'],
+            averages=['average_selling_price'], weight='number_of_sales',
+        )
+        performance_data.sort(key=lambda row: row['total_revenue'], reverse=True)
         
-        performance_data = []
-        
-        for user in sales_users:
-            # Get user's invoices in the period
-            user_invoices = Invoice.objects.filter(
-                user=user,
-                date_of_sale__range=[start_date, end_date]
-            )
-            
-            # Calculate metrics
-            total_sales = user_invoices.aggregate(
-                total_amount=Sum('total'),
-                total_paid=Sum('amount_paid'),
-                invoice_count=Count('id')
-            )
-            
-            # Get total items sold
-            total_items = Sale.objects.filter(
-                invoice__in=user_invoices
-            ).aggregate(
-                item_count=Sum('quantity')
-            )['item_count'] or 0
-            
-            # Calculate averages
-            total_amount = total_sales['total_amount'] or 0
-            invoice_count = total_sales['invoice_count'] or 0
-            avg_sale_value = total_amount / invoice_count if invoice_count > 0 else 0
-            
-            # Calculate conversion rate (paid vs total)
-            paid_invoices = user_invoices.filter(payment_status='paid').count()
-            conversion_rate = (paid_invoices / invoice_count * 100) if invoice_count > 0 else 0
-            
-            # Calculate commission (example: 2% of total sales)
-            commission = total_amount * Decimal('0.02')
-            
-            perf_data = {
-                'user': user,
-                'period_start': start_date,
-                'period_end': end_date,
-                'total_sales_amount': total_amount,
-                'total_invoices': invoice_count,
-                'total_items_sold': total_items,
-                'average_sale_value': Decimal(str(avg_sale_value)),
-                'conversion_rate': Decimal(str(conversion_rate)),
-                'commission_earned': commission,
-            }
-            
-            performance_data.append(perf_data)
-            
-            # Update database if requested
-            if update_db:
-                SalesPersonPerformance.objects.update_or_create(
-                    user=user,
-                    period_start=start_date,
-                    period_end=end_date,
-                    defaults=perf_data
-                )
+        # Update database if requested
+        if update_db:
+            AnalyticsEngine.persist_metric('products', performance_data)
         
         return performance_data
     
     @staticmethod
     def calculate_cash_department_performance(start_date, end_date, update_db=True):
         """Calculate cash department performance metrics for a given period"""
-        # Get managers and cashiers who work with cash department
-        managers_group = Group.objects.get(name='Managers')
-        cashiers_group = Group.objects.get(name='Cashiers')
+        # Managers and cashiers who work with cash department
+        cash_users = AnalyticsEngine._sales_staff()
+        user_ids = [user.id for user in cash_users]
+        
+        # One grouped query per metric family instead of several per user
+        invoice_totals = {
+            row['user']: row
+            for row in CashInvoice.objects.filter(
+                user_id__in=user_ids,
+                date_of_sale__range=[start_date, end_date]
+            ).values('user').annotate(
+                total_amount=Sum('total'),
+                invoice_count=Count('id')
+            ).order_by()
+        }
         
-        cash_users = User.objects.filter(
-            Q(groups=managers_group) | Q(groups=cashiers_group)
-        ).distinct()
+        # Cash sale items, with special tracking for subscriber withdrawals
+        subscriber_filter = Q(item='SUBSCRIBER WITHDRAWAL')
+        item_totals = {
+            row['invoice__user']: row
+            for row in CashSale.objects.filter(
+                invoice__user_id__in=user_ids,
+                invoice__date_of_sale__range=[start_date, end_date]
+            ).values('invoice__user').annotate(
+                transaction_count=Count('id'),
+                sub_amount=Sum('amount', filter=subscriber_filter),
+                sub_count=Count('id', filter=subscriber_filter)
+            ).order_by()
+        }
         
         performance_data = []
         
         for user in cash_users:
-            # Get user's cash invoices in the period
-            user_cash_invoices = CashInvoice.objects.filter(
-                user=user,
-                date_of_sale__range=[start_date, end_date]
-            )
-            
-            # Calculate metrics
-            cash_totals = user_cash_invoices.aggregate(
-                total_amount=Sum('total'),
-                invoice_count=Count('id')
-            )
-            
-            # Get cash sale items
-            cash_sales = CashSale.objects.filter(
-                invoice__in=user_cash_invoices
-            )
-            
-            total_transactions = cash_sales.count()
-            
-            # Special tracking for subscriber withdrawals
-            subscriber_data = cash_sales.filter(
-                item='SUBSCRIBER WITHDRAWAL'
-            ).aggregate(
-                sub_amount=Sum('amount'),
-                sub_count=Count('id')
-            )
+            cash_totals = invoice_totals.get(user.id, {})
+            items = item_totals.get(user.id, {})
             
             # Calculate averages
-            total_amount = cash_totals['total_amount'] or 0
-            invoice_count = cash_totals['invoice_count'] or 0
+            total_amount = cash_totals.get('total_amount') or 0
+            invoice_count = cash_totals.get('invoice_count') or 0
+            total_transactions = items.get('transaction_count') or 0
             avg_transaction_value = total_amount / total_transactions if total_transactions > 0 else 0
             
             # Calculate commission (example: 1% of total cash sales)
@@ -221,21 +214,16 @@ class AnalyticsEngine:
                 'total_cash_invoices': invoice_count,
                 'total_transactions': total_transactions,
                 'average_transaction_value': Decimal(str(avg_transaction_value)),
-                'subscriber_withdrawal_amount': subscriber_data['sub_amount'] or 0,
-                'subscriber_withdrawal_count': subscriber_data['sub_count'] or 0,
+                'subscriber_withdrawal_amount': items.get('sub_amount') or 0,
+                'subscriber_withdrawal_count': items.get('sub_count') or 0,
                 'commission_earned': commission,
             }
             
             performance_data.append(perf_data)
-            
-            # Update database if requested
-            if update_db:
-                CashDepartmentPerformance.objects.update_or_create(
-                    user=user,
-                    period_start=start_date,
-                    period_end=end_date,
-                    defaults=perf_data
-                )
+        
+        # Update database if requested
+        if update_db:
+            AnalyticsEngine.persist_metric('cash_staff', performance_data)
         
         return performance_data
     
@@ -243,22 +231,24 @@ class AnalyticsEngine:
     def calculate_cash_service_performance(start_date, end_date, update_db=True):
         """Calculate performance metrics for each cash department service"""
         # Get all cash services within the date range
-        cash_services_data = CashSale.objects.filter(
-            invoice__date_of_sale__range=[start_date, end_date]
-        ).values('item').annotate(
-            total_amount_processed=Sum('amount'),
-            total_revenue=Sum('total_price'),
-            transaction_count=Count('id'),
-            avg_amount=Avg('amount'),
-            avg_rate=Avg('rate')
-        ).order_by('-total_revenue')
+        cash_services_data = sales_by_product(
+            CashSale.objects.filter(invoice__date_of_sale__range=[start_date, end_date]),
+            {
+                'total_amount_processed': Sum('amount'),
+                'total_revenue': Sum('total_price'),
+                'transaction_count': Count('id'),
+                'avg_amount': Avg('amount'),
+                'avg_rate': Avg('rate'),
+            },
+            '-total_revenue',
+            model=CashProduct,
+            field='cash_product',
+        )
         
         performance_data = []
         
         for service_data in cash_services_data:
             service_name = service_data['item']
-            if not service_name:
-                continue
             
             perf_data = {
                 'service_name': service_name,
@@ -272,50 +262,48 @@ class AnalyticsEngine:
             }
             
             performance_data.append(perf_data)
-            
-            # Update database if requested
-            if update_db:
-                CashServicePerformance.objects.update_or_create(
-                    service_name=service_name,
-                    period_start=start_date,
-                    period_end=end_date,
-                    defaults=perf_data
-                )
+        
+        # One row per service name, the unique key of CashServicePerformance
+        performance_data = AnalyticsEngine._merge_by_label(
+            performance_data, 'service_name',
+            sums=['total_amount_processed', 'total_revenue_generated', 'transaction_count'],
+            averages=['average_transaction_amount', 'average_rate_applied'], weight='transaction_count',
+        )
+        performance_data.sort(key=lambda row: row['total_revenue_generated'], reverse=True)
+        
+        # Update database if requested
+        if update_db:
+            AnalyticsEngine.persist_metric('cash_services', performance_data)
         
         return performance_data
     
     @staticmethod
-    def create_department_financial_snapshot(period_type, start_date, end_date):
-        """Create comprehensive financial snapshot for both departments"""
+    def create_department_financial_snapshot(period_type, start_date, end_date, force=False):
+        """
+        Create comprehensive financial snapshot for both departments.
+        Inside a closed period the stored snapshot is returned as is unless
+        `force` is set.
+        """
         from .models import Expense
         
-        # Regular Sales Department Data
-        regular_invoices = Invoice.objects.filter(
-            date_of_sale__range=[start_date, end_date]
-        )
+        if not force and PeriodClosing.frozen(start_date, end_date):
+            stored = DepartmentFinancialSnapshot.objects.filter(
+                period_type=period_type, period_start=start_date, period_end=end_date
+            ).first()
+            if stored is not None:
+                return stored
         
-        regular_totals = regular_invoices.aggregate(
-            total_revenue=Sum('total'),
-            total_paid=Sum('amount_paid'),
-            invoice_count=Count('id'),
-            paid_count=Count('id', filter=Q(payment_status='paid'))
-        )
-        
-        regular_revenue = regular_totals['total_revenue'] or 0
-        regular_outstanding = (regular_totals['total_revenue'] or 0) - (regular_totals['total_paid'] or 0)
+        # Regular and cash department invoice totals from the daily rollups
+        department_totals = SalesRollup.totals_by_department(start_date, end_date)
+        regular_totals = department_totals['regular']
+        cash_totals = department_totals['cash']
         
-        # Cash Department Data
-        cash_invoices = CashInvoice.objects.filter(
-            date_of_sale__range=[start_date, end_date]
-        )
-        
-        cash_totals = cash_invoices.aggregate(
-            total_revenue=Sum('total'),
-            invoice_count=Count('id')
-        )
+        regular_revenue = regular_totals['total_amount']
+        regular_outstanding = regular_totals['total_amount'] - regular_totals['amount_paid']
         
+        # Cash Department line items
         cash_transactions = CashSale.objects.filter(
-            invoice__in=cash_invoices
+            invoice__date_of_sale__range=[start_date, end_date]
         )
         
         cash_transaction_count = cash_transactions.count()
@@ -334,7 +322,7 @@ class AnalyticsEngine:
         ).aggregate(total=Sum('amount'))['total'] or 0
         
         # Combined metrics
-        cash_revenue = cash_totals['total_revenue'] or 0
+        cash_revenue = cash_totals['total_amount']
         total_revenue = regular_revenue + cash_revenue
         net_profit = total_revenue - total_expenses
         
@@ -344,11 +332,11 @@ class AnalyticsEngine:
             'period_start': start_date,
             'period_end': end_date,
             'regular_revenue': regular_revenue,
-            'regular_invoices_count': regular_totals['invoice_count'] or 0,
-            'regular_paid_invoices': regular_totals['paid_count'] or 0,
+            'regular_invoices_count': regular_totals['invoice_count'],
+            'regular_paid_invoices': regular_totals['paid_count'],
             'regular_outstanding_amount': regular_outstanding,
             'cash_revenue': cash_revenue,
-            'cash_invoices_count': cash_totals['invoice_count'] or 0,
+            'cash_invoices_count': cash_totals['invoice_count'],
             'cash_transactions_count': cash_transaction_count,
             'subscriber_withdrawals_amount': subscriber_data['sub_amount'] or 0,
             'subscriber_withdrawals_count': subscriber_data['sub_count'] or 0,
@@ -367,31 +355,146 @@ class AnalyticsEngine:
         return snapshot
     
     @staticmethod
-    def get_weekly_summary():
-        """Get current week financial summary across all departments"""
+    def build_daily_snapshots(start_date, end_date, period_type=None, force=False, save=True):
+        """
+        Build the 'daily' snapshot for every day in [start_date, end_date], and
+        optionally one `period_type` snapshot for the whole range, from one
+        grouped query per source (sales rollups, cash sale lines, expenses).
+        The range total is the sum of the days. All snapshots are upserted in
+        one statement, or returned unsaved with save=False.
+        
+        Returns (daily_snapshots, period_snapshot or None). Inside a closed
+        period the stored snapshots are returned unless `force` is set.
+        """
+        from .models import Expense
+        
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        
+        if not force and PeriodClosing.frozen(start_date, end_date):
+            stored = AnalyticsEngine._stored_snapshots(days, start_date, end_date, period_type)
+            if stored is not None:
+                return stored
+        
+        figures = {day: dict(AnalyticsEngine.EMPTY_SNAPSHOT_FIGURES) for day in days}
+        
+        # Invoice totals per day and department from the daily rollups
+        for (sale_date, department), totals in SalesRollup.daily_totals_by_department(start_date, end_date).items():
+            day = figures[sale_date]
+            if department == 'regular':
+                day['regular_revenue'] += totals['total_amount']
+                day['regular_invoices_count'] += totals['invoice_count']
+                day['regular_paid_invoices'] += totals['paid_count']
+                day['regular_outstanding_amount'] += totals['total_amount'] - totals['amount_paid']
+            else:
+                day['cash_revenue'] += totals['total_amount']
+                day['cash_invoices_count'] += totals['invoice_count']
+        
+        # Cash department line items, with subscriber withdrawals
+        subscriber_filter = Q(item='SUBSCRIBER WITHDRAWAL')
+        for row in CashSale.objects.filter(
+            invoice__date_of_sale__range=[start_date, end_date]
+        ).values('invoice__date_of_sale').annotate(
+            transaction_count=Count('id'),
+            sub_amount=Sum('amount', filter=subscriber_filter),
+            sub_count=Count('id', filter=subscriber_filter),
+        ).order_by():
+            day = figures[row['invoice__date_of_sale']]
+            day['cash_transactions_count'] = row['transaction_count']
+            day['subscriber_withdrawals_amount'] = row['sub_amount'] or 0
+            day['subscriber_withdrawals_count'] = row['sub_count'] or 0
+        
+        # Expenses per day
+        for row in Expense.objects.filter(
+            date__range=[start_date, end_date]
+        ).values('date').annotate(total=Sum('amount')).order_by():
+            figures[row['date']]['total_expenses'] = row['total'] or 0
+        
+        records = [
+            AnalyticsEngine._snapshot_record('daily', day, day, figures[day])
+            for day in days
+        ]
+        period_record = None
+        if period_type:
+            totals = dict(AnalyticsEngine.EMPTY_SNAPSHOT_FIGURES)
+            for day_figures in figures.values():
+                for name, value in day_figures.items():
+                    totals[name] += value
+            period_record = AnalyticsEngine._snapshot_record(period_type, start_date, end_date, totals)
+        
+        if save:
+            AnalyticsEngine._bulk_upsert(
+                DepartmentFinancialSnapshot,
+                records + ([period_record] if period_record else []),
+                ['period_type', 'period_start', 'period_end'],
+            )
+        return records, period_record
+    
+    EMPTY_SNAPSHOT_FIGURES = {
+        'regular_revenue': Decimal('0'),
+        'regular_invoices_count': 0,
+        'regular_paid_invoices': 0,
+        'regular_outstanding_amount': Decimal('0'),
+        'cash_revenue': Decimal('0'),
+        'cash_invoices_count': 0,
+        'cash_transactions_count': 0,
+        'subscriber_withdrawals_amount': Decimal('0'),
+        'subscriber_withdrawals_count': 0,
+        'total_expenses': Decimal('0'),
+    }
+    
+    @staticmethod
+    def _snapshot_record(period_type, start_date, end_date, figures):
+        total_revenue = figures['regular_revenue'] + figures['cash_revenue']
+        return DepartmentFinancialSnapshot(
+            period_type=period_type,
+            period_start=start_date,
+            period_end=end_date,
+            total_revenue=total_revenue,
+            net_profit=total_revenue - figures['total_expenses'],
+            **figures
+        )
+    
+    @staticmethod
+    def _stored_snapshots(days, start_date, end_date, period_type):
+        """Stored (daily_snapshots, period_snapshot) for the range, or None if any is missing"""
+        lookup = Q(period_type='daily', period_start__range=[start_date, end_date], period_end=F('period_start'))
+        if period_type:
+            lookup |= Q(period_type=period_type, period_start=start_date, period_end=end_date)
+        stored = list(DepartmentFinancialSnapshot.objects.filter(lookup))
+        daily = {s.period_start: s for s in stored if s.period_type == 'daily' and s.period_end == s.period_start}
+        period_snapshot = next(
+            (s for s in stored if s.period_type == period_type
+             and s.period_start == start_date and s.period_end == end_date),
+            None
+        ) if period_type else None
+        if len(daily) < len(days) or (period_type and period_snapshot is None):
+            return None
+        return [daily[day] for day in days], period_snapshot
+    
+    @staticmethod
+    def get_weekly_summary(save=True):
+        """
+        Get current week financial summary across all departments. With
+        save=False the snapshots are computed but not written (the caller
+        queues the write, see accounting_app.tasks).
+        """
         today = timezone.now().date()
         week_start = today - timedelta(days=today.weekday())  # Monday
         week_end = week_start + timedelta(days=6)  # Sunday
         
-        # Create weekly snapshot
-        weekly_snapshot = AnalyticsEngine.create_department_financial_snapshot(
-            'weekly', week_start, week_end
+        # Daily breakdowns and the weekly snapshot (sum of the days) in one batch
+        daily_snapshots, weekly_snapshot = AnalyticsEngine.build_daily_snapshots(
+            week_start, week_end, period_type='weekly', save=save
         )
         
-        # Get daily breakdowns for the week
-        daily_summaries = []
-        current_date = week_start
-        
-        while current_date <= week_end:
-            daily_snapshot = AnalyticsEngine.create_department_financial_snapshot(
-                'daily', current_date, current_date
-            )
-            daily_summaries.append({
-                'date': current_date,
-                'day_name': current_date.strftime('%A'),
-                'snapshot': daily_snapshot
-            })
-            current_date += timedelta(days=1)
+        daily_summaries = [
+            {
+                'date': snapshot.period_start,
+                'day_name': snapshot.period_start.strftime('%A'),
+                'snapshot': snapshot
+            }
+            for snapshot in daily_snapshots
+        ]
         
         return {
             'weekly_snapshot': weekly_snapshot,
@@ -400,88 +503,90 @@ class AnalyticsEngine:
             'week_end': week_end
         }
     
+    REVENUE_DEPARTMENTS = ('regular', 'cash', 'all')
+    
     @staticmethod
-    def generate_analytics_summary(period='this_month'):
-        """Generate a comprehensive analytics summary for the given period"""
-        date_ranges = AnalyticsEngine.get_date_ranges()
-        start_date, end_date = date_ranges.get(period, date_ranges['this_month'])
-        
-        # Get department financial snapshot
-        snapshot = AnalyticsEngine.create_department_financial_snapshot(
-            'monthly' if 'month' in period else 'daily',
-            start_date, 
-            end_date
+    def monthly_revenue(months=12, end_date=None, department='regular'):
+        """
+        Revenue per calendar month for the last `months` months up to and
+        including the month of `end_date`, oldest first, from one TruncMonth
+        query over the daily sales rollups. Months without sales are included
+        with zero revenue.
+        """
+        if department not in AnalyticsEngine.REVENUE_DEPARTMENTS:
+            raise ValueError(f"department must be one of {', '.join(AnalyticsEngine.REVENUE_DEPARTMENTS)}")
+        end_date = end_date or timezone.now().date()
+        
+        month_starts = []
+        year, month = end_date.year, end_date.month
+        for _ in range(months):
+            month_starts.insert(0, date(year, month, 1))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        start_date = month_starts[0]
+        
+        def compute():
+            rows = SalesRollup.filter(
+                start_date, end_date, department=None if department == 'all' else department
+            ).annotate(month=TruncMonth('date')).values('month').annotate(revenue=Sum('total_amount'))
+            revenue = {row['month']: row['revenue'] or Decimal('0') for row in rows}
+            
+            series = []
+            for month_start in month_starts:
+                next_month = (month_start + timedelta(days=32)).replace(day=1)
+                series.append({
+                    'month': month_start.strftime('%B %Y'),
+                    'month_start': month_start,
+                    'month_end': min(next_month - timedelta(days=1), end_date),
+                    'revenue': float(revenue.get(month_start, 0)),  # float for JavaScript
+                })
+            return series
+        
+        return AnalyticsResultStore.get_or_compute(
+            f'monthly_revenue_{department}', start_date, end_date, compute, period=f'{months}_months'
         )
-        
-        # Get top performers
-        top_products = AnalyticsEngine.calculate_product_performance(
-            start_date, end_date, update_db=False
-        )[:5]
-        
-        top_cash_services = AnalyticsEngine.calculate_cash_service_performance(
-            start_date, end_date, update_db=False
-        )[:5]
-        
-        staff_performance = AnalyticsEngine.calculate_salesperson_performance(
-            start_date, end_date, update_db=False
-        )[:5]
-        
-        cash_staff_performance = AnalyticsEngine.calculate_cash_department_performance(
-            start_date, end_date, update_db=False
-        )[:5]
-        
-        return {
-            'period': period,
-            'start_date': start_date,
-            'end_date': end_date,
-            'financial_snapshot': snapshot,
-            'top_products': top_products,
-            'top_cash_services': top_cash_services,
-            'staff_performance': staff_performance,
-            'cash_staff_performance': cash_staff_performance,
-        }
     
     @staticmethod
     def calculate_salesperson_performance(start_date, end_date, update_db=True):
         """Calculate sales person performance metrics for a given period"""
         # Get managers and cashiers
-        managers_group = Group.objects.get(name='Managers')
-        cashiers_group = Group.objects.get(name='Cashiers')
+        sales_users = AnalyticsEngine._sales_staff()
+        user_ids = [user.id for user in sales_users]
+        
+        # One grouped query per metric family instead of several per user
+        invoice_totals = {
+            row['user']: row
+            for row in Invoice.objects.filter(
+                user_id__in=user_ids,
+                date_of_sale__range=[start_date, end_date]
+            ).values('user').annotate(
+                total_amount=Sum('total'),
+                invoice_count=Count('id'),
+                paid_count=Count('id', filter=Q(payment_status='paid'))
+            ).order_by()
+        }
         
-        sales_users = User.objects.filter(
-            Q(groups=managers_group) | Q(groups=cashiers_group)
-        ).distinct()
+        # Total items sold per user
+        items_sold = dict(
+            Sale.objects.filter(
+                invoice__user_id__in=user_ids,
+                invoice__date_of_sale__range=[start_date, end_date]
+            ).values('invoice__user').annotate(
+                item_count=Sum('quantity')
+            ).order_by().values_list('invoice__user', 'item_count')
+        )
         
         performance_data = []
         
         for user in sales_users:
-            # Get user's invoices in the period
-            user_invoices = Invoice.objects.filter(
-                user=user,
-                date_of_sale__range=[start_date, end_date]
-            )
-            
-            # Calculate metrics
-            total_sales = user_invoices.aggregate(
-                total_amount=Sum('total'),
-                total_paid=Sum('amount_paid'),
-                invoice_count=Count('id')
-            )
-            
-            # Get total items sold
-            total_items = Sale.objects.filter(
-                invoice__in=user_invoices
-            ).aggregate(
-                item_count=Sum('quantity')
-            )['item_count'] or 0
+            total_sales = invoice_totals.get(user.id, {})
             
             # Calculate averages
-            total_amount = total_sales['total_amount'] or 0
-            invoice_count = total_sales['invoice_count'] or 0
+            total_amount = total_sales.get('total_amount') or 0
+            invoice_count = total_sales.get('invoice_count') or 0
             avg_sale_value = total_amount / invoice_count if invoice_count > 0 else 0
             
             # Calculate conversion rate (paid vs total)
-            paid_invoices = user_invoices.filter(payment_status='paid').count()
+            paid_invoices = total_sales.get('paid_count') or 0
             conversion_rate = (paid_invoices / invoice_count * 100) if invoice_count > 0 else 0
             
             # Calculate commission (example: 2% of total sales)
@@ -493,25 +598,163 @@ class AnalyticsEngine:
                 'period_end': end_date,
                 'total_sales_amount': total_amount,
                 'total_invoices': invoice_count,
-                'total_items_sold': total_items,
+                'total_items_sold': items_sold.get(user.id) or 0,
                 'average_sale_value': Decimal(str(avg_sale_value)),
                 'conversion_rate': Decimal(str(conversion_rate)),
                 'commission_earned': commission,
             }
             
             performance_data.append(perf_data)
-            
-            # Update database if requested
-            if update_db:
-                perf_obj, created = SalesPersonPerformance.objects.update_or_create(
-                    user=user,
-                    period_start=start_date,
-                    period_end=end_date,
-                    defaults=perf_data
-                )
+        
+        # Update database if requested
+        if update_db:
+            AnalyticsEngine.persist_metric('salespeople', performance_data)
         
         return sorted(performance_data, key=lambda x: x['total_sales_amount'], reverse=True)
     
+    @staticmethod
+    def _sales_staff():
+        """Managers and cashiers, in one query"""
+        return list(
+            User.objects.filter(groups__name__in=['Managers', 'Cashiers']).distinct().order_by('id')
+        )
+    
+    @staticmethod
+    def _merge_by_label(rows, label, sums, averages, weight):
+        """
+        Combine rows sharing `label` into one: `sums` are added and `averages` weighted by `weight`.
+        sales_by_product groups on the product key, so two products with one
+        name (or linked and unlinked lines of a name) arrive as separate rows.
+        """
+        merged = {}
+        for row in rows:
+            current = merged.get(row[label])
+            if current is None:
+                merged[row[label]] = dict(row)
+                continue
+            combined_weight = current[weight] + row[weight]
+            for name in averages:
+                current[name] = (
+                    (current[name] * current[weight] + row[name] * row[weight]) / combined_weight
+                    if combined_weight else 0
+                )
+            for name in sums:
+                current[name] += row[name]
+        return list(merged.values())
+    
+    @staticmethod
+    def _bulk_upsert(model, records, unique_fields):
+        """
+        Insert or update `records` in one statement per batch
+        (INSERT ... ON CONFLICT (unique_fields) DO UPDATE)
+        """
+        if not records:
+            return
+        update_fields = [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in unique_fields
+            and not getattr(field, 'auto_now_add', False)
+        ]
+        model.objects.bulk_create(
+            records,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
+        )
+    
+    # === RESULT STORE (read path) / PERSISTENCE (write path) ===
+    
+    # metric -> (calculator, performance model, unique fields)
+    METRICS = {
+        'products': ('calculate_product_performance', ProductPerformance,
+                     ['product_name', 'period_start', 'period_end']),
+        'salespeople': ('calculate_salesperson_performance', SalesPersonPerformance,
+                        ['user', 'period_start', 'period_end']),
+        'cash_staff': ('calculate_cash_department_performance', CashDepartmentPerformance,
+                       ['user', 'period_start', 'period_end']),
+        'cash_services': ('calculate_cash_service_performance', CashServicePerformance,
+                          ['service_name', 'period_start', 'period_end']),
+    }
+    
+    # Order of the rows returned by each calculator
+    METRIC_ORDERING = {
+        'products': ['-total_revenue', 'product_name'],
+        'salespeople': ['-total_sales_amount', 'user_id'],
+        'cash_staff': ['user_id'],
+        'cash_services': ['-total_revenue_generated', 'service_name'],
+    }
+    
+    @staticmethod
+    def get_metric(metric, start_date, end_date, period=None, persist=False):
+        """
+        Read path: return the performance rows for `metric` over the period,
+        served from AnalyticsResultStore while the underlying data is
+        unchanged. With persist=True the rows are written to the performance
+        table once per data generation, including when a non-persisting
+        caller cached them first; persist='background' queues that write as
+        a job instead.
+        """
+        if PeriodClosing.frozen(start_date, end_date):
+            # Closed period: serve the frozen rows
+            stored = AnalyticsEngine.stored_metric(metric, start_date, end_date)
+            if stored:
+                return stored
+            persist = True
+        
+        calculator = getattr(AnalyticsEngine, AnalyticsEngine.METRICS[metric][0])
+        on_persist = None
+        if persist == 'background':
+            def on_persist(data):
+                enqueue('accounting.refresh_metric', unique=True,
+                        metric=metric, start_date=start_date, end_date=end_date)
+        elif persist:
+            on_persist = lambda data: AnalyticsEngine.persist_metric(metric, data)
+        return AnalyticsResultStore.get_or_compute(
+            metric, start_date, end_date,
+            lambda: calculator(start_date, end_date, update_db=False),
+            period=period,
+            on_persist=on_persist,
+        )
+    
+    @staticmethod
+    def stored_metric(metric, start_date, end_date):
+        """Persisted rows for `metric` over exactly this range, in the shape the calculators return"""
+        _, model, _ = AnalyticsEngine.METRICS[metric]
+        queryset = model.objects.filter(period_start=start_date, period_end=end_date)
+        if any(field.name == 'user' for field in model._meta.concrete_fields):
+            queryset = queryset.select_related('user')
+        skip = {'id', 'last_updated', 'performance_rating'}
+        fields = [field.name for field in model._meta.concrete_fields if field.name not in skip]
+        return [
+            {name: getattr(record, name) for name in fields}
+            for record in queryset.order_by(*AnalyticsEngine.METRIC_ORDERING[metric])
+        ]
+    
+    @staticmethod
+    def refresh_metric(metric, start_date, end_date):
+        """Recompute and replace the persisted rows for `metric` over this range"""
+        _, model, _ = AnalyticsEngine.METRICS[metric]
+        calculator = getattr(AnalyticsEngine, AnalyticsEngine.METRICS[metric][0])
+        with transaction.atomic():
+            performance_data = calculator(start_date, end_date, update_db=False)
+            model.objects.filter(period_start=start_date, period_end=end_date).delete()
+            AnalyticsEngine.persist_metric(metric, performance_data)
+        return performance_data
+    
+    @staticmethod
+    def persist_metric(metric, performance_data):
+        """Write path: upsert computed rows for `metric` into its performance table"""
+        _, model, unique_fields = AnalyticsEngine.METRICS[metric]
+        records = []
+        for perf_data in performance_data:
+            record = model(**perf_data)
+            if model is SalesPersonPerformance:
+                # bulk_create skips SalesPersonPerformance.save()
+                record.performance_rating = record.calculate_performance_rating()
+            records.append(record)
+        AnalyticsEngine._bulk_upsert(model, records, unique_fields)
+    
     @staticmethod
     def get_top_products(period='this_month', limit=10):
         """Get top performing products"""
@@ -562,9 +805,10 @@ class AnalyticsEngine:
         date_ranges = AnalyticsEngine.get_date_ranges()
         start_date, end_date = date_ranges.get(period, date_ranges['this_month'])
         
-        # Update performance data
-        product_data = AnalyticsEngine.calculate_product_performance(start_date, end_date)
-        salesperson_data = AnalyticsEngine.calculate_salesperson_performance(start_date, end_date)
+        # Served from the result store; performance tables are only written
+        # when the underlying data changed since the last computation
+        product_data = AnalyticsEngine.get_metric('products', start_date, end_date, period, persist=True)
+        salesperson_data = AnalyticsEngine.get_metric('salespeople', start_date, end_date, period, persist=True)
         
         # Get summaries
         total_revenue = sum(item['total_revenue'] for item in product_data)
@@ -599,11 +843,11 @@ class AnalyticsEngine:
         """Get product performance data for a given period"""
         date_ranges = AnalyticsEngine.get_date_ranges()
         start_date, end_date = date_ranges.get(period, date_ranges['this_month'])
-        return AnalyticsEngine.calculate_product_performance(start_date, end_date)
+        return AnalyticsEngine.get_metric('products', start_date, end_date, period, persist=True)
     
     @staticmethod
     def get_salesperson_performance(period='this_month'):
         """Get salesperson performance data for a given period"""
         date_ranges = AnalyticsEngine.get_date_ranges()
         start_date, end_date = date_ranges.get(period, date_ranges['this_month'])
-        return AnalyticsEngine.calculate_salesperson_performance(start_date, end_date)
+        return AnalyticsEngine.get_metric('salespeople', start_date, end_date, period, persist=True)
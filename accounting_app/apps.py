@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AccountingAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounting_app'
+
+    def ready(self):
+        """Import signal handlers when the app is ready"""
+        import accounting_app.signals
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounting_app.models import ClosedPeriod
+from accounting_app.periods import PeriodClosing
+
+
+class Command(BaseCommand):
+    help = 'Close completed months/weeks (freezing their analytics) and recompute closed periods flagged by late edits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=1,
+                            help='Close the last N completed months (default: 1)')
+        parser.add_argument('--weeks', type=int, default=0,
+                            help='Close the last N completed weeks (default: 0)')
+        parser.add_argument('--recompute', action='store_true',
+                            help='Only recompute closed periods flagged by late edits')
+
+    def handle(self, *args, **options):
+        if options['months'] < 0 or options['weeks'] < 0:
+            raise CommandError('--months and --weeks must not be negative')
+
+        if not options['recompute']:
+            today = timezone.now().date()
+            periods = []
+
+            month_start, _ = PeriodClosing.month_bounds(today)
+            for _ in range(options['months']):
+                month_start, month_end = PeriodClosing.month_bounds(month_start - timedelta(days=1))
+                periods.append(('monthly', month_start, month_end))
+
+            week_start, _ = PeriodClosing.week_bounds(today)
+            for _ in range(options['weeks']):
+                week_start, week_end = PeriodClosing.week_bounds(week_start - timedelta(days=1))
+                periods.append(('weekly', week_start, week_end))
+
+            for period_type, start, end in periods:
+                if ClosedPeriod.objects.filter(period_type=period_type, period_start=start, period_end=end).exists():
+                    self.stdout.write(f'{period_type.title()} {start} to {end} already closed')
+                    continue
+                PeriodClosing.close(period_type, start, end)
+                self.stdout.write(self.style.SUCCESS(f'Closed {period_type} period {start} to {end}'))
+
+        recomputed = PeriodClosing.recompute_flagged()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {recomputed} flagged period(s)'))
@@ -1,23 +1,12 @@
 from django.core.management.base import BaseCommand
-from sales_app.models import Invoice
+from sales_app.payment_status import PaymentStatusSweeper
 
 class Command(BaseCommand):
     help = 'Update payment status for all invoices based on amount paid'
 
     def handle(self, *args, **options):
-        invoices = Invoice.objects.all()
-        updated_count = 0
-        
-        for invoice in invoices:
-            old_status = invoice.payment_status
-            invoice.update_payment_status()
-            
-            if old_status != invoice.payment_status:
-                invoice.save()
-                updated_count += 1
-                self.stdout.write(
-                    f"Updated {invoice.invoice_no}: {old_status} -> {invoice.payment_status}"
-                )
+        # One UPDATE over all invoices instead of loading and saving each one
+        updated_count = PaymentStatusSweeper.recompute()
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully updated {updated_count} invoice(s)')
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting_app', '0004_cashserviceperformance_departmentfinancialsnapshot_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClosedPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_type', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly')], default='monthly', max_length=10)),
+                ('period_start', models.DateField(db_index=True)),
+                ('period_end', models.DateField(db_index=True)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('needs_recompute', models.BooleanField(db_index=True, default=False, help_text='Set when invoices, sales or expenses in the period change after closing')),
+                ('last_recomputed_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closed_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-period_start', 'period_type'],
+                'indexes': [models.Index(fields=['period_start', 'period_end'], name='accounting__period__9bb225_idx')],
+                'unique_together': {('period_type', 'period_start', 'period_end')},
+            },
+        ),
+    ]
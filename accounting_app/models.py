@@ -328,4 +328,35 @@ class CashServicePerformance(models.Model):
         """Calculate effective rate (revenue/amount processed)"""
         if self.total_amount_processed > 0:
             return (self.total_revenue_generated / self.total_amount_processed) * 100
-        return 0
\ No newline at end of file
+        return 0
+
+class ClosedPeriod(models.Model):
+    """
+    A closed reporting period. Performance rows and financial snapshots whose
+    range lies inside a closed period are served as stored; they are only
+    recomputed after a late edit to data in the period sets needs_recompute
+    (see accounting_app.periods).
+    """
+    PERIOD_TYPES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+    
+    period_type = models.CharField(max_length=10, choices=PERIOD_TYPES, default='monthly')
+    period_start = models.DateField(db_index=True)
+    period_end = models.DateField(db_index=True)
+    closed_at = models.DateTimeField(auto_now_add=True)
+    closed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='closed_periods')
+    needs_recompute = models.BooleanField(default=False, db_index=True,
+                                          help_text="Set when invoices, sales or expenses in the period change after closing")
+    last_recomputed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ['period_type', 'period_start', 'period_end']
+        ordering = ['-period_start', 'period_type']
+        indexes = [
+            models.Index(fields=['period_start', 'period_end']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_period_type_display()} {self.period_start} to {self.period_end} (closed)"
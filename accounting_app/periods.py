@@ -0,0 +1,176 @@
+"""
+Period closing: freeze analytics for past weeks/months and recompute them
+only when late edits touch a closed period
+"""
+import logging
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from sales_app.cache_utils import CacheNamespace
+from sales_app.invalidation import CacheInvalidator
+from .models import ClosedPeriod, DepartmentFinancialSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodClosing:
+    """
+    Closing a period computes and stores its department snapshot and
+    performance rows once. Afterwards any analytics request for a range
+    inside the period reads the stored rows (an index lookup) instead of
+    recomputing them.
+
+    Late edits to invoices, sales or expenses dated inside a closed period
+    flag it with needs_recompute; the next read (or `close_periods
+    --recompute`) refreshes the stored results for that period only.
+    """
+
+    # === PERIOD HELPERS ===
+
+    @staticmethod
+    def month_bounds(day):
+        start = day.replace(day=1)
+        return start, start.replace(day=monthrange(start.year, start.month)[1])
+
+    @staticmethod
+    def week_bounds(day):
+        start = day - timedelta(days=day.weekday())  # Monday
+        return start, start + timedelta(days=6)
+
+    @classmethod
+    def closed_through(cls):
+        """Latest period_end of any closed period (cached), or None if nothing is closed"""
+        key = CacheNamespace.key(CacheNamespace.ACCOUNTING, 'closed_through')
+        value = cache.get(key)
+        if value is None:
+            latest = ClosedPeriod.objects.aggregate(latest=Max('period_end'))['latest']
+            value = latest.isoformat() if latest else ''
+            cache.set(key, value, None)
+        return date.fromisoformat(value) if value else None
+
+    # === CLOSING ===
+
+    @classmethod
+    def close(cls, period_type, period_start, period_end, user=None):
+        """Compute and freeze the results of a period. Returns the ClosedPeriod."""
+        with transaction.atomic():
+            closed, created = ClosedPeriod.objects.get_or_create(
+                period_type=period_type,
+                period_start=period_start,
+                period_end=period_end,
+                defaults={'closed_by': user},
+            )
+            cls._recompute(closed, snapshot_types={period_type})
+            CacheInvalidator.mark(CacheNamespace.ACCOUNTING)
+        logger.info(f"Closed {period_type} period {period_start} to {period_end}")
+        return closed
+
+    @classmethod
+    def reopen(cls, period_type, period_start, period_end):
+        with transaction.atomic():
+            deleted, _ = ClosedPeriod.objects.filter(
+                period_type=period_type, period_start=period_start, period_end=period_end
+            ).delete()
+            CacheInvalidator.mark(CacheNamespace.ACCOUNTING)
+        return bool(deleted)
+
+    # === READS ===
+
+    @classmethod
+    def frozen(cls, start_date, end_date):
+        """
+        Return the closed period containing [start_date, end_date], refreshing
+        its stored results first if late edits flagged it; None when the range
+        is not inside a closed period.
+        """
+        closed_through = cls.closed_through()
+        if closed_through is None or end_date > closed_through:
+            return None
+
+        containing = list(ClosedPeriod.objects.filter(
+            period_start__lte=start_date, period_end__gte=end_date
+        ).order_by('period_start'))
+        for closed in containing:
+            if closed.needs_recompute:
+                cls.recompute(closed)
+        return containing[0] if containing else None
+
+    # === LATE EDITS ===
+
+    @classmethod
+    def mark_dirty(cls, *dates):
+        """Flag closed periods containing any of `dates` for recomputation"""
+        closed_through = cls.closed_through()
+        if closed_through is None:
+            return 0
+
+        flagged = 0
+        for day in {d for d in dates if d is not None}:
+            if isinstance(day, datetime):
+                day = day.date()
+            if day > closed_through:
+                continue
+            flagged += ClosedPeriod.objects.filter(
+                period_start__lte=day, period_end__gte=day, needs_recompute=False
+            ).update(needs_recompute=True)
+        return flagged
+
+    @classmethod
+    def recompute(cls, closed):
+        """Refresh the stored results of a flagged period"""
+        with transaction.atomic():
+            # Lock the row so concurrent readers do not recompute twice
+            closed = ClosedPeriod.objects.select_for_update().get(pk=closed.pk)
+            if not closed.needs_recompute:
+                return closed
+            cls._recompute(closed)
+        logger.info(f"Recomputed closed period {closed.period_start} to {closed.period_end}")
+        return closed
+
+    @classmethod
+    def recompute_flagged(cls):
+        """Recompute every flagged period. Returns the number of periods refreshed."""
+        periods = list(ClosedPeriod.objects.filter(needs_recompute=True))
+        for closed in periods:
+            cls.recompute(closed)
+        return len(periods)
+
+    @classmethod
+    def _recompute(cls, closed, snapshot_types=()):
+        """
+        Rebuild every stored snapshot and performance range lying inside the
+        period (plus snapshots of `snapshot_types` for the period itself).
+        """
+        from .analytics import AnalyticsEngine
+
+        start, end = closed.period_start, closed.period_end
+
+        snapshots = set(
+            DepartmentFinancialSnapshot.objects.filter(
+                period_start__gte=start, period_end__lte=end
+            ).values_list('period_type', 'period_start', 'period_end')
+        )
+        snapshots.update((period_type, start, end) for period_type in snapshot_types)
+        for period_type, snapshot_start, snapshot_end in sorted(snapshots):
+            AnalyticsEngine.create_department_financial_snapshot(
+                period_type, snapshot_start, snapshot_end, force=True
+            )
+
+        for metric, (_, model, _) in AnalyticsEngine.METRICS.items():
+            ranges = set(
+                model.objects.filter(
+                    period_start__gte=start, period_end__lte=end
+                ).values_list('period_start', 'period_end').distinct()
+            )
+            ranges.add((start, end))
+            for range_start, range_end in ranges:
+                AnalyticsEngine.refresh_metric(metric, range_start, range_end)
+
+        closed.needs_recompute = False
+        closed.last_recomputed_at = timezone.now()
+        closed.save(update_fields=['needs_recompute', 'last_recomputed_at'])
@@ -0,0 +1,144 @@
+"""
+Outstanding invoices (accounts receivable): totals and aging buckets computed
+in the database from the stored Invoice.balance_due column, per customer and
+per salesperson, and a keyset-paginated list of open invoices
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from core.pagination import KeysetPaginator
+from sales_app.cache_utils import CacheNamespace, SalesCache
+from sales_app.models import Invoice
+
+
+class Receivables:
+    """
+    Open invoices are those still 'unpaid', 'partial' or 'overdue'. Their age
+    is counted from the date of sale. Partial indexes on open invoices
+    (date, customer + date, salesperson + date) keep every query here to
+    the open rows only.
+
+    Summaries are cached in the sales namespace, which every invoice save
+    or delete (including payments) bumps, and are keyed by the as-of date so
+    invoices move between buckets from one day to the next.
+    """
+
+    OUTSTANDING_STATUSES = ('unpaid', 'partial', 'overdue')
+
+    # (key, label, min days, max days or None)
+    AGING_BUCKETS = [
+        ('current', '0-30 days', 0, 30),
+        ('days_31_60', '31-60 days', 31, 60),
+        ('days_61_90', '61-90 days', 61, 90),
+        ('days_over_90', '90+ days', 91, None),
+    ]
+
+    # values() fields identifying each row of aging_by()
+    GROUPINGS = {
+        'customer': ('customer_name',),
+        'salesperson': ('user', 'user__username', 'user__first_name', 'user__last_name'),
+    }
+
+    LIST_ORDERING = ('-date_of_sale', '-id')
+    PAGE_SIZE = 50
+
+    @classmethod
+    def outstanding(cls):
+        return Invoice.objects.filter(payment_status__in=cls.OUTSTANDING_STATUSES)
+
+    @classmethod
+    def aging_filters(cls, as_of=None):
+        """{bucket key: Q on date_of_sale} for the aging buckets as of `as_of`"""
+        as_of = as_of or timezone.now().date()
+        filters = {}
+        for key, _, min_days, max_days in cls.AGING_BUCKETS:
+            condition = Q(date_of_sale__lte=as_of - timedelta(days=min_days))
+            if max_days is not None:
+                condition &= Q(date_of_sale__gte=as_of - timedelta(days=max_days))
+            filters[key] = condition
+        return filters
+
+    @classmethod
+    def _aggregates(cls, as_of):
+        aggregates = {
+            'count': Count('id'),
+            'total_outstanding': Sum('balance_due'),
+            'overdue_count': Count('id', filter=Q(payment_status='overdue')),
+            'old_count': Count('id', filter=Q(date_of_sale__lte=as_of - timedelta(days=30))),
+        }
+        for key, condition in cls.aging_filters(as_of).items():
+            aggregates[f'{key}_count'] = Count('id', filter=condition)
+            aggregates[f'{key}_amount'] = Sum('balance_due', filter=condition)
+        return aggregates
+
+    @classmethod
+    def _clean(cls, row):
+        return {
+            'count': row['count'],
+            'total_outstanding': row['total_outstanding'] or Decimal('0'),
+            'overdue_count': row['overdue_count'],
+            'old_count': row['old_count'],
+            'aging': [
+                {
+                    'key': key,
+                    'label': label,
+                    'count': row[f'{key}_count'],
+                    'amount': row[f'{key}_amount'] or Decimal('0'),
+                }
+                for key, label, _, _ in cls.AGING_BUCKETS
+            ],
+        }
+
+    @classmethod
+    def summary(cls, as_of=None):
+        """
+        Outstanding count and amount, overdue and 30+ day counts, and the
+        amount/count per aging bucket, in a single aggregate query (cached).
+        """
+        as_of = as_of or timezone.now().date()
+        key = CacheNamespace.key(CacheNamespace.SALES, f'ar_summary_{as_of}')
+        result = cache.get(key)
+        if result is None:
+            result = cls._clean(cls.outstanding().aggregate(**cls._aggregates(as_of)))
+            cache.set(key, result, SalesCache.CACHE_TIMEOUT_MEDIUM)
+        return result
+
+    @classmethod
+    def aging_by(cls, grouping, as_of=None):
+        """
+        Aging buckets per customer or per salesperson (`grouping` is
+        'customer' or 'salesperson'), largest outstanding balance first, from
+        one grouped query (cached).
+        """
+        if grouping not in cls.GROUPINGS:
+            raise ValueError(f"grouping must be one of {', '.join(cls.GROUPINGS)}")
+        as_of = as_of or timezone.now().date()
+        key = CacheNamespace.key(CacheNamespace.SALES, f'ar_aging_{grouping}_{as_of}')
+        result = cache.get(key)
+        if result is None:
+            rows = cls.outstanding().values(*cls.GROUPINGS[grouping]).annotate(
+                **cls._aggregates(as_of)
+            ).order_by('-total_outstanding', *cls.GROUPINGS[grouping])
+            result = []
+            for row in rows:
+                entry = cls._clean(row)
+                if grouping == 'customer':
+                    entry['customer_name'] = row['customer_name'] or ''
+                else:
+                    entry['user_id'] = row['user']
+                    full_name = f"{row['user__first_name'] or ''} {row['user__last_name'] or ''}".strip()
+                    entry['salesperson'] = full_name or row['user__username'] or 'Unassigned'
+                result.append(entry)
+            cache.set(key, result, SalesCache.CACHE_TIMEOUT_MEDIUM)
+        return result
+
+    @classmethod
+    def page(cls, cursor=None, per_page=None):
+        """One page of open invoices, newest first. Raises InvalidCursor for a bad cursor."""
+        queryset = cls.outstanding().select_related('user')
+        paginator = KeysetPaginator(queryset, cls.LIST_ORDERING, per_page or cls.PAGE_SIZE)
+        return paginator.page(cursor)
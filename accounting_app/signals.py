@@ -0,0 +1,51 @@
+"""
+Signals that flag closed reporting periods when their data changes late
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from sales_app.models import Invoice, Sale, CashInvoice, CashSale
+from sales_app.signals import invoice_statuses_changed, invoices_imported
+from .models import Expense
+from .periods import PeriodClosing
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=CashInvoice)
+@receiver(post_delete, sender=CashInvoice)
+def invoice_period_changed(sender, instance, **kwargs):
+    """Flag closed periods containing the invoice's current or previous date"""
+    # original_value still holds the pre-save value during post_save
+    PeriodClosing.mark_dirty(instance.date_of_sale, instance.original_value('date_of_sale'))
+
+
+@receiver(invoice_statuses_changed)
+@receiver(invoices_imported)
+def invoice_statuses_period_changed(sender, dates, **kwargs):
+    """Flag closed periods touched by a bulk payment status update or import"""
+    PeriodClosing.mark_dirty(*dates)
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=CashSale)
+@receiver(post_delete, sender=CashSale)
+def sale_period_changed(sender, instance, **kwargs):
+    """Flag the closed period of the line item's invoice"""
+    if PeriodClosing.closed_through() is None:
+        # Nothing closed yet: avoid loading the invoice
+        return
+    try:
+        invoice = instance.invoice
+    except (Invoice.DoesNotExist, CashInvoice.DoesNotExist):
+        # Invoice may have been deleted already (cascade delete)
+        return
+    if invoice is not None:
+        PeriodClosing.mark_dirty(invoice.date_of_sale)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def expense_period_changed(sender, instance, **kwargs):
+    PeriodClosing.mark_dirty(instance.date)
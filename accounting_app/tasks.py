@@ -0,0 +1,28 @@
+"""
+Background job tasks of the accounting app (run by `manage.py run_jobs`)
+"""
+from datetime import date
+
+from core.jobs import task
+from .analytics import AnalyticsEngine
+
+
+def _date(value):
+    # Job arguments are stored as JSON (ISO dates)
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+@task('accounting.refresh_metric')
+def refresh_metric(job, metric, start_date, end_date):
+    """Recompute and store the performance rows for `metric` over the period"""
+    rows = AnalyticsEngine.refresh_metric(metric, _date(start_date), _date(end_date))
+    return {'metric': metric, 'rows': len(rows)}
+
+
+@task('accounting.build_snapshots')
+def build_snapshots(job, start_date, end_date, period_type=None):
+    """Write the daily (and optional period) financial snapshots for the range"""
+    records, period_record = AnalyticsEngine.build_daily_snapshots(
+        _date(start_date), _date(end_date), period_type=period_type
+    )
+    return {'daily': len(records), 'period': period_record is not None}
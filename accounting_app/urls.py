@@ -16,6 +16,7 @@ urlpatterns = [
     path('reports/profit-loss/', views.profit_loss_report, name='profit_loss_report'),
     path('reports/revenue/', views.revenue_tracking, name='revenue_tracking'),
     path('reports/weekly-summary/', views.weekly_summary, name='weekly_summary'),
+    path('reports/ar-aging/', views.ar_aging_report, name='ar_aging_report'),
     
     # Analytics
     path('analytics/', views.analytics_dashboard, name='analytics_dashboard'),
@@ -25,6 +26,7 @@ urlpatterns = [
     path('analytics/products/<str:product_name>/trends/', views.product_trends, name='product_trends'),
     path('analytics/salespeople/<int:user_id>/trends/', views.salesperson_trends, name='salesperson_trends'),
     path('api/analytics/', views.analytics_api, name='analytics_api'),
+    path('api/revenue/', views.revenue_series_api, name='revenue_series_api'),
     
     # Legacy routes for compatibility
     path('forecast_dashboard/', views.forecast_dashboard, name='forecast_dashboard'),
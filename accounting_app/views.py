@@ -17,8 +17,15 @@ from .models import (
     TaxSettings, AccountingAuditLog, ProductPerformance, SalesPersonPerformance,
     CashDepartmentPerformance, DepartmentFinancialSnapshot, CashServicePerformance
 )
-from sales_app.models import Invoice, Sale, CashInvoice, CashSale
+from sales_app.models import Invoice, Sale, CashSale
+from sales_app.rollups import SalesRollup
 from .analytics import AnalyticsEngine
+from .receivables import Receivables
+from core.pagination import InvalidCursor
+from core.jobs import enqueue
+
+# Delay (and coalescing window) for the background weekly snapshot write
+SNAPSHOT_WRITE_DELAY = timedelta(minutes=5)
 
 def is_admin(user):
     return user.is_authenticated and user.groups.filter(name='Admin').exists()
@@ -59,17 +66,12 @@ def accounting_dashboard(request):
     today = timezone.now().date()
     current_month = today.replace(day=1)
     
-    # Regular Sales Revenue metrics
-    regular_monthly_revenue = Invoice.objects.filter(
-        date_of_sale__year=today.year,
-        date_of_sale__month=today.month
-    ).aggregate(total=Sum('total'))['total'] or 0
+    month_end = current_month.replace(day=monthrange(current_month.year, current_month.month)[1])
     
-    # Cash Department Revenue metrics
-    cash_monthly_revenue = CashInvoice.objects.filter(
-        date_of_sale__year=today.year,
-        date_of_sale__month=today.month
-    ).aggregate(total=Sum('total'))['total'] or 0
+    # Regular and cash department revenue from the daily rollups (one query)
+    monthly_totals = SalesRollup.totals_by_department(current_month, month_end)
+    regular_monthly_revenue = monthly_totals['regular']['total_amount']
+    cash_monthly_revenue = monthly_totals['cash']['total_amount']
     
     # Combined monthly revenue
     monthly_revenue = regular_monthly_revenue + cash_monthly_revenue
@@ -81,18 +83,11 @@ def accounting_dashboard(request):
     ).aggregate(total=Sum('amount'))['total'] or 0
     
     # Outstanding payments (only regular invoices, cash is always paid)
-    outstanding_invoices = Invoice.objects.filter(
+    outstanding_invoices = SalesRollup.totals(
+        department='regular',
         payment_status__in=['unpaid', 'partial', 'overdue']
-    ).aggregate(
-        count=Count('id'),
-        total=Sum('total'),
-        paid=Sum('amount_paid')
     )
-    
-    # Calculate outstanding amount properly handling None values
-    total_invoice_amount = outstanding_invoices['total'] or 0
-    total_paid_amount = outstanding_invoices['paid'] or 0
-    outstanding_amount = total_invoice_amount - total_paid_amount
+    outstanding_amount = outstanding_invoices['total_amount'] - outstanding_invoices['amount_paid']
     
     # Recent expenses
     recent_expenses = Expense.objects.select_related('category').order_by('-created_at')[:5]
@@ -106,10 +101,7 @@ def accounting_dashboard(request):
     regular_department_percentage = (regular_monthly_revenue / monthly_revenue * 100) if monthly_revenue > 0 else 0
     
     # Cash department specific metrics
-    cash_invoices_count = CashInvoice.objects.filter(
-        date_of_sale__year=today.year,
-        date_of_sale__month=today.month
-    ).count()
+    cash_invoices_count = monthly_totals['cash']['invoice_count']
     
     cash_transactions_count = CashSale.objects.filter(
         invoice__date_of_sale__year=today.year,
@@ -120,7 +112,7 @@ def accounting_dashboard(request):
     snapshot, created = DepartmentFinancialSnapshot.objects.get_or_create(
         period_type='monthly',
         period_start=current_month,
-        period_end=current_month.replace(day=monthrange(current_month.year, current_month.month)[1]),
+        period_end=month_end,
         defaults={
             'regular_revenue': regular_monthly_revenue,
             'cash_revenue': cash_monthly_revenue,
@@ -153,7 +145,7 @@ def accounting_dashboard(request):
         'net_profit': net_profit,
         'profit_margin': profit_margin,
         'outstanding_amount': outstanding_amount,
-        'outstanding_count': outstanding_invoices['count'] or 0,
+        'outstanding_count': outstanding_invoices['invoice_count'],
         'recent_expenses': recent_expenses,
         'current_month': current_month.strftime('%B %Y'),
         'cash_department_percentage': cash_department_percentage,
@@ -394,33 +386,17 @@ def profit_loss_report(request):
 @user_passes_test(is_admin)
 def revenue_tracking(request):
     """Revenue tracking and analysis"""
-    # Get monthly revenue for the last 12 months
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=365)
-    
-    monthly_data = []
-    for i in range(12):
-        month_start = (start_date.replace(day=1) + timedelta(days=32*i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        
-        if month_end > end_date:
-            month_end = end_date
-        
-        revenue = Invoice.objects.filter(
-            date_of_sale__range=[month_start, month_end]
-        ).aggregate(total=Sum('total'))['total'] or Decimal('0')
-        
-        monthly_data.append({
-            'month': month_start.strftime('%B %Y'),
-            'revenue': float(revenue),  # Convert to float for JavaScript
-            'month_start': month_start,
-            'month_end': month_end
-        })
+    # Monthly revenue for the last 12 months (one grouped query, cached)
+    monthly_data = AnalyticsEngine.monthly_revenue(months=12)
     
-    # Outstanding invoices analysis
-    outstanding_invoices = Invoice.objects.filter(
-        payment_status__in=['unpaid', 'partial', 'overdue']
-    ).select_related('user').order_by('-date_of_sale')
+    # Outstanding totals and aging buckets as database aggregates
+    outstanding_summary = Receivables.summary()
+    
+    # Outstanding invoices, one keyset page at a time
+    try:
+        outstanding_invoices = Receivables.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        outstanding_invoices = Receivables.page()
     
     # Payment status breakdown
     status_breakdown = Invoice.objects.values('payment_status').annotate(
@@ -442,12 +418,69 @@ def revenue_tracking(request):
         'monthly_data': monthly_data,
         'total_12_month_revenue': total_12_month_revenue,
         'outstanding_invoices': outstanding_invoices,
+        'outstanding_summary': outstanding_summary,
         'status_breakdown': status_breakdown,
         'can_edit_invoices': can_edit_invoices,
     }
     
     return render(request, 'accounting_app/revenue_tracking.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def ar_aging_report(request):
+    """Accounts-receivable aging per customer or per salesperson"""
+    grouping = request.GET.get('group', 'customer')
+    if grouping not in Receivables.GROUPINGS:
+        grouping = 'customer'
+    
+    summary = Receivables.summary()
+    rows = Receivables.aging_by(grouping)
+    
+    paginator = Paginator(rows, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    context = {
+        'summary': summary,
+        'grouping': grouping,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'aging_buckets': Receivables.AGING_BUCKETS,
+    }
+    
+    log_audit_action(request.user, 'view', 'ARAgingReport', details=f'Viewed AR aging by {grouping}')
+    return render(request, 'accounting_app/ar_aging_report.html', context)
+
+@login_required
+@user_passes_test(is_admin)
+def revenue_series_api(request):
+    """Monthly revenue time series as JSON (?months=12&department=regular|cash|all)"""
+    try:
+        months = int(request.GET.get('months', 12))
+    except ValueError:
+        return JsonResponse({'error': 'months must be an integer'}, status=400)
+    if not 1 <= months <= 60:
+        return JsonResponse({'error': 'months must be between 1 and 60'}, status=400)
+    
+    department = request.GET.get('department', 'regular')
+    if department not in AnalyticsEngine.REVENUE_DEPARTMENTS:
+        return JsonResponse({'error': 'Invalid department'}, status=400)
+    
+    series = AnalyticsEngine.monthly_revenue(months=months, department=department)
+    return JsonResponse({
+        'period': 'month',
+        'department': department,
+        'series': [
+            {
+                'month': month['month'],
+                'month_start': month['month_start'].isoformat(),
+                'month_end': month['month_end'].isoformat(),
+                'revenue': month['revenue'],
+            }
+            for month in series
+        ],
+        'total': sum(month['revenue'] for month in series),
+    })
+
 # Legacy forecast dashboard for compatibility
 def forecast_dashboard(request):
     return redirect('accounting_dashboard')
@@ -495,7 +528,8 @@ def product_performance(request):
     start_date, end_date = date_ranges.get(period, date_ranges['this_month'])
     
     # Get product performance data
-    product_data = AnalyticsEngine.calculate_product_performance(start_date, end_date, update_db=True)
+    # The performance table is written by a background job, not this request
+    product_data = AnalyticsEngine.get_metric('products', start_date, end_date, period, persist='background')
     
     # Filter by product if specified
     if product_filter:
@@ -552,7 +586,7 @@ def salesperson_performance(request):
     start_date, end_date = date_ranges.get(period, date_ranges['this_month'])
     
     # Get salesperson performance data
-    performance_data = AnalyticsEngine.calculate_salesperson_performance(start_date, end_date, update_db=True)
+    performance_data = AnalyticsEngine.get_metric('salespeople', start_date, end_date, period, persist=True)
     
     # Filter by user if specified
     if user_filter:
@@ -684,11 +718,11 @@ def analytics_api(request):
         elif data_type == 'products':
             date_ranges = AnalyticsEngine.get_date_ranges()
             start_date, end_date = date_ranges.get(period, date_ranges['this_month'])
-            data = AnalyticsEngine.calculate_product_performance(start_date, end_date, update_db=False)
+            data = AnalyticsEngine.get_metric('products', start_date, end_date, period)
         elif data_type == 'cash_services':
             date_ranges = AnalyticsEngine.get_date_ranges()
             start_date, end_date = date_ranges.get(period, date_ranges['this_month'])
-            data = AnalyticsEngine.calculate_cash_service_performance(start_date, end_date, update_db=False)
+            data = AnalyticsEngine.get_metric('cash_services', start_date, end_date, period)
         else:
             data = {'error': 'Invalid data type'}
         
@@ -702,7 +736,12 @@ def analytics_api(request):
 def weekly_summary(request):
     """Weekly summary view across all departments"""
     try:
-        weekly_data = AnalyticsEngine.get_weekly_summary()
+        weekly_data = AnalyticsEngine.get_weekly_summary(save=False)
+        # Store this week's snapshots in the background, at most once per
+        # SNAPSHOT_WRITE_DELAY however often the page is viewed
+        enqueue('accounting.build_snapshots', unique=True, delay=SNAPSHOT_WRITE_DELAY,
+                start_date=weekly_data['week_start'], end_date=weekly_data['week_end'],
+                period_type='weekly')
         
         weekly_snapshot = weekly_data['weekly_snapshot']
         daily_summaries = weekly_data['daily_summaries']
@@ -735,30 +774,34 @@ def weekly_summary(request):
             profit_change = 0
         
         # Get top performing products for the week
-        top_products = AnalyticsEngine.calculate_product_performance(
+        top_products = AnalyticsEngine.get_metric(
+            'products',
             weekly_data['week_start'], 
             weekly_data['week_end'], 
-            update_db=False
+            'this_week'
         )[:5]
         
         # Get top performing cash services for the week
-        top_cash_services = AnalyticsEngine.calculate_cash_service_performance(
+        top_cash_services = AnalyticsEngine.get_metric(
+            'cash_services',
             weekly_data['week_start'], 
             weekly_data['week_end'], 
-            update_db=False
+            'this_week'
         )[:5]
         
         # Staff performance for the week
-        staff_performance = AnalyticsEngine.calculate_salesperson_performance(
+        staff_performance = AnalyticsEngine.get_metric(
+            'salespeople',
             weekly_data['week_start'], 
             weekly_data['week_end'], 
-            update_db=False
+            'this_week'
         )
         
-        cash_staff_performance = AnalyticsEngine.calculate_cash_department_performance(
+        cash_staff_performance = AnalyticsEngine.get_metric(
+            'cash_staff',
             weekly_data['week_start'], 
             weekly_data['week_end'], 
-            update_db=False
+            'this_week'
         )
         
         context = {
@@ -805,13 +848,13 @@ def cash_department_analytics(request):
     )
     
     # Cash service performance for current month
-    cash_services = AnalyticsEngine.calculate_cash_service_performance(
-        current_month, month_end, update_db=False
+    cash_services = AnalyticsEngine.get_metric(
+        'cash_services', current_month, month_end, 'month'
     )
     
     # Cash staff performance for current month
-    cash_staff = AnalyticsEngine.calculate_cash_department_performance(
-        current_month, month_end, update_db=False
+    cash_staff = AnalyticsEngine.get_metric(
+        'cash_staff', current_month, month_end, 'month'
     )
     
     # Get last 6 months cash department trends
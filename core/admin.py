@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import Job
 
-# Register your models here.
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('progress', 'result', 'error', 'worker', 'started_at', 'heartbeat_at', 'finished_at')
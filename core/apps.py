@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Register background job tasks (each app's tasks.py)
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tasks')
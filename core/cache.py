@@ -0,0 +1,290 @@
+"""
+Shared SQLite cache backend with hit/miss/eviction statistics.
+
+LocMemCache keeps a separate cache per worker process, so an invalidation in
+one gunicorn worker never reaches the others. SQLiteCache stores entries in a
+single SQLite file that every worker on the host opens (WAL mode, so readers
+do not block writers), needs no external service, and supports an atomic
+incr() for the cache generation counters.
+
+Usage (settings.CACHES):
+    'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': '/var/lib/sales-app/cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 5000, 'CULL_FREQUENCY': 3},
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+class SQLiteCache(BaseCache):
+    """Cache backend storing pickled values in a shared SQLite file"""
+
+    STAT_NAMES = ('hits', 'misses', 'sets', 'deletes', 'evictions', 'expired')
+
+    # Counters are accumulated in memory and written to the shared stats
+    # table every STATS_FLUSH_OPERATIONS operations or STATS_FLUSH_SECONDS.
+    STATS_FLUSH_OPERATIONS = 100
+    STATS_FLUSH_SECONDS = 10
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending_stats = dict.fromkeys(self.STAT_NAMES, 0)
+        self._pending_operations = 0
+        self._last_stats_flush = time.monotonic()
+
+    # === CONNECTION ===
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self._path))
+            os.makedirs(directory, exist_ok=True)
+            # Autocommit mode; writes that must be atomic use BEGIN IMMEDIATE
+            conn = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_stats ('
+                'name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self):
+        """Context for an atomic read-modify-write"""
+        return _ImmediateTransaction(self._connection())
+
+    # === STATS ===
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._pending_stats[name] += amount
+            self._pending_operations += 1
+            due = (
+                self._pending_operations >= self.STATS_FLUSH_OPERATIONS
+                or time.monotonic() - self._last_stats_flush >= self.STATS_FLUSH_SECONDS
+            )
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Write this process's pending counters to the shared stats table"""
+        with self._stats_lock:
+            pending = {name: value for name, value in self._pending_stats.items() if value}
+            self._pending_stats = dict.fromkeys(self.STAT_NAMES, 0)
+            self._pending_operations = 0
+            self._last_stats_flush = time.monotonic()
+        if not pending:
+            return
+        self._connection().executemany(
+            'INSERT INTO cache_stats (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            list(pending.items()),
+        )
+
+    def get_stats(self):
+        """Counters summed over all workers, plus the current entry count and hit ratio"""
+        self.flush_stats()
+        conn = self._connection()
+        stats = dict.fromkeys(self.STAT_NAMES, 0)
+        stats.update(conn.execute('SELECT name, value FROM cache_stats').fetchall())
+        stats['entries'] = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        stats['max_entries'] = self._max_entries
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._pending_stats = dict.fromkeys(self.STAT_NAMES, 0)
+            self._pending_operations = 0
+        self._connection().execute('DELETE FROM cache_stats')
+
+    # === CACHE API ===
+
+    def _load(self, key, now):
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires <= now:
+            self._connection().execute(
+                'DELETE FROM cache_entries WHERE key = ? AND expires <= ?', (key, now)
+            )
+            self._count('expired')
+            return None
+        return value
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._load(key, time.time())
+        if value is None:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        now = time.time()
+        placeholders = ', '.join('?' * len(key_map))
+        rows = self._connection().execute(
+            f'SELECT key, value, expires FROM cache_entries WHERE key IN ({placeholders})',
+            list(key_map),
+        ).fetchall()
+        result = {}
+        for key, value, expires in rows:
+            if expires is None or expires > now:
+                result[key_map[key]] = pickle.loads(value)
+        self._count('hits', len(result))
+        self._count('misses', len(key_map) - len(result))
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._write() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                (key, blob, self.get_backend_timeout(timeout)),
+            )
+            self._cull(conn)
+        self._count('sets')
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._write() as conn:
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key = ? AND expires <= ?', (key, time.time())
+            )
+            added = conn.execute(
+                'INSERT OR IGNORE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                (key, blob, self.get_backend_timeout(timeout)),
+            ).rowcount == 1
+            if added:
+                self._cull(conn)
+        if added:
+            self._count('sets')
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as conn:
+            row = conn.execute(
+                'SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            conn.execute(
+                'UPDATE cache_entries SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        deleted = self._connection().execute(
+            'DELETE FROM cache_entries WHERE key = ?', (key,)
+        ).rowcount == 1
+        self._count('deletes', int(deleted))
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if not keys:
+            return
+        placeholders = ', '.join('?' * len(keys))
+        deleted = self._connection().execute(
+            f'DELETE FROM cache_entries WHERE key IN ({placeholders})', keys
+        ).rowcount
+        self._count('deletes', deleted)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def _cull(self, conn):
+        """
+        Once MAX_ENTRIES is exceeded drop expired entries, then the oldest
+        1/CULL_FREQUENCY. Entries with a timeout go before ones that never
+        expire (such as the cache generation counters).
+        """
+        count = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        expired = conn.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', (time.time(),)
+        ).rowcount
+        self._count('expired', expired)
+        count -= expired
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            evicted = conn.execute('DELETE FROM cache_entries').rowcount
+        else:
+            evicted = conn.execute(
+                'DELETE FROM cache_entries WHERE rowid IN '
+                '(SELECT rowid FROM cache_entries ORDER BY expires IS NULL, rowid LIMIT ?)',
+                (max(1, count // self._cull_frequency),),
+            ).rowcount
+        self._count('evictions', evicted)
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT, so concurrent writers serialize on the file lock"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+def get_cache_stats(alias='default'):
+    """Statistics for the given cache, or None if its backend does not keep any"""
+    backend = caches[alias]
+    if hasattr(backend, 'get_stats'):
+        return backend.get_stats()
+    return None
@@ -0,0 +1,20 @@
+"""
+Entry points for the run_jobs process pool.
+
+Pool processes are spawned rather than forked, so they never share the
+parent's database connections. They unpickle references to these functions
+before Django is set up, so this module must not import models at import
+time.
+"""
+
+
+def init_process():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def execute(job_id):
+    from core.jobs import execute
+    return execute(job_id)
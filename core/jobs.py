@@ -0,0 +1,234 @@
+"""
+Database-backed background jobs.
+
+Apps register tasks in their `tasks.py` (loaded when the core app is ready):
+
+    from core.jobs import task
+
+    @task('sales.warmup_cache', max_attempts=3)
+    def warmup_cache(job):
+        ...
+        return {'warmed': 4}        # stored as Job.result
+
+Views queue work with enqueue() and return straight away; `manage.py
+run_jobs` claims due jobs and runs them in a process pool. A task receives
+the Job (for job.set_progress(...)) and the keyword arguments it was
+queued with, which must be JSON-serializable.
+
+Periodic tasks are registered with every=<seconds>: run_jobs queues them
+when it starts, and each run queues the next one.
+"""
+import json
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    pass
+
+
+# === REGISTRY ===
+
+_tasks = {}
+_periodic = {}
+
+
+def task(name, max_attempts=3, every=None):
+    """Register the decorated function as the task `name`, run every `every` seconds if given"""
+    def register(func):
+        if name in _tasks and _tasks[name][0] is not func:
+            raise JobError(f"Task {name} is already registered")
+        _tasks[name] = (func, max_attempts)
+        if every:
+            _periodic[name] = every
+        return func
+    return register
+
+
+def registered_tasks():
+    return dict(_tasks)
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise JobError(f"Unknown task {name}")
+
+
+# === QUEUEING ===
+
+def enqueue(name, user=None, unique=False, delay=None, **kwargs):
+    """
+    Queue the task `name` with `kwargs` and return the Job.
+
+    With unique=True a job of the same task and arguments that is still
+    queued or running is returned instead of queueing a second one; the
+    job_unique_active constraint settles concurrent calls.
+    """
+    _, max_attempts = get_task(name)
+    unique_key = None
+    if unique:
+        unique_key = f"{name}:{':'.join(f'{k}={kwargs[k]}' for k in sorted(kwargs))}"[:255]
+        existing = _active_job(unique_key)
+        if existing is not None:
+            return existing
+
+    try:
+        with transaction.atomic():
+            job = Job.objects.create(
+                name=name,
+                kwargs=kwargs,
+                unique_key=unique_key,
+                max_attempts=max_attempts,
+                run_after=timezone.now() + (delay or timedelta(0)),
+                created_by=user if getattr(user, 'is_authenticated', False) else None,
+            )
+    except IntegrityError:
+        # Queued concurrently by another request
+        existing = _active_job(unique_key) if unique_key else None
+        if existing is None:
+            raise
+        return existing
+    logger.info(f"Queued job {job}")
+    return job
+
+
+def schedule_periodic():
+    """Queue every periodic task that has no queued or running job (called by run_jobs)"""
+    return [enqueue(name, unique=True) for name in _periodic]
+
+
+def _schedule_next(job):
+    """Queue the next run of a finished periodic job"""
+    if job.name in _periodic and job.is_finished:
+        enqueue(job.name, unique=True, delay=timedelta(seconds=_periodic[job.name]))
+
+
+def _active_job(unique_key):
+    return Job.objects.filter(unique_key=unique_key, status__in=['queued', 'running']).first()
+
+
+# === WORKER SIDE ===
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(limit, worker):
+    """
+    Mark up to `limit` due jobs as running for `worker` and return their
+    ids. Each job is taken with a conditional UPDATE, so concurrent workers
+    never claim the same job.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status='queued', run_after__lte=now
+    ).order_by('run_after', 'id').values_list('id', flat=True)[:limit * 2]
+
+    claimed = []
+    for job_id in candidates:
+        if len(claimed) >= limit:
+            break
+        if Job.objects.filter(pk=job_id, status='queued').update(
+            status='running', worker=worker, started_at=now, heartbeat_at=now
+        ):
+            claimed.append(job_id)
+    return claimed
+
+
+def heartbeat(job_ids, worker):
+    """Mark the given running jobs of `worker` as alive. Returns the number touched."""
+    if not job_ids:
+        return 0
+    return Job.objects.filter(pk__in=list(job_ids), status='running', worker=worker).update(
+        heartbeat_at=timezone.now()
+    )
+
+
+def requeue_stale(timeout=None):
+    """
+    Requeue running jobs whose worker has not sent a heartbeat (see
+    heartbeat() and Job.set_progress) for `timeout` seconds
+    (JOB_STALE_AFTER), e.g. after the worker process was killed. Long jobs
+    stay claimed as long as their worker is alive.
+    """
+    timeout = timeout or getattr(settings, 'JOB_STALE_AFTER', 300)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = Job.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    count = 0
+    for job in stale:
+        count += _finish_attempt(job, error="Worker stopped responding")
+    return count
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts`: base * 2 ** (attempts - 1), capped"""
+    base = getattr(settings, 'JOB_RETRY_BASE_DELAY', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600)))
+
+
+def _finish_attempt(job, result=None, error=None):
+    """Record the outcome of one attempt, requeueing failures with backoff. Returns 1 if updated."""
+    job.attempts += 1
+    now = timezone.now()
+    if error is None:
+        changes = {'status': 'succeeded', 'result': result, 'error': '', 'finished_at': now}
+    elif job.attempts < job.max_attempts:
+        changes = {'status': 'queued', 'error': error, 'run_after': now + backoff(job.attempts)}
+    else:
+        changes = {'status': 'failed', 'error': error, 'finished_at': now}
+    changes['attempts'] = job.attempts
+    claimed_by = {'worker': job.worker, 'started_at': job.started_at}
+    for name, value in changes.items():
+        setattr(job, name, value)
+    # Only the run that claimed the job may finish it
+    return Job.objects.filter(
+        pk=job.pk, status='running', **claimed_by
+    ).update(**changes)
+
+
+def execute(job_id):
+    """Run one claimed job (in a pool process). Returns the final status."""
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        if job.status != 'running':
+            return job.status
+        try:
+            func, _ = get_task(job.name)
+            result = func(job, **job.kwargs)
+        except Exception:
+            logger.error(f"Job {job} failed: {traceback.format_exc()}")
+            _finish_attempt(job, error=traceback.format_exc())
+        else:
+            try:
+                json.dumps(result, cls=DjangoJSONEncoder)
+            except (TypeError, ValueError) as e:
+                # The work is done; only the result cannot be stored
+                result = {'unserializable_result': str(e)}
+            _finish_attempt(job, result=result)
+        logger.info(f"Job {job} after attempt {job.attempts}/{job.max_attempts}")
+        _schedule_next(job)
+        return job.status
+    finally:
+        close_old_connections()
+
+
+def fail_claimed(job_id, error):
+    """Record a failed attempt for a claimed job whose pool process died"""
+    job = Job.objects.filter(pk=job_id, status='running').first()
+    if job is not None:
+        _finish_attempt(job, error=error)
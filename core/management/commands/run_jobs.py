@@ -0,0 +1,94 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import job_worker, jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (imports, analytics refreshes, cache warming, periodic sweeps) in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Pool size (default: JOB_WORKER_PROCESSES)')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds between queue polls when idle (default: JOB_POLL_INTERVAL)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue has no due jobs left')
+
+    def handle(self, *args, **options):
+        processes = options['processes'] or getattr(settings, 'JOB_WORKER_PROCESSES', 2)
+        poll_interval = options['poll_interval'] or getattr(settings, 'JOB_POLL_INTERVAL', 2)
+        worker = jobs.worker_name()
+
+        self.stdout.write(f'Job worker {worker} with {processes} process(es), tasks: '
+                          f'{", ".join(sorted(jobs.registered_tasks()))}')
+        pool = self._pool(processes)
+        running = {}
+        finished = 0
+        heartbeat_interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 30)
+        last_stale_check = 0
+        last_heartbeat = time.monotonic()
+        try:
+            while True:
+                if running and time.monotonic() - last_heartbeat > heartbeat_interval:
+                    jobs.heartbeat(running.values(), worker)
+                    last_heartbeat = time.monotonic()
+
+                if time.monotonic() - last_stale_check > 60:
+                    requeued = jobs.requeue_stale()
+                    if requeued:
+                        self.stdout.write(f'Requeued {requeued} stale job(s)')
+                    # Also restores periodic tasks whose next run was lost
+                    jobs.schedule_periodic()
+                    last_stale_check = time.monotonic()
+
+                claimed = jobs.claim(processes - len(running), worker) if len(running) < processes else []
+                for job_id in claimed:
+                    running[pool.submit(job_worker.execute, job_id)] = job_id
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    finished += 1
+                    try:
+                        self.stdout.write(f'Job {job_id}: {future.result()}')
+                    except BrokenProcessPool as e:
+                        jobs.fail_claimed(job_id, f'Worker process died: {e}')
+                    except Exception as e:
+                        logger.error(f"Job {job_id} crashed its worker: {e}")
+                        jobs.fail_claimed(job_id, str(e))
+
+                if any(isinstance(f.exception(), BrokenProcessPool) for f in done if f.done()):
+                    for future, job_id in running.items():
+                        jobs.fail_claimed(job_id, 'Worker pool restarted')
+                    running.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self._pool(processes)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping; waiting for running jobs...')
+        finally:
+            pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f'Job worker stopped after {finished} job(s)'))
+
+    @staticmethod
+    def _pool(processes):
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=job_worker.init_process,
+        )
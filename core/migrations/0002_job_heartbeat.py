@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def prepare_running_jobs(apps, schema_editor):
+    """
+    Give running jobs a heartbeat (their claim time) and drop the unique key
+    of all but the oldest active job per key, so the constraint can be added
+    """
+    Job = apps.get_model('core', 'Job')
+    Job.objects.filter(status='running', heartbeat_at__isnull=True).update(heartbeat_at=models.F('started_at'))
+    seen = set()
+    active = Job.objects.filter(status__in=['queued', 'running'], unique_key__isnull=False).order_by('id')
+    for pk, unique_key in active.values_list('id', 'unique_key'):
+        if unique_key in seen:
+            Job.objects.filter(pk=pk).update(unique_key=None)
+        seen.add(unique_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(prepare_running_jobs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'heartbeat_at'], name='job_heartbeat_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('unique_key',), name='job_unique_active'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+"""
+Reusable model mixins
+"""
+from django.db.models import DEFERRED
+
+
+class DirtyFieldsMixin:
+    """
+    Track which fields changed since an instance was loaded or last saved,
+    without re-reading the row.
+
+    Field values are snapshotted in from_db() and again after every save(),
+    so `changed_fields` can be checked from pre_save/post_save signal
+    handlers for free. Set TRACKED_FIELDS to a list of attnames to limit the
+    snapshot; by default every concrete field is tracked.
+
+    Instances that were never loaded or saved (e.g. Model(pk=1)) have no
+    snapshot: `has_snapshot` is False and callers must fall back to the
+    database if they need the stored values.
+    """
+
+    TRACKED_FIELDS = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        tracked = cls._tracked_attnames()
+        instance._loaded_values = {
+            name: value
+            for name, value in zip(field_names, values)
+            if value is not DEFERRED and name in tracked
+        }
+        return instance
+
+    @classmethod
+    def _tracked_attnames(cls):
+        if cls.TRACKED_FIELDS is not None:
+            return set(cls.TRACKED_FIELDS)
+        # Generated columns are derived from other fields and are reloaded
+        # lazily after save, so they are never tracked
+        return {field.attname for field in cls._meta.concrete_fields if not field.generated}
+
+    @property
+    def has_snapshot(self):
+        return getattr(self, '_loaded_values', None) is not None
+
+    @property
+    def changed_fields(self):
+        """{attname: (old_value, new_value)} for tracked fields that differ from the snapshot"""
+        loaded = getattr(self, '_loaded_values', None) or {}
+        changes = {}
+        for name, old_value in loaded.items():
+            new_value = getattr(self, name)
+            if new_value != old_value:
+                changes[name] = (old_value, new_value)
+        return changes
+
+    def has_changed(self, *names):
+        changed = self.changed_fields
+        return any(name in changed for name in names)
+
+    def original_value(self, name, default=None):
+        """Value of `name` as loaded/saved, or `default` when it is not in the snapshot"""
+        return (getattr(self, '_loaded_values', None) or {}).get(name, default)
+
+    def original_values(self):
+        return dict(getattr(self, '_loaded_values', None) or {})
+
+    def _snapshot(self, names=None):
+        deferred = self.get_deferred_fields()
+        tracked = self._tracked_attnames()
+        if names is None:
+            self._loaded_values = {}
+            names = tracked
+        elif not self.has_snapshot:
+            self._loaded_values = {}
+        for name in names:
+            if name in tracked and name not in deferred:
+                self._loaded_values[name] = getattr(self, name)
+
+    def _attnames(self, names):
+        """Map field names (or attnames, as update_fields allows) to attnames"""
+        attnames = {field.name: field.attname for field in self._meta.concrete_fields}
+        return [attnames.get(name, name) for name in names]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._snapshot()
+        else:
+            self._snapshot(self._attnames(update_fields))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            self._snapshot()
+        else:
+            self._snapshot(self._attnames(fields))
@@ -1,3 +1,87 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
-# Create your models here.
+
+class Job(models.Model):
+    """
+    A unit of background work, run by `manage.py run_jobs` (see core.jobs).
+
+    Workers claim queued jobs whose run_after has passed; failed attempts
+    are requeued with exponential backoff until max_attempts is reached.
+    Tasks report progress while running and leave a JSON result.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    FINISHED_STATUSES = ('succeeded', 'failed')
+
+    name = models.CharField(max_length=100, db_index=True)
+    kwargs = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    # Set for jobs that must not be queued twice (see core.jobs.enqueue);
+    # unique among queued and running jobs
+    unique_key = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    progress = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the worker while the job runs; see core.jobs.requeue_stale
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Claim query: next due job in the queue
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+            # Stale check: running jobs by last heartbeat
+            models.Index(fields=['status', 'heartbeat_at'], name='job_heartbeat_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='job_unique_active',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    def set_progress(self, **values):
+        """Merge `values` into the stored progress (one UPDATE, no full save); also a heartbeat"""
+        self.progress = {**self.progress, **values}
+        self.heartbeat_at = timezone.now()
+        Job.objects.filter(pk=self.pk).update(progress=self.progress, heartbeat_at=self.heartbeat_at)
+
+    def as_status(self):
+        """JSON-serializable state for status polling"""
+        return {
+            'id': self.pk,
+            'name': self.name,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error.strip().splitlines()[-1] if self.error else '',
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'heartbeat_at': self.heartbeat_at,
+            'finished_at': self.finished_at,
+        }
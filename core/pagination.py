@@ -0,0 +1,150 @@
+"""
+Keyset (seek) pagination.
+
+Offset pagination (Paginator/LIMIT ... OFFSET) reads and discards every row
+before the requested page and needs a COUNT(*) over the whole result.
+KeysetPaginator instead continues from the sort key of the last row shown
+(`WHERE (date_of_sale, id) < (last_date, last_id)`), so every page is an
+index range scan of `per_page` rows however deep the reader goes.
+
+The ordering must end in a unique, non-NULL field (normally the primary
+key) so the position is unambiguous. Only the leading field may be NULL;
+NULL-valued rows are ordered last in either direction and paged as a
+separate segment, so each segment is ordered and filtered by one
+row-value comparison that a composite index on the ordering (e.g.
+Index(fields=['-date_of_sale', '-id'])) serves as a range.
+"""
+import base64
+import json
+import operator
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.db.models.fields.tuple_lookups import Tuple, TupleGreaterThan, TupleLessThan
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator"""
+
+    def __init__(self, object_list, next_cursor, cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate `queryset` by `ordering` (field names, '-' for descending).
+
+        paginator = KeysetPaginator(invoices, ('-date_of_sale', '-id'), per_page=50)
+        page = paginator.page(request.GET.get('cursor'))
+        ... ?cursor={{ page.next_cursor }}
+    """
+
+    def __init__(self, queryset, ordering, per_page=50):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            opts = queryset.model._meta
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            self.keys.append((name, descending, field))
+        if any(field.null for _, _, field in self.keys[1:]) or (self.keys[0][2].null and len(self.keys) < 2):
+            raise ValueError('Only the leading ordering field may be NULL, and it needs a unique tie-breaker')
+        self.nullable = self.keys[0][2].null
+
+    def page(self, cursor=None):
+        """Return the page following `cursor` (the first page when cursor is None/empty)"""
+        values = self.decode(cursor) if cursor else None
+        in_null_segment = values is not None and values[0] is None
+
+        limit = self.per_page + 1
+        rows = []
+        if not in_null_segment:
+            rows = list(self._segment(self.keys, values, null=False)[:limit])
+        if len(rows) < limit and self.nullable:
+            # The NULL-valued rows follow the last non-NULL one
+            after = values[1:] if in_null_segment else None
+            rows += list(self._segment(self.keys[1:], after, null=True)[:limit - len(rows)])
+
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode(rows[-1])
+        return KeysetPage(rows, next_cursor, cursor or None)
+
+    def _segment(self, keys, values, null):
+        """Rows of one segment (leading field NULL or not) ordered by `keys`, after `values`"""
+        queryset = self.queryset
+        if self.nullable:
+            queryset = queryset.filter(**{f'{self.keys[0][0]}__isnull': null})
+        queryset = queryset.order_by(*[F(name).desc() if descending else F(name).asc()
+                                       for name, descending, _ in keys])
+        if values is not None:
+            queryset = queryset.filter(self._after(keys, values))
+        return queryset
+
+    # === CURSORS ===
+
+    def encode(self, obj):
+        values = []
+        for name, _, field in self.keys:
+            value = getattr(obj, field.attname)
+            values.append(None if value is None else field.value_to_string(obj))
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                raise ValueError('cursor does not match the ordering')
+            return [
+                None if value is None else field.to_python(value)
+                for value, (_, _, field) in zip(values, self.keys)
+            ]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(f"Invalid pagination cursor: {exc}") from exc
+
+    @staticmethod
+    def _after(keys, values):
+        """
+        Rows sorting after `values` by `keys` (none of them NULL). When all
+        keys share a direction this is the single row-value comparison
+        (a, b) < (va, vb); mixed directions need a > va OR (a = va AND b < vb).
+        """
+        if len({descending for _, descending, _ in keys}) == 1:
+            lookup = TupleLessThan if keys[0][1] else TupleGreaterThan
+            return lookup(Tuple(*[F(name) for name, _, _ in keys]), tuple(values))
+
+        alternatives = []
+        equal = Q()
+        for (name, descending, _), value in zip(keys, values):
+            alternatives.append(equal & Q(**{f'{name}__lt' if descending else f'{name}__gt': value}))
+            equal &= Q(**{name: value})
+        return reduce(operator.or_, alternatives)
@@ -7,4 +7,5 @@ urlpatterns = [
     path('', views.Index.as_view(), name='index'),
     path('logout_to_home/', views.logout_to_home, name='logout_to_home'),
     path('manifest.json', views.manifest, name='manifest'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
 ]
@@ -1,11 +1,14 @@
 from django.contrib.auth import logout
-from django.shortcuts import redirect
-from django.http import JsonResponse
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, get_object_or_404
+from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_http_methods
 import json
 import os
 from pathlib import Path
 
+from .models import Job
+
 def logout_to_home(request):
     logout(request)
     return redirect('core:index')
@@ -29,4 +32,17 @@ from django.shortcuts import render
 class Index(View):
     def get(self, request):
         context = {} 
-        return render(request, 'core/home.html', context)
\ No newline at end of file
+        return render(request, 'core/home.html', context)
+
+
+@login_required
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    """Status, progress and result of a background job (polled by pages that queue work)"""
+    job = get_object_or_404(Job, pk=job_id)
+    user = request.user
+    if job.created_by_id != user.pk and not (
+        user.is_superuser or user.groups.filter(name='Managers').exists()
+    ):
+        raise Http404("No such job")
+    return JsonResponse(job.as_status())
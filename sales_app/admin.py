@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Invoice, Sale
+from .models import Customer, Invoice, Sale
 
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
@@ -8,5 +8,12 @@ class InvoiceAdmin(admin.ModelAdmin):
 
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
-    list_display = ('invoice', 'item', 'unit_price', 'quantity', 'total_price')
+    list_display = ('invoice', 'item', 'product', 'unit_price', 'quantity', 'total_price')
     search_fields = ('invoice__invoice_no', 'item')
+    raw_id_fields = ('invoice', 'product')
+
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'phone', 'invoice_count', 'lifetime_spend', 'outstanding', 'last_purchase')
+    search_fields = ('name', 'phone', 'phone_key')
+    readonly_fields = ('invoice_count', 'lifetime_spend', 'outstanding', 'first_purchase', 'last_purchase')
@@ -1,13 +1,86 @@
 """
 Caching utilities for sales app to improve performance
 """
+import time
+
 from django.core.cache import cache
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Count, Q, F
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .models import Invoice, Product, Sale, AdminLog
 
 
+class CacheNamespace:
+    """
+    Generation counters for groups of cached data.
+
+    Every cache key is built with the current generation of the namespaces
+    it depends on, e.g. 'sales:1718000000123:top_products_7d_10'.
+    Invalidating a namespace is a single atomic incr of its counter: keys
+    built with the old generation are never read again and simply expire,
+    however many parameter variants were cached.
+    """
+
+    SALES = 'sales'
+    PRODUCTS = 'products'
+    CASH = 'cash'
+    ACCOUNTING = 'accounting'
+    # Product and cash product names (search indexes); not bumped by stock changes
+    CATALOG = 'catalog'
+
+    ALL = (SALES, PRODUCTS, CASH, ACCOUNTING, CATALOG)
+
+    @staticmethod
+    def counter_key(namespace):
+        return f'cache_generation_{namespace}'
+
+    @staticmethod
+    def _seed():
+        # Seed from the clock so a counter that was evicted restarts above any
+        # generation handed out before, instead of reviving stale keys.
+        return int(time.time() * 1000)
+
+    @classmethod
+    def generations(cls, namespaces):
+        """Return {namespace: generation}, creating missing counters"""
+        keys = {cls.counter_key(ns): ns for ns in namespaces}
+        found = cache.get_many(list(keys))
+        result = {}
+        for key, namespace in keys.items():
+            generation = found.get(key)
+            if generation is None:
+                cache.add(key, cls._seed(), None)
+                generation = cache.get(key, cls._seed())
+            result[namespace] = generation
+        return result
+
+    @classmethod
+    def generation(cls, namespace):
+        return cls.generations([namespace])[namespace]
+
+    @classmethod
+    def key(cls, namespaces, name):
+        """Build a versioned cache key for `name` depending on `namespaces`"""
+        if isinstance(namespaces, str):
+            namespaces = [namespaces]
+        generations = cls.generations(namespaces)
+        prefix = ':'.join(f'{ns}{generations[ns]}' for ns in namespaces)
+        return f'{prefix}:{name}'
+
+    @classmethod
+    def bump(cls, *namespaces):
+        """Invalidate everything cached under the given namespaces"""
+        for namespace in namespaces:
+            key = cls.counter_key(namespace)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Counter missing (never used, or evicted)
+                if not cache.add(key, cls._seed(), None):
+                    cache.incr(key)
+
+
 class SalesCache:
     """Centralized caching for sales data"""
     
@@ -22,19 +95,13 @@ class SalesCache:
         if date is None:
             date = timezone.now().date()
         
-        cache_key = f'daily_sales_{date}'
+        cache_key = cls.daily_cache_key(date)
         cached_data = cache.get(cache_key)
         
         if cached_data is None:
-            # Calculate and cache the data
-            invoices = Invoice.objects.filter(date_of_sale=date)
-            summary = {
-                'total_sales': invoices.aggregate(Sum('total'))['total__sum'] or 0,
-                'total_invoices': invoices.count(),
-                'paid_invoices': invoices.filter(payment_status='paid').count(),
-                'unpaid_invoices': invoices.filter(payment_status='unpaid').count(),
-                'partial_invoices': invoices.filter(payment_status='partial').count(),
-            }
+            # Calculate and cache the data in a single aggregate query
+            totals = Invoice.objects.filter(date_of_sale=date).aggregate(**cls._summary_aggregates())
+            summary = cls._daily_summary(totals)
             cache.set(cache_key, summary, cls.CACHE_TIMEOUT_MEDIUM)
             cached_data = summary
         
@@ -43,7 +110,7 @@ class SalesCache:
     @classmethod
     def get_low_stock_products(cls, threshold=50):
         """Get cached list of low stock products"""
-        cache_key = f'low_stock_products_{threshold}'
+        cache_key = CacheNamespace.key(CacheNamespace.PRODUCTS, f'low_stock_products_{threshold}')
         cached_data = cache.get(cache_key)
         
         if cached_data is None:
@@ -59,21 +126,20 @@ class SalesCache:
     @classmethod
     def get_top_products(cls, days=30, limit=10):
         """Get cached list of top selling products"""
-        cache_key = f'top_products_{days}d_{limit}'
+        cache_key = CacheNamespace.key(CacheNamespace.SALES, f'top_products_{days}d_{limit}')
         cached_data = cache.get(cache_key)
         
         if cached_data is None:
             start_date = timezone.now().date() - timedelta(days=days)
             
-            # Get top products by quantity sold
-            top_products = Sale.objects.filter(
-                invoice__date_of_sale__gte=start_date
-            ).values('item').annotate(
-                total_quantity=Sum('quantity'),
-                total_revenue=Sum('total_price')
-            ).order_by('-total_quantity')[:limit]
-            
-            cached_data = list(top_products)
+            # Get top products by quantity sold, grouped on the product key
+            from .catalog import sales_by_product
+            cached_data = sales_by_product(
+                Sale.objects.filter(invoice__date_of_sale__gte=start_date),
+                {'total_quantity': Sum('quantity'), 'total_revenue': Sum('total_price')},
+                '-total_quantity',
+                limit=limit,
+            )
             cache.set(cache_key, cached_data, cls.CACHE_TIMEOUT_LONG)
         
         return cached_data
@@ -86,29 +152,15 @@ class SalesCache:
         if month is None:
             month = timezone.now().month
             
-        cache_key = f'monthly_summary_{year}_{month}'
+        cache_key = CacheNamespace.key(CacheNamespace.SALES, f'monthly_summary_{year}_{month}')
         cached_data = cache.get(cache_key)
         
         if cached_data is None:
-            invoices = Invoice.objects.filter(
+            totals = Invoice.objects.filter(
                 date_of_sale__year=year,
                 date_of_sale__month=month
-            )
-            
-            summary = {
-                'total_revenue': invoices.aggregate(Sum('total'))['total__sum'] or 0,
-                'total_invoices': invoices.count(),
-                'paid_amount': invoices.aggregate(Sum('amount_paid'))['amount_paid__sum'] or 0,
-                'outstanding_amount': (
-                    invoices.aggregate(Sum('total'))['total__sum'] or 0
-                ) - (
-                    invoices.aggregate(Sum('amount_paid'))['amount_paid__sum'] or 0
-                ),
-                'payment_status_breakdown': {
-                    status: invoices.filter(payment_status=status).count()
-                    for status, _ in Invoice.PAYMENT_STATUS_CHOICES
-                }
-            }
+            ).aggregate(**cls._summary_aggregates())
+            summary = cls._monthly_summary(totals)
             
             # Cache for longer if it's a past month
             current_month = timezone.now().replace(day=1).date()
@@ -120,48 +172,140 @@ class SalesCache:
         
         return cached_data
     
+    @classmethod
+    def get_period_summaries(cls, period='day', periods=7, end=None):
+        """
+        Get cached summaries for the last `periods` days or months up to `end`
+        in one grouped query. Returns a list ordered oldest first, each entry
+        holding the period start date under 'period' plus the keys of the
+        daily or monthly summary. Periods without invoices are included with
+        zero totals.
+        """
+        if period not in ('day', 'month'):
+            raise ValueError("period must be 'day' or 'month'")
+        if end is None:
+            end = timezone.now().date()
+        
+        cache_key = CacheNamespace.key(CacheNamespace.SALES, f'period_summaries_{period}_{periods}_{end}')
+        cached_data = cache.get(cache_key)
+        
+        if cached_data is None:
+            if period == 'day':
+                starts = [end - timedelta(days=offset) for offset in range(periods - 1, -1, -1)]
+                invoices = Invoice.objects.filter(date_of_sale__range=[starts[0], end])
+                rows = invoices.order_by().values(bucket=F('date_of_sale'))
+                build = cls._daily_summary
+            else:
+                starts = []
+                year, month = end.year, end.month
+                for _ in range(periods):
+                    starts.insert(0, datetime(year, month, 1).date())
+                    year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+                invoices = Invoice.objects.filter(date_of_sale__range=[starts[0], end])
+                rows = invoices.order_by().annotate(bucket=TruncMonth('date_of_sale')).values('bucket')
+                build = cls._monthly_summary
+            
+            grouped = {
+                row['bucket']: row
+                for row in rows.annotate(**cls._summary_aggregates())
+            }
+            cached_data = [
+                {'period': start, **build(grouped.get(start, {}))}
+                for start in starts
+            ]
+            cache.set(cache_key, cached_data, cls.CACHE_TIMEOUT_SHORT)
+        
+        return cached_data
+    
+    @staticmethod
+    def _summary_aggregates():
+        """Conditional aggregates shared by all invoice summaries (one round trip)"""
+        aggregates = {
+            'revenue_sum': Sum('total'),
+            'paid_sum': Sum('amount_paid'),
+            'invoice_count': Count('id'),
+        }
+        for status, _ in Invoice.PAYMENT_STATUS_CHOICES:
+            aggregates[f'{status}_count'] = Count('id', filter=Q(payment_status=status))
+        return aggregates
+    
+    @staticmethod
+    def _daily_summary(totals):
+        return {
+            'total_sales': totals.get('revenue_sum') or 0,
+            'total_invoices': totals.get('invoice_count') or 0,
+            'paid_invoices': totals.get('paid_count') or 0,
+            'unpaid_invoices': totals.get('unpaid_count') or 0,
+            'partial_invoices': totals.get('partial_count') or 0,
+        }
+    
+    @staticmethod
+    def _monthly_summary(totals):
+        total_revenue = totals.get('revenue_sum') or 0
+        paid_amount = totals.get('paid_sum') or 0
+        return {
+            'total_revenue': total_revenue,
+            'total_invoices': totals.get('invoice_count') or 0,
+            'paid_amount': paid_amount,
+            'outstanding_amount': total_revenue - paid_amount,
+            'payment_status_breakdown': {
+                status: totals.get(f'{status}_count') or 0
+                for status, _ in Invoice.PAYMENT_STATUS_CHOICES
+            }
+        }
+    
+    @classmethod
+    def daily_cache_key(cls, date):
+        if isinstance(date, datetime):
+            date = date.date()
+        return CacheNamespace.key(CacheNamespace.SALES, f'daily_sales_{date}')
+    
     @classmethod
     def invalidate_daily_cache(cls, date=None):
         """Invalidate daily cache when new sales are made"""
         if date is None:
             date = timezone.now().date()
         
-        cache_key = f'daily_sales_{date}'
-        cache.delete(cache_key)
+        cache.delete(cls.daily_cache_key(date))
     
     @classmethod
     def invalidate_product_cache(cls):
         """Invalidate product-related caches"""
-        # This could be improved with a more sophisticated cache key pattern
-        cache.delete_many([
-            'low_stock_products_50',
-            'low_stock_products_25',
-            'low_stock_products_10',
-        ])
+        CacheNamespace.bump(CacheNamespace.PRODUCTS)
     
     @classmethod
     def invalidate_sales_cache(cls):
         """Invalidate sales-related caches"""
-        # Clear top products cache
-        for days in [7, 30, 90]:
-            for limit in [5, 10, 20]:
-                cache.delete(f'top_products_{days}d_{limit}')
-        
-        # Clear today's daily summary
-        cls.invalidate_daily_cache()
+        CacheNamespace.bump(CacheNamespace.SALES)
+    
+    @classmethod
+    def invalidate_cash_cache(cls):
+        """Invalidate cash department caches"""
+        CacheNamespace.bump(CacheNamespace.CASH)
+    
+    @classmethod
+    def invalidate_accounting_cache(cls):
+        """Invalidate accounting and analytics caches"""
+        CacheNamespace.bump(CacheNamespace.ACCOUNTING)
 
 
-def cache_expensive_query(cache_key, query_func, timeout=SalesCache.CACHE_TIMEOUT_MEDIUM):
+def cache_expensive_query(cache_key, query_func, timeout=SalesCache.CACHE_TIMEOUT_MEDIUM,
+                          namespaces=(CacheNamespace.SALES,)):
     """
     Generic function to cache expensive database queries
     
+    The key is versioned with the generations of `namespaces`, so the
+    result is dropped whenever any of them is invalidated.
+    
     Usage:
         result = cache_expensive_query(
             'my_expensive_query',
             lambda: SomeModel.objects.complex_query(),
-            timeout=900
+            timeout=900,
+            namespaces=[CacheNamespace.SALES, CacheNamespace.PRODUCTS]
         )
     """
+    cache_key = CacheNamespace.key(namespaces, cache_key)
     cached_result = cache.get(cache_key)
     
     if cached_result is None:
@@ -184,7 +328,8 @@ def get_dashboard_stats(user=None):
             'top_products': SalesCache.get_top_products(days=7, limit=5),
             'monthly_summary': SalesCache.get_monthly_summary(),
         },
-        timeout=SalesCache.CACHE_TIMEOUT_SHORT
+        timeout=SalesCache.CACHE_TIMEOUT_SHORT,
+        namespaces=[CacheNamespace.SALES, CacheNamespace.PRODUCTS]
     )
     
     return stats
@@ -0,0 +1,84 @@
+"""
+Bulk product lookups by name, the cached name map used by product pickers,
+and per-product grouping of sale lines
+"""
+from django.core.cache import cache
+from django.db.models import Max
+
+from .cache_utils import CacheNamespace, SalesCache
+from .models import Product
+
+# Names per IN (...) query; keeps well below database parameter limits
+LOOKUP_BATCH_SIZE = 500
+
+
+def products_by_name(names, model=Product, fields=None):
+    """
+    Return {name: product} for the given names using one query per
+    LOOKUP_BATCH_SIZE names, instead of a .get(name=...) per item.
+
+    Product names are not unique; like the name-based lookups elsewhere, the
+    oldest product wins. `fields` limits the loaded columns (id and name are
+    always loaded).
+    """
+    names = sorted({name for name in names if name})
+    catalog = {}
+    for offset in range(0, len(names), LOOKUP_BATCH_SIZE):
+        queryset = model.objects.filter(name__in=names[offset:offset + LOOKUP_BATCH_SIZE]).order_by('id')
+        if fields:
+            queryset = queryset.only('id', 'name', *fields)
+        for product in queryset:
+            catalog.setdefault(product.name, product)
+    return catalog
+
+
+def catalog_names(model=Product):
+    """
+    Cached {'ids': {id: name}, 'names': {name: id}} for every named product of
+    `model`, for validating and labelling product pickers without a query
+    per form row. Rebuilt whenever a product is created, renamed or deleted
+    (the catalog cache namespace). As above, the oldest product wins a name.
+    """
+    key = CacheNamespace.key(CacheNamespace.CATALOG, f'catalog_names_{model._meta.model_name}')
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = {'ids': {}, 'names': {}}
+        rows = model.objects.exclude(name__isnull=True).exclude(name='').order_by('id').values_list('id', 'name')
+        for pk, name in rows.iterator():
+            catalog['ids'][pk] = name
+            catalog['names'].setdefault(name, pk)
+        cache.set(key, catalog, SalesCache.CACHE_TIMEOUT_LONG)
+    return catalog
+
+
+def sales_by_product(queryset, aggregates, order_by, limit=None, model=Product, field='product'):
+    """
+    Group a Sale/CashSale queryset per product: [{'product_id', 'item',
+    **aggregates}, ...] sorted by `order_by` (e.g. '-total_revenue').
+
+    Lines linked to a product (`field`) are grouped on the integer key and
+    labelled with the product's current name from the cached catalog (or the
+    lines' item name while the catalog has not caught up); lines without a
+    product (e.g. sold before it was deleted) are grouped by their item name
+    as before. Several rows can therefore share an 'item' label.
+    """
+    names = catalog_names(model)['ids']
+    linked = queryset.filter(**{f'{field}__isnull': False}).order_by().values(f'{field}_id').annotate(
+        line_item=Max('item'), **aggregates
+    ).order_by(order_by)
+    unlinked = queryset.filter(**{f'{field}__isnull': True}).exclude(item__isnull=True).exclude(
+        item=''
+    ).order_by().values('item').annotate(**aggregates).order_by(order_by)
+    if limit is not None:
+        linked, unlinked = linked[:limit], unlinked[:limit]
+
+    rows = []
+    for row in linked:
+        product_id = row.pop(f'{field}_id')
+        line_item = row.pop('line_item')
+        rows.append({'product_id': product_id, 'item': names.get(product_id) or line_item, **row})
+    rows.extend({'product_id': None, **row} for row in unlinked)
+
+    key = order_by.lstrip('-')
+    rows.sort(key=lambda row: row[key] or 0, reverse=order_by.startswith('-'))
+    return rows[:limit] if limit is not None else rows
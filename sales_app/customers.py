@@ -0,0 +1,254 @@
+"""
+Customer linking and running totals.
+
+Invoices of both departments are linked to a Customer by phone number
+(see CustomerLedger.phone_key), and each customer carries running totals
+over its invoices so that per-customer reports read one indexed row per
+customer instead of grouping the invoice tables by name.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import CashInvoice, Customer, Invoice
+
+
+class CustomerLedger:
+    """
+    Keeps Customer links and totals in step with Invoice and CashInvoice.
+
+    Each non-cancelled invoice contributes (1, total, unpaid balance) to its
+    customer's (invoice_count, lifetime_spend, outstanding); cash invoices
+    are settled immediately and have no balance. Saves apply the difference
+    between the old and new contribution and deletes remove it, like
+    SalesRollup does for the daily rollups. first/last_purchase only move
+    outwards incrementally and are re-read from the (customer, date_of_sale)
+    index when an invoice leaves a customer or changes date.
+
+    Invoices without a usable phone number are not linked.
+    """
+
+    MODELS = (Invoice, CashInvoice)
+    MIN_PHONE_DIGITS = 7
+
+    TRACKED_FIELDS = ['customer_id', 'date_of_sale', 'payment_status', 'total', 'amount_paid']
+    TOTAL_FIELDS = ['invoice_count', 'lifetime_spend', 'outstanding', 'first_purchase', 'last_purchase']
+
+    # report: ordering, each served by an index on Customer
+    ORDERINGS = {
+        'spend': ('-lifetime_spend', 'id'),
+        'outstanding': ('-outstanding', 'id'),
+        'recent': ('-last_purchase', 'id'),
+    }
+
+    # === LINKING ===
+
+    @classmethod
+    def phone_key(cls, phone):
+        """Dedupe key of a phone number, or None when it has too few digits"""
+        digits = ''.join(ch for ch in (phone or '') if ch.isdigit())
+        if len(digits) < cls.MIN_PHONE_DIGITS:
+            return None
+        return digits[-getattr(settings, 'CUSTOMER_PHONE_DIGITS', 9):]
+
+    @classmethod
+    def resolve(cls, name, phone):
+        """The Customer for `phone`, created on first sight; None without a usable phone"""
+        key = cls.phone_key(phone)
+        if key is None:
+            return None
+        customer = Customer.objects.filter(phone_key=key).first()
+        if customer is None:
+            try:
+                with transaction.atomic():
+                    customer = Customer.objects.create(
+                        phone_key=key, phone=phone.strip(), name=(name or '').strip()
+                    )
+            except IntegrityError:
+                # Created concurrently by another worker
+                customer = Customer.objects.get(phone_key=key)
+        elif not customer.name and name and name.strip():
+            customer.name = name.strip()
+            Customer.objects.filter(pk=customer.pk, name='').update(name=customer.name)
+        return customer
+
+    @classmethod
+    def resolve_many(cls, contacts):
+        """
+        {phone key: Customer} for an iterable of (name, phone) pairs, with two
+        queries and one bulk insert however many pairs there are
+        """
+        first_seen = {}
+        for name, phone in contacts:
+            key = cls.phone_key(phone)
+            if key is not None and key not in first_seen:
+                first_seen[key] = ((name or '').strip(), phone.strip())
+
+        customers = Customer.objects.in_bulk(list(first_seen), field_name='phone_key')
+        missing = [
+            Customer(phone_key=key, name=name, phone=phone)
+            for key, (name, phone) in first_seen.items() if key not in customers
+        ]
+        if missing:
+            Customer.objects.bulk_create(missing, batch_size=500, ignore_conflicts=True)
+            customers.update(Customer.objects.in_bulk(
+                [customer.phone_key for customer in missing], field_name='phone_key'
+            ))
+        return customers
+
+    @classmethod
+    def needs_link(cls, instance, update_fields=None):
+        """Whether a save should (re)link the invoice from its phone number"""
+        if update_fields is not None and 'customer' not in update_fields:
+            return False
+        if instance.customer_id is None:
+            return True
+        return not instance._state.adding and instance.has_snapshot and instance.has_changed('customer_phone')
+
+    # === INCREMENTAL MAINTENANCE ===
+
+    @classmethod
+    def snapshot(cls, instance):
+        """Return the invoice's contribution as (customer id, values, date), or None"""
+        return cls.snapshot_values(type(instance), {
+            name: getattr(instance, name)
+            for name in cls.tracked_fields(type(instance))
+        })
+
+    @classmethod
+    def snapshot_values(cls, model, values):
+        customer_id = values.get('customer_id')
+        if customer_id is None or values.get('payment_status') == 'cancelled':
+            return None
+        total = Decimal(str(values.get('total') or 0))
+        outstanding = Decimal('0')
+        if issubclass(model, Invoice):
+            outstanding = max(total - Decimal(str(values.get('amount_paid') or 0)), Decimal('0'))
+        date_of_sale = Invoice._meta.get_field('date_of_sale').to_python(values.get('date_of_sale'))
+        return customer_id, (1, total, outstanding), date_of_sale
+
+    @classmethod
+    def tracked_fields(cls, model):
+        return [f for f in cls.TRACKED_FIELDS if f != 'amount_paid' or issubclass(model, Invoice)]
+
+    @classmethod
+    def record_change(cls, before, after):
+        """Move an invoice's contribution from `before` to `after` (either may be None)"""
+        if before == after:
+            return
+        deltas = {}
+        for snapshot, sign in ((before, -1), (after, 1)):
+            if snapshot is None:
+                continue
+            customer_id, values, _ = snapshot
+            current = deltas.get(customer_id, (0, Decimal('0'), Decimal('0')))
+            deltas[customer_id] = tuple(c + sign * v for c, v in zip(current, values))
+
+        with transaction.atomic():
+            for customer_id, values in deltas.items():
+                purchased = after[2] if after is not None and after[0] == customer_id else None
+                cls.apply_delta(customer_id, *values, purchased=purchased)
+            if before is not None and (after is None or before[0] != after[0] or before[2] != after[2]):
+                # The invoice may have held the customer's first or last purchase
+                cls.refresh_dates([before[0]])
+
+    @classmethod
+    def apply_delta(cls, customer_id, invoice_count, lifetime_spend, outstanding, purchased=None):
+        """Add the given amounts to a customer's totals, widening its purchase dates to `purchased`"""
+        changes = {
+            'invoice_count': F('invoice_count') + invoice_count,
+            'lifetime_spend': F('lifetime_spend') + lifetime_spend,
+            'outstanding': F('outstanding') + outstanding,
+        }
+        if purchased is not None:
+            # GREATEST/LEAST return NULL for a NULL argument on some databases
+            changes['first_purchase'] = Least(Coalesce(F('first_purchase'), Value(purchased)), Value(purchased))
+            changes['last_purchase'] = Greatest(Coalesce(F('last_purchase'), Value(purchased)), Value(purchased))
+        Customer.objects.filter(pk=customer_id).update(**changes)
+
+    @classmethod
+    def refresh_dates(cls, customer_ids):
+        """Re-read first/last purchase of the given customers from their invoices"""
+        for customer_id in customer_ids:
+            first, last = None, None
+            for model in cls.MODELS:
+                row = model.objects.filter(customer_id=customer_id).exclude(
+                    payment_status='cancelled'
+                ).aggregate(first=Min('date_of_sale'), last=Max('date_of_sale'))
+                first = min(filter(None, [first, row['first']]), default=None)
+                last = max(filter(None, [last, row['last']]), default=None)
+            Customer.objects.filter(pk=customer_id).update(first_purchase=first, last_purchase=last)
+
+    # === RECOMPUTE ===
+
+    @classmethod
+    def recompute(cls, customer_ids=None, batch_size=500):
+        """
+        Recompute the totals of the given customers (all by default) from
+        their invoices with grouped queries, `batch_size` customers at a
+        time. Returns the number of customers updated.
+        """
+        if customer_ids is None:
+            customer_ids = Customer.objects.order_by('id').values_list('id', flat=True)
+        customer_ids = list(customer_ids)
+        updated = 0
+        for start in range(0, len(customer_ids), batch_size):
+            batch = customer_ids[start:start + batch_size]
+            totals = {
+                pk: {'invoice_count': 0, 'lifetime_spend': Decimal('0'), 'outstanding': Decimal('0'),
+                     'first_purchase': None, 'last_purchase': None}
+                for pk in batch
+            }
+            for model in cls.MODELS:
+                aggregates = {
+                    'count': Count('id'),
+                    'spend': Sum('total'),
+                    'first': Min('date_of_sale'),
+                    'last': Max('date_of_sale'),
+                }
+                if model is Invoice:
+                    aggregates['balance'] = Sum('balance_due', filter=Q(balance_due__gt=0))
+                rows = model.objects.filter(customer_id__in=batch).exclude(
+                    payment_status='cancelled'
+                ).order_by().values('customer_id').annotate(**aggregates)
+                for row in rows:
+                    entry = totals[row['customer_id']]
+                    entry['invoice_count'] += row['count']
+                    entry['lifetime_spend'] += row['spend'] or 0
+                    entry['outstanding'] += row.get('balance') or 0
+                    entry['first_purchase'] = min(filter(None, [entry['first_purchase'], row['first']]), default=None)
+                    entry['last_purchase'] = max(filter(None, [entry['last_purchase'], row['last']]), default=None)
+
+            customers = [Customer(pk=pk, **values) for pk, values in totals.items()]
+            Customer.objects.bulk_update(customers, cls.TOTAL_FIELDS, batch_size=batch_size)
+            updated += len(customers)
+        return updated
+
+    # === READS ===
+
+    @classmethod
+    def top(cls, order='spend', limit=20):
+        """Customers ranked by lifetime spend, outstanding balance or last purchase"""
+        if order not in cls.ORDERINGS:
+            raise ValueError(f"order must be one of {', '.join(cls.ORDERINGS)}")
+        queryset = Customer.objects.order_by(*cls.ORDERINGS[order])
+        if order == 'outstanding':
+            queryset = queryset.filter(outstanding__gt=0)
+        elif order == 'recent':
+            queryset = queryset.filter(last_purchase__isnull=False)
+        return queryset[:limit]
+
+    @classmethod
+    def history(cls, customer, limit=50):
+        """The customer's latest invoices of both departments as (department, invoice), newest first"""
+        entries = []
+        for department, model in (('regular', Invoice), ('cash', CashInvoice)):
+            invoices = model.objects.filter(customer=customer).order_by('-date_of_sale', '-id')[:limit]
+            entries.extend((department, invoice) for invoice in invoices)
+        entries.sort(key=lambda entry: (
+            entry[1].date_of_sale.toordinal() if entry[1].date_of_sale else 0, entry[1].pk
+        ), reverse=True)
+        return entries[:limit]
@@ -1,5 +1,112 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
 from .models import Invoice, Sale, Product, CashInvoice, CashSale, CashProduct
+from .catalog import catalog_names
+
+
+# === PRODUCT PICKER ===
+
+class ProductLookupWidget(forms.Select):
+    """
+    A <select> that renders only the empty and the selected option. Select2
+    fetches the other choices from `lookup_url` (the product search API) as
+    the user types, so a formset row no longer carries the whole catalog.
+    """
+
+    def __init__(self, model, lookup_url, placeholder='enter item...', attrs=None):
+        attrs = {'data-lookup-url': lookup_url, **(attrs or {})}
+        super().__init__(attrs=attrs)
+        self.model = model
+        self.placeholder = placeholder
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        # lookup_url may be lazy; resolve it for rendering
+        context['widget']['attrs']['data-lookup-url'] = str(self.attrs['data-lookup-url'])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v not in ('', None)]
+        options = [self.create_option(name, '', self.placeholder, not selected, 0, attrs=attrs)]
+        names = catalog_names(self.model)['ids']
+        for index, pk in enumerate(selected, start=1):
+            label = names.get(int(pk)) if str(pk).isdigit() else None
+            if label is not None:
+                options.append(self.create_option(name, pk, label, True, index, attrs=attrs))
+        return [(None, options, 0)]
+
+
+class ProductLookupField(forms.Field):
+    """
+    Product picker for the Sale/CashSale `item` name column. Accepts a
+    product id (as submitted by Select2) and cleans to the product name,
+    validated against the cached name map instead of a queryset.
+    """
+
+    default_error_messages = {
+        'invalid_choice': 'Select a valid choice. That choice is not one of the available choices.',
+    }
+
+    def __init__(self, model, lookup_url, placeholder='enter item...', **kwargs):
+        self.model = model
+        kwargs.setdefault('widget', ProductLookupWidget(model, lookup_url, placeholder))
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        """Initial values are product ids or names (Sale.item); render them as ids"""
+        if value in self.empty_values:
+            return ''
+        catalog = catalog_names(self.model)
+        if isinstance(value, int) or str(value).isdigit():
+            if int(value) in catalog['ids']:
+                return int(value)
+        # Names of products that no longer exist render as blank, as before
+        return catalog['names'].get(value, '')
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        catalog = catalog_names(self.model)
+        value = str(value).strip()
+        name = catalog['ids'].get(int(value)) if value.isdigit() else None
+        if name is None and value in catalog['names']:
+            name = value
+        if name is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return name
+
+
+class ProductLinkMixin:
+    """
+    For Sale/CashSale forms: keeps the product foreign key (`product_field`)
+    next to the `item` name snapshot. Rows are edited by their linked
+    product, so a renamed product still shows (and saves) under its current
+    name, and the submitted id is linked as picked.
+    """
+
+    product_field = 'product'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        product_id = getattr(self.instance, f'{self.product_field}_id')
+        if product_id:
+            self.initial['item'] = product_id
+
+    def clean(self):
+        cleaned_data = super().clean()
+        name = cleaned_data.get('item')
+        product_id = None
+        if name:
+            catalog = catalog_names(self.fields['item'].model)
+            submitted = str(self['item'].data or '').strip()
+            if submitted.isdigit() and catalog['ids'].get(int(submitted)) == name:
+                product_id = int(submitted)
+            else:
+                product_id = catalog['names'].get(name)
+        setattr(self.instance, f'{self.product_field}_id', product_id)
+        cleaned_data[f'{self.product_field}_id'] = product_id
+        return cleaned_data
 
 
 # Form for uploading a CSV file
@@ -34,16 +141,15 @@ class InvoiceForm(forms.ModelForm):
         }
 
 
-class SaleForm(forms.ModelForm):
+class SaleForm(ProductLinkMixin, forms.ModelForm):
     # --- Override the 'item' field here ---
-    # Define it as a ModelChoiceField directly in the form class, not in Meta.widgets
-    item = forms.ModelChoiceField(
-        queryset=Product.objects.all().order_by('name'),
-        empty_label="enter item...",
+    # Submitted as a product id from the Select2 search box and cleaned to the
+    # product name stored in Sale.item. Only the selected option is rendered.
+    item = ProductLookupField(
+        Product,
+        lookup_url=reverse_lazy('product_autocomplete'),
+        placeholder="enter item...",
         required=False,
-        # You can optionally specify the widget and its attributes here if needed,
-        # although widget_tweaks in the template usually handles styling.
-        # widget=forms.Select(attrs={'class': 'form-control'}) 
     )
     # --- End of field override ---
 
@@ -59,37 +165,9 @@ class SaleForm(forms.ModelForm):
             'total_price': forms.NumberInput(attrs={'class': 'form-control', 'readonly': 'readonly'}),
         }
 
-    # --- Add the clean_item method ---
-    def clean_item(self):
-        """
-        Convert the selected Product instance back to its name string
-        for saving into the Sale.item CharField.
-        """
-        data = self.cleaned_data['item']
-        # data is either a Product instance or None
-        if data:
-            return data.name # Return the name of the product
-        return data # Return None if no product was selected
-
-    # --- Add the __init__ method ---
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # If this form is for editing an existing Sale instance
-        if self.instance and self.instance.pk and self.instance.item:
-            try:
-                # Try to find the Product object whose name matches the Sale.item string
-                product = Product.objects.get(name=self.instance.item)
-                # Set the initial value of the 'item' field to this Product instance
-                self.initial['item'] = product
-            except Product.DoesNotExist:
-                # If the name in Sale.item doesn't match any current Product,
-                # the field will just be blank/empty_label, which is fine.
-                pass
-        # Ensure the 'item' field has the correct classes applied via widget_tweaks
-        # The widget_tweaks filter in the template handles the 'form-control' class.
-        # If you needed to set it here, you could do:
-        # if 'item' in self.fields:
-        #     self.fields['item'].widget.attrs.update({'class': 'form-control'})
+    # When editing, the row's linked product (or, for unlinked rows, its
+    # Sale.item name) is rendered by ProductLookupField.prepare_value from the
+    # cached catalog, no query.
 
 
 # === CASH DEPARTMENT FORMS ===
@@ -118,13 +196,20 @@ class CashInvoiceForm(forms.ModelForm):
         }
 
 
-class CashSaleForm(forms.ModelForm):
+class CashSaleForm(ProductLinkMixin, forms.ModelForm):
     """Form for cash sale items with amount-based pricing"""
-    # Override the 'item' field to use CashProduct
-    item = forms.ModelChoiceField(
-        queryset=CashProduct.objects.all().order_by('name'),
-        empty_label="enter item...",
+    product_field = 'cash_product'
+
+    # Cash product picker backed by the cash product search API
+    item = ProductLookupField(
+        CashProduct,
+        lookup_url=reverse_lazy('cash_product_search_api'),
+        placeholder="enter item...",
         required=False,
+        widget=ProductLookupWidget(
+            CashProduct, reverse_lazy('cash_product_search_api'), "enter item...",
+            attrs={'class': 'cash-item-select'},
+        ),
     )
 
     class Meta:
@@ -135,19 +220,4 @@ class CashSaleForm(forms.ModelForm):
             'rate': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.0001', 'readonly': 'readonly'}),
             'total_price': forms.NumberInput(attrs={'class': 'form-control', 'readonly': 'readonly'}),
         }
-    
-    def clean_item(self):
-        """Convert the selected CashProduct instance back to its name string"""
-        data = self.cleaned_data['item']
-        if data:
-            return data.name
-        return data
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        if self.instance and self.instance.pk and self.instance.item:
-            try:
-                product = CashProduct.objects.get(name=self.instance.item)
-                self.initial['item'] = product
-            except CashProduct.DoesNotExist:
-                pass
+
@@ -0,0 +1,308 @@
+"""
+Streaming CSV import of historical sales.
+
+The upload is saved to storage and imported by a background job (task
+'sales.import_csv', see core.jobs): rows are read from the stored file in
+chunks of CHUNK_SIZE, each chunk resolves its invoices with one in_bulk
+lookup and writes new invoices and sale lines with bulk_create in its own
+transaction. Progress is reported on the Job and rejected rows are written
+to a downloadable CSV with the reason per row.
+"""
+import csv
+import io
+import logging
+import os
+import tempfile
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from core.jobs import enqueue
+
+from .cache_utils import CacheNamespace
+from .catalog import catalog_names
+from .customers import CustomerLedger
+from .invalidation import CacheInvalidator
+from .models import Invoice, Product, Sale
+from .rollups import SalesRollup
+from .signals import invoices_imported
+
+logger = logging.getLogger(__name__)
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+class SalesImport:
+    """
+    One CSV import, run by a Job:
+
+        job = SalesImport.start(csv_file, user=request.user)
+        job.progress  # {'processed': ..., 'imported': ..., 'failed': ...}
+
+    Rows are keyed by invoice number like the original importer: the first
+    row of an invoice number creates the invoice (existing invoices are
+    reused as they are) and every row adds one sale line to it.
+    """
+
+    TASK = 'sales.import_csv'
+    CHUNK_SIZE = 1000
+    STORAGE_DIR = 'imports'
+
+    # Above this many (date, status) groups per chunk the chunk's date range
+    # is rebuilt instead of applying rollup deltas group by group
+    MAX_DELTA_GROUPS = 200
+
+    # Accepted header names per value, first match wins
+    COLUMNS = {
+        'date_of_sale': ('Date of Sale', 'DATE_TODAY'),
+        'invoice_no': ('Invoice No', 'INV NO'),
+        'customer_name': ('Customer Name', 'CUSTOMER NA'),
+        'customer_phone': ('Customer Phone', 'CUSTOMER_PHONE', 'Phone'),
+        'item': ('Item', 'TYPE OF JOB'),
+        'quantity': ('Quantity', 'QTY'),
+        'unit_price': ('Unit Price', 'UP'),
+        'total_amount': ('total_amount', 'T AMT'),
+        'amount_paid': ('AMT PAID',),
+    }
+
+    # Sale.unit_price/total_price hold 10 digits, 2 of them decimals
+    MAX_AMOUNT = Decimal('1e8')
+
+    DATE_FORMATS = ('%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d')
+
+    def __init__(self, source, job=None, bytes_total=0):
+        self.source = source
+        self.job = job
+        self.state = {
+            'processed': 0,
+            'imported': 0,
+            'failed': 0,
+            'invoices_created': 0,
+            'bytes_read': 0,
+            'bytes_total': bytes_total,
+            'error_file': None,
+        }
+
+    # === PUBLIC API ===
+
+    @classmethod
+    def start(cls, csv_file, user=None):
+        """Store the upload and queue its import. Returns the Job."""
+        source = default_storage.save(f'{cls.STORAGE_DIR}/{uuid.uuid4().hex}.csv', csv_file)
+        job = enqueue(cls.TASK, user=user, source=source, bytes_total=csv_file.size or 0)
+        logger.info(f"Queued sales import of {source} as job {job.pk}")
+        return job
+
+    @property
+    def error_file_name(self):
+        return f'{os.path.splitext(self.source)[0]}_errors.csv'
+
+    def run(self):
+        """Import the stored CSV, chunk by chunk. Returns the final counts."""
+        self._save_progress()
+        try:
+            with default_storage.open(self.source, 'rb') as raw, \
+                    tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as errors:
+                reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+                error_writer = None
+                row_number = 2  # header is line 1
+                while True:
+                    chunk = list(islice(reader, self.CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    rejected = self.import_chunk(list(enumerate(chunk, start=row_number)))
+                    row_number += len(chunk)
+
+                    if rejected:
+                        if error_writer is None:
+                            error_writer = csv.writer(errors)
+                            error_writer.writerow(['Row', 'Error', *reader.fieldnames])
+                        for number, row, reason in rejected:
+                            error_writer.writerow([number, reason, *(row.get(f, '') for f in reader.fieldnames)])
+
+                    self.state['processed'] += len(chunk)
+                    self.state['failed'] += len(rejected)
+                    self.state['imported'] += len(chunk) - len(rejected)
+                    self.state['bytes_read'] = raw.tell()
+                    self._save_progress()
+
+                if error_writer is not None:
+                    errors.seek(0)
+                    default_storage.delete(self.error_file_name)
+                    self.state['error_file'] = default_storage.save(self.error_file_name, File(errors))
+            self.state['bytes_read'] = self.state['bytes_total']
+        finally:
+            # Imports are not retried (rows of committed chunks would be
+            # imported twice), so the upload is not needed any more
+            default_storage.delete(self.source)
+            self._save_progress()
+        logger.info(
+            f"Sales import of {self.source}: "
+            f"{self.state['imported']} imported, {self.state['failed']} rejected"
+        )
+        return self.state
+
+    # === CHUNKS ===
+
+    def import_chunk(self, rows):
+        """
+        Import [(row number, row dict), ...]. Returns the rejected rows as
+        [(row number, row, reason), ...].
+        """
+        rejected = []
+        parsed = []
+        for number, row in rows:
+            try:
+                parsed.append((number, row, self.parse_row(row)))
+            except ImportRowError as e:
+                rejected.append((number, row, str(e)))
+        if not parsed:
+            return rejected
+
+        try:
+            with transaction.atomic():
+                self.state['invoices_created'] += self._write(parsed)
+        except Exception as e:
+            # e.g. an invoice number created concurrently: reject the chunk
+            logger.error(f"Sales import of {self.source}: chunk at row {parsed[0][0]} failed: {e}")
+            rejected.extend((number, row, f"Not imported: {e}") for number, row, _ in parsed)
+            rejected.sort(key=lambda entry: entry[0])
+        return rejected
+
+    def _write(self, parsed):
+        numbers = {values['invoice_no'] for _, _, values in parsed}
+        invoices = Invoice.objects.in_bulk(numbers, field_name='invoice_no')
+
+        customers = CustomerLedger.resolve_many(
+            (values['customer_name'], values['customer_phone'])
+            for _, _, values in parsed if values['invoice_no'] not in invoices
+        )
+        new_invoices = {}
+        for _, _, values in parsed:
+            number = values['invoice_no']
+            if number in invoices or number in new_invoices:
+                continue
+            invoice = Invoice(
+                invoice_no=number,
+                customer_name=values['customer_name'],
+                customer_phone=values['customer_phone'],
+                date_of_sale=values['date_of_sale'],
+                amount_paid=values['amount_paid'],
+                total=values['total_amount'],
+                customer=customers.get(CustomerLedger.phone_key(values['customer_phone'])),
+            )
+            # bulk_create skips Invoice.save()
+            invoice.update_payment_status()
+            new_invoices[number] = invoice
+        Invoice.objects.bulk_create(new_invoices.values(), batch_size=500)
+        invoices.update(new_invoices)
+
+        # bulk_create skips Sale.save(), which links the product by name
+        product_ids = catalog_names(Product)['names']
+        Sale.objects.bulk_create([
+            Sale(
+                invoice=invoices[values['invoice_no']],
+                item=values['item'],
+                product_id=product_ids.get(values['item']),
+                unit_price=values['unit_price'],
+                quantity=values['quantity'],
+                total_price=values['total_amount'],
+            )
+            for _, _, values in parsed
+        ], batch_size=500)
+
+        # No post_save for bulk_create: keep rollups, customers, caches and
+        # periods in step
+        dates = sorted({invoice.date_of_sale for invoice in new_invoices.values()})
+        self._record_rollups(new_invoices.values(), dates)
+        CustomerLedger.recompute({invoice.customer_id for invoice in new_invoices.values() if invoice.customer_id})
+        CacheInvalidator.mark(CacheNamespace.SALES, dates=dates)
+        invoices_imported.send(sender=Invoice, dates=dates)
+        return len(new_invoices)
+
+    def _record_rollups(self, invoices, dates):
+        deltas = {}
+        for invoice in invoices:
+            snapshot = SalesRollup.snapshot(invoice)
+            if snapshot is None:
+                continue
+            key, values = snapshot
+            current = deltas.get(key, (0, Decimal('0'), Decimal('0')))
+            deltas[key] = tuple(c + v for c, v in zip(current, values))
+
+        if len(deltas) > self.MAX_DELTA_GROUPS:
+            SalesRollup.rebuild(dates[0], dates[-1], 'regular')
+            return
+        for key, values in deltas.items():
+            SalesRollup.apply_delta(key, *values)
+
+    # === PARSING ===
+
+    @classmethod
+    def value(cls, row, name):
+        for column in cls.COLUMNS[name]:
+            value = row.get(column)
+            if value:
+                return value.strip()
+        return ''
+
+    @classmethod
+    def parse_row(cls, row):
+        """Validated values of one CSV row; raises ImportRowError"""
+        invoice_no = cls.value(row, 'invoice_no')
+        if not invoice_no:
+            raise ImportRowError("Missing invoice number")
+        if len(invoice_no) > Invoice._meta.get_field('invoice_no').max_length:
+            raise ImportRowError(f"Invoice number '{invoice_no}' is too long")
+
+        try:
+            quantity = int(float(cls.value(row, 'quantity') or 1))
+        except ValueError:
+            raise ImportRowError(f"Invalid quantity '{cls.value(row, 'quantity')}'")
+
+        return {
+            'invoice_no': invoice_no,
+            'date_of_sale': cls.parse_date(cls.value(row, 'date_of_sale')),
+            'customer_name': cls.value(row, 'customer_name') or None,
+            'customer_phone': cls.value(row, 'customer_phone')[:20] or None,
+            'item': cls.value(row, 'item') or None,
+            'quantity': quantity,
+            'unit_price': cls.parse_amount(row, 'unit_price'),
+            'total_amount': cls.parse_amount(row, 'total_amount'),
+            'amount_paid': cls.parse_amount(row, 'amount_paid'),
+        }
+
+    @classmethod
+    def parse_amount(cls, row, name):
+        raw = cls.value(row, name).replace(',', '')
+        try:
+            amount = Decimal(raw or '0').quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise ImportRowError(f"Invalid amount '{raw}' for {cls.COLUMNS[name][0]}")
+        if not amount.is_finite() or abs(amount) >= cls.MAX_AMOUNT:
+            raise ImportRowError(f"Invalid amount '{raw}' for {cls.COLUMNS[name][0]}")
+        return amount
+
+    @classmethod
+    def parse_date(cls, raw):
+        """DD/MM/YYYY, DD-MM-YYYY or YYYY-MM-DD; blank dates default to today"""
+        if not raw or raw == ';':
+            return timezone.now().date()
+        for date_format in cls.DATE_FORMATS:
+            try:
+                return datetime.strptime(raw, date_format).date()
+            except ValueError:
+                continue
+        raise ImportRowError(f"Could not parse date '{raw}'")
+
+    def _save_progress(self):
+        if self.job is not None:
+            self.job.set_progress(**self.state)
@@ -0,0 +1,89 @@
+"""
+Per-transaction / per-request coalescing of cache invalidation
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.db import transaction
+
+from .cache_utils import SalesCache, CacheNamespace
+
+
+class CacheInvalidator:
+    """
+    Collects dirty cache namespaces and sale dates and invalidates them once.
+
+    Signal handlers call mark() instead of touching the cache directly:
+
+    - inside a request wrapped by CacheInvalidationMiddleware (or a collect()
+      block) everything is flushed once when the request/block ends;
+    - otherwise inside transaction.atomic() the flush is deferred with
+      transaction.on_commit, so readers never re-cache data that is not
+      committed yet, and nothing is invalidated if the transaction rolls back;
+    - outside any transaction the flush happens immediately.
+
+    Saving a 20-line invoice therefore bumps the sales generation once
+    instead of once per Sale row.
+    """
+
+    _local = threading.local()
+
+    @classmethod
+    def _state(cls):
+        state = cls._local
+        if not hasattr(state, 'namespaces'):
+            state.namespaces = set()
+            state.dates = set()
+            state.depth = 0
+        return state
+
+    @classmethod
+    def mark(cls, *namespaces, dates=()):
+        """Record that `namespaces` (and the daily summaries for `dates`) are stale"""
+        state = cls._state()
+        state.namespaces.update(namespaces)
+        for date in dates:
+            if date is None:
+                continue
+            state.dates.add(date.date() if isinstance(date, datetime) else date)
+
+        if state.depth:
+            # Flushed by the enclosing collect() block
+            return
+        if transaction.get_connection().in_atomic_block:
+            # Registered on every mark: callbacks of a rolled back savepoint
+            # are discarded, and flushing an empty collector is a no-op.
+            transaction.on_commit(cls.flush)
+        else:
+            cls.flush()
+
+    @classmethod
+    def flush(cls):
+        """Apply all pending invalidations"""
+        state = cls._state()
+        namespaces, dates = state.namespaces, state.dates
+        state.namespaces, state.dates = set(), set()
+
+        if namespaces:
+            CacheNamespace.bump(*sorted(namespaces))
+        if CacheNamespace.SALES not in namespaces:
+            # A sales bump already covers every daily summary
+            for date in dates:
+                SalesCache.invalidate_daily_cache(date)
+
+    @classmethod
+    @contextmanager
+    def collect(cls):
+        """Defer all invalidation inside the block to a single flush at the end"""
+        state = cls._state()
+        state.depth += 1
+        try:
+            yield
+        finally:
+            state.depth -= 1
+            if not state.depth:
+                if transaction.get_connection().in_atomic_block:
+                    transaction.on_commit(cls.flush)
+                else:
+                    cls.flush()
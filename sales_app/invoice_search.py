@@ -0,0 +1,144 @@
+"""
+Invoice search and listing for the manager dashboard and its printouts.
+
+Results are keyset-paginated on (-date_of_sale, -id), so a deep page is an
+index range scan instead of an OFFSET over every earlier match, and the
+count and total of a search are cached per filter signature instead of
+being aggregated over the whole match set on every page. Customer and
+invoice number fields are matched through the search index (see
+sales_app.search_index).
+"""
+import hashlib
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from core.pagination import KeysetPaginator
+from .cache_utils import CacheNamespace, SalesCache
+from .models import CashInvoice, Invoice
+from .rollups import SalesRollup
+from .search_index import InvoiceSearchIndex
+
+
+class InvoiceSearch:
+    """
+    Invoices of one department matching the dashboard search fields.
+
+    match='any' (the default, as the dashboard always searched) lists
+    invoices matching any filled-in field (OR); match='all' requires every
+    field to match (AND), so a date range narrows the scan through the
+    date_of_sale and (customer_name, date_of_sale) indexes. Without search
+    fields today's invoices are listed.
+    """
+
+    FIELDS = ('start_date', 'end_date', 'customer_name', 'customer_phone', 'invoice_no')
+    MATCH_MODES = ('any', 'all')
+    ORDERING = ('-date_of_sale', '-id')
+    PAGE_SIZE = 25
+
+    def __init__(self, department='regular', match='any', **params):
+        self.department = 'cash' if department == 'cash' else 'regular'
+        self.model = CashInvoice if self.department == 'cash' else Invoice
+        self.match = match if match in self.MATCH_MODES else 'any'
+        self.params = {name: (params.get(name) or '').strip() for name in self.FIELDS}
+        self.start = self._parse_date(self.params['start_date'])
+        self.end = self._parse_date(self.params['end_date'])
+        if not self.start:
+            self.params['start_date'] = ''
+        if not self.end:
+            self.params['end_date'] = ''
+
+    @classmethod
+    def from_request(cls, request):
+        return cls(
+            department=request.GET.get('department', 'regular'),
+            match=request.GET.get('match', 'any'),
+            **{name: request.GET.get(name, '') for name in cls.FIELDS}
+        )
+
+    @staticmethod
+    def _parse_date(value):
+        try:
+            return date.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+
+    @property
+    def has_params(self):
+        return any(self.params.values())
+
+    # === QUERIES ===
+
+    def conditions(self):
+        """One Q per filled-in search field (the date range counts as one)"""
+        conditions = []
+        if self.start or self.end:
+            dates = Q()
+            if self.start:
+                dates &= Q(date_of_sale__gte=self.start)
+            if self.end:
+                dates &= Q(date_of_sale__lte=self.end)
+            conditions.append(dates)
+        for field in ('customer_name', 'customer_phone', 'invoice_no'):
+            if self.params[field]:
+                conditions.append(InvoiceSearchIndex.condition(self.model, field, self.params[field]))
+        return conditions
+
+    def filtered(self):
+        """Matching invoices, unordered and without related data"""
+        queryset = self.model.objects.all()
+        if not self.has_params:
+            return queryset.filter(date_of_sale=timezone.now().date())
+        combined = Q()
+        for condition in self.conditions():
+            combined = combined & condition if self.match == 'all' else combined | condition
+        return queryset.filter(combined)
+
+    def queryset(self):
+        """Matching invoices, newest first, with what the listings display"""
+        queryset = self.filtered().prefetch_related('items')
+        if self.model is Invoice:
+            queryset = queryset.select_related('user')
+        return queryset.order_by(*self.ORDERING)
+
+    def page(self, cursor=None, per_page=None):
+        """One keyset page of results. Raises core.pagination.InvalidCursor."""
+        paginator = KeysetPaginator(self.queryset(), self.ORDERING, per_page or self.PAGE_SIZE)
+        return paginator.page(cursor)
+
+    # === TOTALS ===
+
+    @property
+    def namespace(self):
+        return CacheNamespace.CASH if self.department == 'cash' else CacheNamespace.SALES
+
+    def signature(self):
+        """Stable digest of the department, match mode and search fields"""
+        parts = [self.department, self.match] + [f'{name}={self.params[name]}' for name in self.FIELDS]
+        if not self.has_params:
+            parts.append(str(timezone.now().date()))
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def totals(self):
+        """{'count': matching invoices, 'total': sum of their totals}, cached per signature"""
+        if not self.has_params:
+            # Today's listing is answered by the daily rollup
+            today = timezone.now().date()
+            rollup = SalesRollup.totals(today, today, self.department)
+            return {'count': rollup['invoice_count'], 'total': rollup['total_amount']}
+
+        key = CacheNamespace.key(self.namespace, f'invoice_search_{self.signature()}')
+        result = cache.get(key)
+        if result is None:
+            row = self.filtered().aggregate(count=Count('id'), total=Sum('total'))
+            result = {'count': row['count'], 'total': row['total'] or 0}
+            cache.set(key, result, SalesCache.CACHE_TIMEOUT_MEDIUM)
+        return result
+
+    def query_params(self):
+        """The search as GET parameters, for pagination and print links"""
+        params = {'department': self.department, 'match': self.match}
+        params.update({name: value for name, value in self.params.items() if value})
+        return params
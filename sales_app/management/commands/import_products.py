@@ -4,6 +4,7 @@ from decimal import Decimal
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from sales_app.models import Product
+from sales_app.stock import StockLedger
 
 
 class Command(BaseCommand):
@@ -85,11 +86,18 @@ class Command(BaseCommand):
                             # Create or update product
                             product, created = Product.objects.update_or_create(
                                 name=product_name,
-                                defaults={
+                                defaults={'price': price},
+                                create_defaults={
                                     'price': price,
                                     'stock': 0,  # Default stock to 0
                                 }
                             )
+                            if not created:
+                                # Existing products are reset to 0 as before,
+                                # recorded as a ledger adjustment
+                                StockLedger.set_levels(
+                                    {product_name: 0}, reference='import_products', notes='Reset by product import'
+                                )
 
                             if created:
                                 self.stdout.write(f"✓ Row {row_num}: Created '{product_name}' - {price}")
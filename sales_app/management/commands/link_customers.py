@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sales_app.customers import CustomerLedger
+
+
+class Command(BaseCommand):
+    help = 'Link invoices without a customer to customers by phone number, in batches, and recompute customer totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Invoices linked per transaction (default 1000)')
+        parser.add_argument('--recompute-only', action='store_true',
+                            help='Only recompute the totals of all customers')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if not options['recompute_only']:
+            for model in CustomerLedger.MODELS:
+                linked = self.link(model, batch_size)
+                self.stdout.write(f'Linked {linked} {model._meta.verbose_name_plural}')
+
+        updated = CustomerLedger.recompute(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Recomputed totals of {updated} customer(s)'))
+
+    def link(self, model, batch_size):
+        """Link unlinked invoices of `model` in id order, one batch per transaction"""
+        pending = model.objects.filter(customer__isnull=True, customer_phone__isnull=False).exclude(
+            customer_phone=''
+        ).order_by('id')
+        last_id = 0
+        linked = 0
+        while True:
+            rows = list(pending.filter(id__gt=last_id).values('id', 'customer_name', 'customer_phone')[:batch_size])
+            if not rows:
+                return linked
+            last_id = rows[-1]['id']
+
+            with transaction.atomic():
+                customers = CustomerLedger.resolve_many((row['customer_name'], row['customer_phone']) for row in rows)
+                invoices = []
+                for row in rows:
+                    customer = customers.get(CustomerLedger.phone_key(row['customer_phone']))
+                    if customer is not None:
+                        invoices.append(model(pk=row['id'], customer=customer))
+                model.objects.bulk_update(invoices, ['customer'], batch_size=batch_size)
+            linked += len(invoices)
+            self.stdout.write(f'  {model._meta.verbose_name_plural}: {linked} linked (up to id {last_id})')
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sales_app.catalog import catalog_names
+from sales_app.models import CashProduct, CashSale, Product, Sale
+
+
+class Command(BaseCommand):
+    help = 'Link sale lines without a product to the product named by their item, in id-ordered batches'
+
+    # (sale model, product model, foreign key)
+    TARGETS = [
+        (Sale, Product, 'product'),
+        (CashSale, CashProduct, 'cash_product'),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Sale lines examined per transaction (default 2000)')
+
+    def handle(self, *args, **options):
+        for sale_model, product_model, field in self.TARGETS:
+            linked, unknown = self.link(sale_model, product_model, field, options['batch_size'])
+            label = sale_model._meta.verbose_name_plural
+            self.stdout.write(self.style.SUCCESS(f'Linked {linked} {label}'))
+            if unknown:
+                self.stdout.write(self.style.WARNING(
+                    f'{unknown} {label} left unlinked: no product has their item name'
+                ))
+
+    def link(self, sale_model, product_model, field, batch_size):
+        """Link unlinked lines of `sale_model`; returns (linked, left unlinked)"""
+        # Same rule as Sale.link_product: the oldest product wins a name
+        product_ids = catalog_names(product_model)['names']
+        pending = sale_model.objects.filter(**{f'{field}__isnull': True}).exclude(
+            item__isnull=True
+        ).exclude(item='').order_by('id')
+        last_id = 0
+        linked = unknown = 0
+        while True:
+            rows = list(pending.filter(id__gt=last_id).values_list('id', 'item')[:batch_size])
+            if not rows:
+                return linked, unknown
+            last_id = rows[-1][0]
+
+            by_product = {}
+            for pk, item in rows:
+                product_id = product_ids.get(item)
+                if product_id is None:
+                    unknown += 1
+                else:
+                    by_product.setdefault(product_id, []).append(pk)
+
+            # One UPDATE per product in the batch
+            with transaction.atomic():
+                for product_id, ids in by_product.items():
+                    linked += sale_model.objects.filter(
+                        pk__in=ids, **{f'{field}__isnull': True}
+                    ).update(**{f'{field}_id': product_id})
+            self.stdout.write(f'  {sale_model._meta.verbose_name_plural}: {linked} linked (up to id {last_id})')
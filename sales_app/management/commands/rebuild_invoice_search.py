@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from sales_app.search_index import InvoiceSearchIndex
+
+
+class Command(BaseCommand):
+    help = 'Reinstall and refill the SQLite invoice search table (e.g. after a migration rebuilt an invoice table)'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write('Nothing to rebuild: the search indexes on this database maintain themselves')
+            return
+
+        indexed = InvoiceSearchIndex.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} invoice(s) for search'))
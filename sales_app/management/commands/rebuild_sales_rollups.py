@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from sales_app.rollups import SalesRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailySalesRollup table from invoices for a date range (all dates by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=str, help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', type=str, help='Last date to rebuild (YYYY-MM-DD)')
+        parser.add_argument(
+            '--department',
+            choices=list(SalesRollup.DEPARTMENTS),
+            help='Only rebuild one department',
+        )
+
+    def handle(self, *args, **options):
+        start = self.parse_date(options['start'])
+        end = self.parse_date(options['end'])
+        if start and end and start > end:
+            raise CommandError('--start must be on or before --end')
+
+        written = SalesRollup.rebuild(start, end, options['department'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} rollup row(s) for {start or 'the beginning'} to {end or 'today'}"
+        ))
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
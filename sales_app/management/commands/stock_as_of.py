@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from sales_app.models import Product
+from sales_app.stock import StockLedger
+
+
+class Command(BaseCommand):
+    help = 'Show stock levels as they were at the end of a given date, compared to current stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('date', type=str, help='Date in YYYY-MM-DD format')
+        parser.add_argument(
+            '--changed-only',
+            action='store_true',
+            help='Only list products whose stock has changed since that date',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            as_of_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Date must be in YYYY-MM-DD format')
+
+        levels = StockLedger.as_of(as_of_date)
+
+        self.stdout.write(f"{'Product':<40} {'As of':>10} {'Current':>10}")
+        for product_id, name, stock in Product.objects.order_by('name').values_list('id', 'name', 'stock'):
+            if product_id not in levels:
+                continue
+            past, current = levels[product_id], stock or 0
+            if options['changed_only'] and past == current:
+                continue
+            self.stdout.write(f"{(name or '')[:40]:<40} {past:>10} {current:>10}")
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stock for {len(levels)} product(s) as of {as_of_date}'))
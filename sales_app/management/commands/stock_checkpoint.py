@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from sales_app.stock import StockLedger
+
+
+class Command(BaseCommand):
+    help = 'Snapshot current stock levels so point-in-time stock queries start from a recent checkpoint (run daily)'
+
+    def handle(self, *args, **options):
+        count = StockLedger.create_checkpoint()
+        self.stdout.write(self.style.SUCCESS(f'Checkpointed stock for {count} product(s)'))
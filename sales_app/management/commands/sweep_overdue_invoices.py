@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from sales_app.payment_status import PaymentStatusSweeper
+
+
+class Command(BaseCommand):
+    help = 'Mark unpaid/partial invoices past their due date as overdue (run daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many invoices are due')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = PaymentStatusSweeper.due().count()
+            self.stdout.write(f'{count} invoice(s) would be marked overdue')
+            return
+
+        updated = PaymentStatusSweeper.sweep()
+        self.stdout.write(self.style.SUCCESS(f'Marked {updated} invoice(s) overdue'))
@@ -0,0 +1,18 @@
+"""
+Request middleware for the sales app
+"""
+from .invalidation import CacheInvalidator
+
+
+class CacheInvalidationMiddleware:
+    """
+    Coalesce all cache invalidation triggered while handling a request into
+    one flush after the view has returned (and its transactions committed).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with CacheInvalidator.collect():
+            return self.get_response(request)
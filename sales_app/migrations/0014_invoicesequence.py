@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0013_cashproduct_cashinvoice_cashsale_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=20, unique=True)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-prefix'],
+            },
+        ),
+    ]
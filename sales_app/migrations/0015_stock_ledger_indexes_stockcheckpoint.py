@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0014_invoicesequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField()),
+                ('taken_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['-taken_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'created_at'], name='sales_app_s_product_e8facb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['reference'], name='sales_app_s_referen_69bcef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['created_at'], name='sales_app_s_created_373d8d_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpoint',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='sales_app.product'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stockcheckpoint',
+            unique_together={('product', 'taken_at')},
+        ),
+    ]
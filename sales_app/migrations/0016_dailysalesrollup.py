@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_rollups(apps, schema_editor):
+    """Populate the rollup table from existing invoices"""
+    DailySalesRollup = apps.get_model('sales_app', 'DailySalesRollup')
+    departments = [
+        ('regular', apps.get_model('sales_app', 'Invoice'), 'amount_paid'),
+        ('cash', apps.get_model('sales_app', 'CashInvoice'), 'total'),
+    ]
+    for department, model, paid_field in departments:
+        rows = model.objects.filter(date_of_sale__isnull=False).order_by().values(
+            'date_of_sale', 'user_id', 'payment_status'
+        ).annotate(count=Count('id'), total_sum=Sum('total'), paid_sum=Sum(paid_field))
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(
+                date=row['date_of_sale'],
+                department=department,
+                user_id=row['user_id'],
+                payment_status=row['payment_status'],
+                invoice_count=row['count'],
+                total_amount=row['total_sum'] or 0,
+                amount_paid=row['paid_sum'] or 0,
+            )
+            for row in rows
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0015_stock_ledger_indexes_stockcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('department', models.CharField(choices=[('regular', 'Regular'), ('cash', 'Cash')], max_length=10)),
+                ('payment_status', models.CharField(max_length=10)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0, help_text='Cash invoices are settled immediately, so this mirrors total_amount', max_digits=15)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['department', 'date'], name='sales_app_d_departm_ea456f_idx'), models.Index(fields=['date', 'payment_status'], name='sales_app_d_date_3b7ac2_idx')],
+                'unique_together': {('date', 'department', 'user', 'payment_status')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:09
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0016_dailysalesrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='balance_due',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce(models.F('total'), models.Value(Decimal('0'))), '-', django.db.models.functions.comparison.Coalesce(models.F('amount_paid'), models.Value(Decimal('0')))), output_field=models.DecimalField(decimal_places=2, max_digits=12)),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('payment_status__in', ['unpaid', 'partial', 'overdue'])), fields=['date_of_sale'], name='invoice_open_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('payment_status__in', ['unpaid', 'partial', 'overdue'])), fields=['customer_name', 'date_of_sale'], name='invoice_open_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('payment_status__in', ['unpaid', 'partial', 'overdue'])), fields=['user', 'date_of_sale'], name='invoice_open_user_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+"""
+Optional pg_trgm GIN indexes on product names (PostgreSQL only).
+
+Django's icontains compiles to UPPER(name::text) LIKE UPPER('%q%'), so the
+indexes are built on that expression. Creating the extension needs the
+CREATE privilege on the database; without it the migration logs a warning
+and search falls back to a sequential scan, which is still correct.
+"""
+import logging
+
+from django.db import migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+TRIGRAM_INDEXES = [
+    ('sales_app_product_name_trgm', 'sales_app_product'),
+    ('sales_app_cashproduct_name_trgm', 'sales_app_cashproduct'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for index_name, table in TRIGRAM_INDEXES:
+                schema_editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} '
+                    f'USING gin ((UPPER(name::text)) gin_trgm_ops)'
+                )
+    except Exception as e:
+        logger.warning(f"Skipping pg_trgm product name indexes: {e}")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0017_invoice_balance_due'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:26
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0018_product_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashinvoice',
+            name='search_name',
+            field=models.GeneratedField(db_index=True, db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('customer_name')), output_field=models.CharField(max_length=255, null=True)),
+        ),
+        migrations.AddField(
+            model_name='cashinvoice',
+            name='search_phone',
+            field=models.GeneratedField(db_index=True, db_persist=True, expression=django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(models.F('customer_phone'), models.Value(' '), models.Value('')), models.Value('-'), models.Value('')), models.Value('+'), models.Value('')), models.Value('('), models.Value('')), models.Value(')'), models.Value('')), models.Value('.'), models.Value('')), models.Value('/'), models.Value('')), output_field=models.CharField(max_length=20, null=True)),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='search_name',
+            field=models.GeneratedField(db_index=True, db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('customer_name')), output_field=models.CharField(max_length=255, null=True)),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='search_phone',
+            field=models.GeneratedField(db_index=True, db_persist=True, expression=django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(models.F('customer_phone'), models.Value(' '), models.Value('')), models.Value('-'), models.Value('')), models.Value('+'), models.Value('')), models.Value('('), models.Value('')), models.Value(')'), models.Value('')), models.Value('.'), models.Value('')), models.Value('/'), models.Value('')), output_field=models.CharField(max_length=20, null=True)),
+        ),
+    ]
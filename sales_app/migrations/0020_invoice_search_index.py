@@ -0,0 +1,108 @@
+"""
+Substring search indexes over the normalized invoice customer fields.
+
+- PostgreSQL: pg_trgm GIN indexes on search_name, search_phone and
+  UPPER(invoice_no) for both departments. As in 0018, a missing CREATE
+  privilege only logs a warning.
+- SQLite: an FTS5 table with the trigram tokenizer (SQLite 3.34+) holding
+  both departments (rowid = id * 2 for invoices, id * 2 + 1 for cash
+  invoices), kept in sync by triggers. Without FTS5 a warning is logged.
+
+Either way search falls back to scanning the normalized columns, which is
+still correct. See sales_app.search_index.
+"""
+import logging
+
+from django.db import migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TABLES = [
+    ('sales_app_invoice', 0),
+    ('sales_app_cashinvoice', 1),
+]
+
+FTS_TABLE = 'sales_app_invoice_search'
+
+TRIGRAM_COLUMNS = [
+    ('search_name', 'search_name'),
+    ('search_phone', 'search_phone'),
+    ('invoice_no', '(UPPER(invoice_no::text))'),
+]
+
+
+def create_postgresql_indexes(schema_editor):
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for table, _ in INVOICE_TABLES:
+                for name, expression in TRIGRAM_COLUMNS:
+                    schema_editor.execute(
+                        f'CREATE INDEX IF NOT EXISTS {table}_{name}_trgm ON {table} '
+                        f'USING gin ({expression} gin_trgm_ops)'
+                    )
+    except Exception as e:
+        logger.warning(f"Skipping pg_trgm invoice search indexes: {e}")
+
+
+def create_sqlite_index(schema_editor):
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(invoice_no, name, phone, tokenize='trigram')"
+            )
+            for table, parity in INVOICE_TABLES:
+                row = f'new.id * 2 + {parity}, new.invoice_no, new.search_name, new.search_phone'
+                schema_editor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN '
+                    f'INSERT INTO {FTS_TABLE} (rowid, invoice_no, name, phone) VALUES ({row}); END'
+                )
+                schema_editor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {table}_search_au '
+                    f'AFTER UPDATE OF invoice_no, customer_name, customer_phone ON {table} BEGIN '
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id * 2 + {parity}; '
+                    f'INSERT INTO {FTS_TABLE} (rowid, invoice_no, name, phone) VALUES ({row}); END'
+                )
+                schema_editor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN '
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id * 2 + {parity}; END'
+                )
+                schema_editor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, invoice_no, name, phone) '
+                    f'SELECT id * 2 + {parity}, invoice_no, search_name, search_phone FROM {table}'
+                )
+    except Exception as e:
+        logger.warning(f"Skipping SQLite FTS5 invoice search table: {e}")
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        create_postgresql_indexes(schema_editor)
+    elif vendor == 'sqlite':
+        create_sqlite_index(schema_editor)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for table, _ in INVOICE_TABLES:
+            for name, _ in TRIGRAM_COLUMNS:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{name}_trgm')
+    elif vendor == 'sqlite':
+        for table, _ in INVOICE_TABLES:
+            for suffix in ('ai', 'au', 'ad'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0019_invoice_search_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
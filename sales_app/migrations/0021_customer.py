@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0020_invoice_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('phone', models.CharField(blank=True, help_text='Phone number as first entered', max_length=20)),
+                ('phone_key', models.CharField(max_length=20, unique=True)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, help_text='Unpaid balance of regular invoices', max_digits=14)),
+                ('first_purchase', models.DateField(blank=True, null=True)),
+                ('last_purchase', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name', 'id'],
+                'indexes': [models.Index(fields=['-lifetime_spend', 'id'], name='customer_spend_idx'), models.Index(condition=models.Q(('outstanding__gt', 0)), fields=['-outstanding', 'id'], name='customer_outstanding_idx'), models.Index(fields=['-last_purchase', 'id'], name='customer_recent_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='cashinvoice',
+            name='customer',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cash_invoices', to='sales_app.customer'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='customer',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='sales_app.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='cashinvoice',
+            index=models.Index(fields=['customer', 'date_of_sale'], name='cashinvoice_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['customer', 'date_of_sale'], name='invoice_customer_date_idx'),
+        ),
+    ]
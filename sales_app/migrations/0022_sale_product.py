@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0021_customer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashsale',
+            name='cash_product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales', to='sales_app.cashproduct'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales', to='sales_app.product'),
+        ),
+    ]
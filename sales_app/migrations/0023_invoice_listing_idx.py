@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0022_sale_product'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cashinvoice',
+            index=models.Index(fields=['-date_of_sale', '-id'], name='cashinvoice_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-date_of_sale', '-id'], name='invoice_listing_idx'),
+        ),
+    ]
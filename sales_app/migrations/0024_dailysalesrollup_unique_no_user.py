@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    """Fold duplicate user-less rollup rows into one per key so the constraint can be added"""
+    DailySalesRollup = apps.get_model('sales_app', 'DailySalesRollup')
+    duplicates = DailySalesRollup.objects.filter(user__isnull=True).values(
+        'date', 'department', 'payment_status'
+    ).annotate(
+        rows=Count('id'), keep=Min('id'), invoice_count_sum=Sum('invoice_count'),
+        total_amount_sum=Sum('total_amount'), amount_paid_sum=Sum('amount_paid'),
+    ).filter(rows__gt=1).order_by()
+    for row in duplicates:
+        group = DailySalesRollup.objects.filter(
+            user__isnull=True, date=row['date'], department=row['department'],
+            payment_status=row['payment_status'],
+        )
+        group.exclude(pk=row['keep']).delete()
+        group.filter(pk=row['keep']).update(
+            invoice_count=row['invoice_count_sum'],
+            total_amount=row['total_amount_sum'],
+            amount_paid=row['amount_paid_sum'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales_app', '0023_invoice_listing_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('date', 'department', 'payment_status'), name='dailysalesrollup_unique_no_user'),
+        ),
+    ]
@@ -1,9 +1,30 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, Lower, Replace, Trim
 from django.utils import timezone
 from django.contrib.auth.models import User
 from decimal import Decimal
 
-class Invoice(models.Model):
+from core.mixins import DirtyFieldsMixin
+
+# Characters dropped from stored phone numbers for search (see search_phone)
+PHONE_SEPARATORS = (' ', '-', '+', '(', ')', '.', '/')
+
+
+def normalized_name(field):
+    """Database expression: the name column trimmed and lowercased"""
+    return Lower(Trim(field))
+
+
+def normalized_phone(field):
+    """Database expression: the phone column without separators"""
+    expression = F(field)
+    for separator in PHONE_SEPARATORS:
+        expression = Replace(expression, Value(separator), Value(''))
+    return expression
+
+
+class Invoice(DirtyFieldsMixin, models.Model):
     PAYMENT_STATUS_CHOICES = [
         ('paid', 'Paid'),
         ('unpaid', 'Unpaid'),
@@ -23,6 +44,31 @@ class Invoice(models.Model):
     amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0, null=True, blank=True)
     payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='unpaid', db_index=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoices')
+    # Linked from customer_phone (see sales_app.customers); indexed together
+    # with date_of_sale below
+    customer = models.ForeignKey('Customer', on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='invoices', db_index=False)
+    # Stored by the database so balances can be summed, filtered and indexed
+    # without loading invoices; `balance` below is the in-memory equivalent.
+    balance_due = models.GeneratedField(
+        expression=Coalesce(F('total'), Value(Decimal('0'))) - Coalesce(F('amount_paid'), Value(Decimal('0'))),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
+    # Normalized copies of the customer fields for substring search, kept
+    # current by the database (see sales_app.search_index)
+    search_name = models.GeneratedField(
+        expression=normalized_name('customer_name'),
+        output_field=models.CharField(max_length=255, null=True),
+        db_persist=True,
+        db_index=True,
+    )
+    search_phone = models.GeneratedField(
+        expression=normalized_phone('customer_phone'),
+        output_field=models.CharField(max_length=20, null=True),
+        db_persist=True,
+        db_index=True,
+    )
     
     class Meta:
         ordering = ['-date_of_sale', '-id']
@@ -30,6 +76,17 @@ class Invoice(models.Model):
             models.Index(fields=['date_of_sale', 'payment_status']),
             models.Index(fields=['customer_name', 'date_of_sale']),
             models.Index(fields=['user', 'date_of_sale']),
+            # Customer purchase history
+            models.Index(fields=['customer', 'date_of_sale'], name='invoice_customer_date_idx'),
+            # Keyset pages of listings (core.pagination)
+            models.Index(fields=['-date_of_sale', '-id'], name='invoice_listing_idx'),
+            # Accounts-receivable aging only ever reads open invoices
+            models.Index(fields=['date_of_sale'], name='invoice_open_date_idx',
+                         condition=Q(payment_status__in=['unpaid', 'partial', 'overdue'])),
+            models.Index(fields=['customer_name', 'date_of_sale'], name='invoice_open_customer_idx',
+                         condition=Q(payment_status__in=['unpaid', 'partial', 'overdue'])),
+            models.Index(fields=['user', 'date_of_sale'], name='invoice_open_user_idx',
+                         condition=Q(payment_status__in=['unpaid', 'partial', 'overdue'])),
         ]
 
     @property
@@ -52,25 +109,37 @@ class Invoice(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.invoice_no:
-            today = timezone.now().strftime('%Y%m%d')
-            prefix = f"INV-{today}-"
-            last_invoice = Invoice.objects.filter(invoice_no__startswith=prefix).order_by('-invoice_no').first()
-            if last_invoice:
-                last_number = int(last_invoice.invoice_no[-3:])
-                next_number = f"{last_number+1:03d}"
-            else:
-                next_number = "001"
-            self.invoice_no = f"{prefix}{next_number}"
+            from .sequences import allocate_invoice_number
+            self.invoice_no = allocate_invoice_number(Invoice, 'INV')
         
         # Automatically update payment status when saving
         self.update_payment_status()
         
-        super().save(*args, **kwargs)
+        # The rollup and customer handlers lock the stored row in pre_save and
+        # apply their deltas in post_save; keep both in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.invoice_no
 
 
+class InvoiceSequence(models.Model):
+    """
+    Per-prefix invoice number counter (one row per day and department,
+    e.g. 'INV-20250101-'). Updated atomically by sales_app.sequences.
+    """
+    prefix = models.CharField(max_length=20, unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-prefix']
+
+    def __str__(self):
+        return f"{self.prefix} ({self.last_value})"
+
+
 class AdminLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     action = models.CharField(max_length=255, null=True, blank=True, db_index=True)
@@ -86,7 +155,7 @@ class AdminLog(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.action} at {self.timestamp}"
 
-class Product(models.Model):
+class Product(DirtyFieldsMixin, models.Model):
     name = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     stock = models.IntegerField(null=True, blank=True, db_index=True)
@@ -105,7 +174,10 @@ class Product(models.Model):
 
 class Sale(models.Model):
     invoice = models.ForeignKey('Invoice', on_delete=models.CASCADE, related_name='items', null=True, blank=True)
+    # Product name as sold; `product` is the catalog row it refers to, which
+    # survives renames (see link_product)
     item = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    product = models.ForeignKey('Product', on_delete=models.SET_NULL, null=True, blank=True, related_name='sales')
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, null=True, blank=True)
     quantity = models.IntegerField(default=1, null=True, blank=True)
     discount = models.DecimalField(max_digits=10, decimal_places=2, default=0, null=True, blank=True)
@@ -117,12 +189,23 @@ class Sale(models.Model):
             models.Index(fields=['invoice', 'item']),
         ]
 
+    def save(self, *args, **kwargs):
+        self.link_product()
+        super().save(*args, **kwargs)
+
+    def link_product(self):
+        """Link the product named by `item` when no product is set (the oldest wins a name)"""
+        if self.product_id is None and self.item:
+            from .catalog import catalog_names
+            self.product_id = catalog_names(Product)['names'].get(self.item)
+
     def __str__(self):
         return f"{self.item} - {self.quantity} units"
 
 class StockMovement(models.Model):
     """
-    Track all stock movements for audit trail
+    Track all stock movements for audit trail.
+    Append-only: rows are written by sales_app.stock.StockLedger and never updated.
     """
     MOVEMENT_TYPES = [
         ('SALE', 'Sale'),
@@ -144,12 +227,42 @@ class StockMovement(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            models.Index(fields=['reference']),
+            models.Index(fields=['created_at']),  # For point-in-time replays
+        ]
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Stock movements are append-only and cannot be modified")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Stock movements are append-only and cannot be deleted")
+
     def __str__(self):
         return f"{self.product.name} - {self.movement_type}: {self.quantity_change}"
 
 
-class CashProduct(models.Model):
+class StockCheckpoint(models.Model):
+    """
+    Periodic snapshot of every product's stock level, used as the starting
+    point for point-in-time stock queries instead of replaying all movements.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_checkpoints')
+    stock = models.IntegerField()
+    taken_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-taken_at']
+        unique_together = ['product', 'taken_at']
+
+    def __str__(self):
+        return f"{self.product.name} - {self.stock} at {self.taken_at}"
+
+
+class CashProduct(DirtyFieldsMixin, models.Model):
     """
     Products for cash department with rate-based pricing
     """
@@ -177,7 +290,7 @@ class CashProduct(models.Model):
         return self.name
 
 
-class CashInvoice(models.Model):
+class CashInvoice(DirtyFieldsMixin, models.Model):
     """
     Cash department invoices - no balance field needed as these are cash transactions
     """
@@ -194,6 +307,21 @@ class CashInvoice(models.Model):
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0, null=True, blank=True, db_index=True)
     payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='paid', db_index=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='cash_invoices')
+    customer = models.ForeignKey('Customer', on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='cash_invoices', db_index=False)
+    # Normalized customer fields for search, as on Invoice
+    search_name = models.GeneratedField(
+        expression=normalized_name('customer_name'),
+        output_field=models.CharField(max_length=255, null=True),
+        db_persist=True,
+        db_index=True,
+    )
+    search_phone = models.GeneratedField(
+        expression=normalized_phone('customer_phone'),
+        output_field=models.CharField(max_length=20, null=True),
+        db_persist=True,
+        db_index=True,
+    )
     
     class Meta:
         ordering = ['-date_of_sale', '-id']
@@ -201,21 +329,18 @@ class CashInvoice(models.Model):
             models.Index(fields=['date_of_sale', 'payment_status']),
             models.Index(fields=['customer_name', 'date_of_sale']),
             models.Index(fields=['user', 'date_of_sale']),
+            models.Index(fields=['customer', 'date_of_sale'], name='cashinvoice_customer_date_idx'),
+            models.Index(fields=['-date_of_sale', '-id'], name='cashinvoice_listing_idx'),
         ]
     
     def save(self, *args, **kwargs):
         if not self.invoice_no:
-            today = timezone.now().strftime('%Y%m%d')
-            prefix = f"CASH-{today}-"
-            last_invoice = CashInvoice.objects.filter(invoice_no__startswith=prefix).order_by('-invoice_no').first()
-            if last_invoice:
-                last_number = int(last_invoice.invoice_no[-3:])
-                next_number = f"{last_number+1:03d}"
-            else:
-                next_number = "001"
-            self.invoice_no = f"{prefix}{next_number}"
+            from .sequences import allocate_invoice_number
+            self.invoice_no = allocate_invoice_number(CashInvoice, 'CASH')
         
-        super().save(*args, **kwargs)
+        # See Invoice.save
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.invoice_no
@@ -226,7 +351,10 @@ class CashSale(models.Model):
     Cash sale items with amount-based pricing
     """
     invoice = models.ForeignKey('CashInvoice', on_delete=models.CASCADE, related_name='items', null=True, blank=True)
+    # Service name as sold, alongside the catalog row it refers to (as on Sale)
     item = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    cash_product = models.ForeignKey('CashProduct', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='sales')
     amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, null=True, blank=True, 
                                 help_text="Base amount for rate calculation")
     rate = models.DecimalField(max_digits=10, decimal_places=4, default=0, null=True, blank=True,
@@ -250,7 +378,88 @@ class CashSale(models.Model):
                 self.total_price = Decimal('0')
         else:
             self.total_price = (self.rate or Decimal('0')) * (self.amount or Decimal('0'))
+        self.link_product()
         super().save(*args, **kwargs)
 
+    def link_product(self):
+        """Link the cash product named by `item` when none is set"""
+        if self.cash_product_id is None and self.item:
+            from .catalog import catalog_names
+            self.cash_product_id = catalog_names(CashProduct)['names'].get(self.item)
+
+    def __str__(self):
+        return f"{self.item} - Amount: {self.amount}"
+
+class DailySalesRollup(models.Model):
+    """
+    Pre-aggregated invoice totals per (date, department, user, payment_status).
+    Maintained incrementally from Invoice/CashInvoice save and delete signals
+    (see sales_app.rollups) and rebuilt with `manage.py rebuild_sales_rollups`.
+    """
+    DEPARTMENT_CHOICES = [
+        ('regular', 'Regular'),
+        ('cash', 'Cash'),
+    ]
+
+    date = models.DateField()
+    department = models.CharField(max_length=10, choices=DEPARTMENT_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sales_rollups')
+    payment_status = models.CharField(max_length=10)
+    invoice_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    amount_paid = models.DecimalField(max_digits=15, decimal_places=2, default=0,
+                                      help_text="Cash invoices are settled immediately, so this mirrors total_amount")
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['date', 'department', 'user', 'payment_status']
+        constraints = [
+            # NULLs are distinct in unique_together; rows without a user
+            # (e.g. imported invoices) need their own constraint
+            models.UniqueConstraint(
+                fields=['date', 'department', 'payment_status'],
+                condition=Q(user__isnull=True),
+                name='dailysalesrollup_unique_no_user',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['department', 'date']),
+            models.Index(fields=['date', 'payment_status']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.department} {self.payment_status}: {self.invoice_count} invoice(s)"
+
+
+class Customer(models.Model):
+    """
+    A customer identified by phone number, with running totals over the
+    invoices of both departments linked to it (cancelled invoices excluded).
+
+    Invoices are linked and the totals kept current by sales_app.customers;
+    `manage.py link_customers` links existing invoices and recomputes them.
+    """
+    name = models.CharField(max_length=255, blank=True)
+    phone = models.CharField(max_length=20, blank=True, help_text="Phone number as first entered")
+    # Dedupe key: the last CUSTOMER_PHONE_DIGITS digits of the phone number
+    phone_key = models.CharField(max_length=20, unique=True)
+    invoice_count = models.IntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                      help_text="Unpaid balance of regular invoices")
+    first_purchase = models.DateField(null=True, blank=True)
+    last_purchase = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name', 'id']
+        indexes = [
+            # Top-customer reports
+            models.Index(fields=['-lifetime_spend', 'id'], name='customer_spend_idx'),
+            models.Index(fields=['-outstanding', 'id'], name='customer_outstanding_idx',
+                         condition=Q(outstanding__gt=0)),
+            models.Index(fields=['-last_purchase', 'id'], name='customer_recent_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.item} - Amount: {self.amount}"
\ No newline at end of file
+        return self.name or self.phone
@@ -0,0 +1,123 @@
+"""
+Set-based payment status maintenance: the overdue sweeper and the bulk
+payment status recomputation used by `fix_payment_status`
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache_utils import CacheNamespace
+from .invalidation import CacheInvalidator
+from .models import Invoice
+from .rollups import SalesRollup
+from .signals import invoice_statuses_changed
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentStatusSweeper:
+    """
+    Invoice.update_payment_status only runs when an invoice is saved, so an
+    unpaid invoice whose due date passes stays 'unpaid' until someone edits
+    it. sweep() flips every such invoice to 'overdue' with one UPDATE over the
+    due_date/payment_status indexes, moves their DailySalesRollup
+    contributions with one delta per (date, salesperson, status) group, and
+    issues a single cache invalidation for the whole batch.
+    """
+
+    DUE_STATUSES = ['unpaid', 'partial']
+
+    # Above this many (date, salesperson, status) groups the affected date
+    # range is rebuilt instead of applying deltas group by group
+    MAX_DELTA_GROUPS = 200
+
+    @classmethod
+    def due(cls, today=None):
+        """Invoices past their due date that are still marked unpaid/partial"""
+        today = today or timezone.now().date()
+        return Invoice.objects.filter(due_date__lt=today, payment_status__in=cls.DUE_STATUSES)
+
+    @classmethod
+    def sweep(cls, today=None):
+        """Mark due invoices overdue. Returns the number of invoices updated."""
+        return cls.apply(cls.due(today), Value('overdue'))
+
+    @staticmethod
+    def status_expression(today=None):
+        """Database equivalent of Invoice.update_payment_status"""
+        today = today or timezone.now().date()
+        amount_paid = Coalesce(F('amount_paid'), Value(Decimal('0')))
+        total = Coalesce(F('total'), Value(Decimal('0')))
+        nothing_paid = Q(amount_paid__isnull=True) | Q(amount_paid=0)
+        return Case(
+            When(~nothing_paid & Q(amount_paid__gte=total), then=Value('paid')),
+            When(due_date__lt=today, then=Value('overdue')),
+            When(nothing_paid, then=Value('unpaid')),
+            default=Value('partial'),
+        )
+
+    @classmethod
+    def recompute(cls, queryset=None, today=None):
+        """
+        Recompute payment_status for `queryset` (all invoices by default) in
+        one UPDATE. Returns the number of invoices whose status changed.
+        """
+        queryset = Invoice.objects.all() if queryset is None else queryset
+        status = cls.status_expression(today)
+        return cls.apply(queryset, status)
+
+    @classmethod
+    def apply(cls, queryset, status):
+        """
+        Set payment_status to the `status` expression on the rows of
+        `queryset` where it differs, keeping the daily rollups, the caches
+        and closed accounting periods in step.
+        """
+        changed = queryset.annotate(new_status=status).exclude(payment_status=F('new_status'))
+
+        with transaction.atomic():
+            groups = list(
+                changed.values('date_of_sale', 'user_id', 'payment_status', 'new_status')
+                .annotate(count=Count('id'), total_sum=Sum('total'), paid_sum=Sum('amount_paid'))
+                .order_by()
+            )
+            if not groups:
+                return 0
+            expected = sum(group['count'] for group in groups)
+
+            updated = Invoice.objects.filter(
+                pk__in=changed.values('pk')
+            ).update(payment_status=status)
+
+            dates = sorted({group['date_of_sale'] for group in groups if group['date_of_sale']})
+            if updated != expected or len(groups) > cls.MAX_DELTA_GROUPS:
+                # Rows changed between the two statements, or too many groups:
+                # recompute the rollups of the affected dates from the invoices
+                if dates:
+                    SalesRollup.rebuild(dates[0], dates[-1], 'regular')
+            else:
+                for group in groups:
+                    cls._move_rollup(group)
+
+            CacheInvalidator.mark(CacheNamespace.SALES, dates=dates)
+            invoice_statuses_changed.send(sender=Invoice, dates=dates)
+
+        logger.info(f"Payment status update changed {updated} invoice(s)")
+        return updated
+
+    @staticmethod
+    def _move_rollup(group):
+        if group['date_of_sale'] is None:
+            return
+        values = (
+            group['count'],
+            Decimal(str(group['total_sum'] or 0)),
+            Decimal(str(group['paid_sum'] or 0)),
+        )
+        before = (group['date_of_sale'], 'regular', group['user_id'], group['payment_status'])
+        after = (group['date_of_sale'], 'regular', group['user_id'], group['new_status'])
+        SalesRollup.record_change((before, values), (after, values))
@@ -7,10 +7,13 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db import connection
 from django.core.cache import cache
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from .models import Invoice, Product, Sale, AdminLog
-from .cache_utils import SalesCache
+from .cache_utils import SalesCache, CacheNamespace
+from core.cache import get_cache_stats
+from core.jobs import enqueue
 
 
 def is_manager(user):
@@ -119,8 +122,13 @@ def get_cache_metrics():
         metrics['read_time_ms'] = round(read_time, 2)
         metrics['working'] = retrieved is not None
         
-        # Cache hit ratio estimate (simplified)
-        metrics['estimated_hit_ratio'] = 'N/A (LocMemCache doesn\'t provide stats)'
+        # Hit ratio from the backend's counters (shared across workers)
+        stats = get_cache_stats()
+        if stats is None:
+            metrics['estimated_hit_ratio'] = f'N/A ({type(cache).__name__} doesn\'t provide stats)'
+        else:
+            metrics['estimated_hit_ratio'] = stats['hit_ratio']
+            metrics['stats'] = stats
         
     except Exception as e:
         metrics['error'] = str(e)
@@ -192,23 +200,27 @@ def cache_status(request):
         # Check what's currently cached
         cached_items = {}
         
-        # Test if common cache keys exist
-        cache_keys = [
-            f'daily_sales_{today}',
-            'low_stock_products_50',
-            'top_products_7d_10',
-            'top_products_30d_10',
-            f'monthly_summary_{today.year}_{today.month}'
-        ]
+        # Test if common cache keys exist (keys are versioned per namespace)
+        cache_keys = {
+            f'daily_sales_{today}': SalesCache.daily_cache_key(today),
+            'low_stock_products_50': CacheNamespace.key(CacheNamespace.PRODUCTS, 'low_stock_products_50'),
+            'top_products_7d_10': CacheNamespace.key(CacheNamespace.SALES, 'top_products_7d_10'),
+            'top_products_30d_10': CacheNamespace.key(CacheNamespace.SALES, 'top_products_30d_10'),
+            f'monthly_summary_{today.year}_{today.month}': CacheNamespace.key(
+                CacheNamespace.SALES, f'monthly_summary_{today.year}_{today.month}'
+            ),
+        }
         
-        for key in cache_keys:
-            cached_items[key] = cache.get(key) is not None
+        for name, key in cache_keys.items():
+            cached_items[name] = cache.get(key) is not None
         
         return JsonResponse({
             'status': 'success',
             'timestamp': timezone.now().isoformat(),
-            'cache_backend': connection.settings_dict.get('CACHE', 'default'),
+            'cache_backend': f'{type(cache).__module__}.{type(cache).__name__}',
             'cached_items': cached_items,
+            'stats': get_cache_stats(),
+            'generations': CacheNamespace.generations(CacheNamespace.ALL),
             'cache_working': True
         })
         
@@ -244,21 +256,17 @@ def clear_cache(request):
 @user_passes_test(is_manager)
 @require_http_methods(["POST"])
 def warmup_cache(request):
-    """API endpoint to warm up cache"""
+    """API endpoint to warm up cache (queued as a background job)"""
     try:
-        today = timezone.now().date()
-        
-        # Pre-populate common cache entries
-        SalesCache.get_daily_sales_summary(today)
-        SalesCache.get_low_stock_products(50)
-        SalesCache.get_top_products(days=7, limit=10)
-        SalesCache.get_monthly_summary()
+        job = enqueue('sales.warmup_cache', user=request.user, unique=True)
         
         return JsonResponse({
-            'status': 'success',
-            'message': 'Cache warmed up successfully',
+            'status': 'queued',
+            'message': 'Cache warmup queued',
+            'job_id': job.pk,
+            'status_url': reverse('core:job_status', args=[job.pk]),
             'timestamp': timezone.now().isoformat()
-        })
+        }, status=202)
     except Exception as e:
         return JsonResponse({
             'status': 'error',
@@ -0,0 +1,248 @@
+"""
+Incremental maintenance and reads for the DailySalesRollup table
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum, Count
+
+from .models import Invoice, CashInvoice, DailySalesRollup
+
+
+class SalesRollup:
+    """
+    Keeps DailySalesRollup in step with Invoice and CashInvoice.
+
+    Each invoice contributes (1, total, amount_paid) to the row keyed by its
+    (date_of_sale, department, user, payment_status). Saves apply the
+    difference between the old and new contribution, deletes remove it, so
+    dashboards can read a handful of pre-aggregated rows instead of scanning
+    invoices.
+    """
+
+    DEPARTMENTS = {
+        'regular': Invoice,
+        'cash': CashInvoice,
+    }
+
+    TRACKED_FIELDS = ['date_of_sale', 'user_id', 'payment_status', 'total', 'amount_paid']
+
+    @classmethod
+    def department_for(cls, model):
+        for department, department_model in cls.DEPARTMENTS.items():
+            if issubclass(model, department_model):
+                return department
+        return None
+
+    # === INCREMENTAL MAINTENANCE ===
+
+    @classmethod
+    def snapshot(cls, instance):
+        """Return the invoice's current contribution as (key, values), or None if it has no date"""
+        return cls.snapshot_values(type(instance), {
+            name: getattr(instance, name)
+            for name in cls.tracked_fields(type(instance))
+        })
+
+    @classmethod
+    def snapshot_values(cls, model, values):
+        """Contribution of an invoice of `model` with the given field values"""
+        date_of_sale = Invoice._meta.get_field('date_of_sale').to_python(values.get('date_of_sale'))
+        if date_of_sale is None:
+            return None
+
+        total = Decimal(str(values.get('total') or 0))
+        if issubclass(model, CashInvoice):
+            # Cash transactions are settled immediately
+            amount_paid = total
+        else:
+            amount_paid = Decimal(str(values.get('amount_paid') or 0))
+
+        key = (date_of_sale, cls.department_for(model), values.get('user_id'), values.get('payment_status'))
+        return key, (1, total, amount_paid)
+
+    @classmethod
+    def tracked_fields(cls, model):
+        return [f for f in cls.TRACKED_FIELDS if f != 'amount_paid' or issubclass(model, Invoice)]
+
+    @classmethod
+    def stored_snapshot(cls, model, pk, lock=False):
+        """
+        Contribution of the invoice as currently stored in the database. The
+        signal handlers read it with lock=True inside the save/delete
+        transaction, so concurrent writers and bulk updates (which the
+        instance's dirty-field snapshot knows nothing about) cannot make the
+        delta subtract stale values.
+        """
+        if pk is None:
+            return None
+        queryset = model.objects.select_for_update() if lock else model.objects
+        row = queryset.filter(pk=pk).values(*cls.tracked_fields(model)).first()
+        if row is None:
+            return None
+        return cls.snapshot_values(model, row)
+
+    @classmethod
+    def record_change(cls, before, after):
+        """Move an invoice's contribution from `before` to `after` (either may be None)"""
+        deltas = {}
+        for snapshot, sign in ((before, -1), (after, 1)):
+            if snapshot is None:
+                continue
+            key, values = snapshot
+            current = deltas.get(key, (0, Decimal('0'), Decimal('0')))
+            deltas[key] = tuple(c + sign * v for c, v in zip(current, values))
+
+        for key, values in deltas.items():
+            if any(values):
+                cls.apply_delta(key, *values)
+
+    @classmethod
+    def apply_delta(cls, key, invoice_count, total_amount, amount_paid):
+        """Add the given amounts to the rollup row for `key`, creating it if needed"""
+        date, department, user_id, payment_status = key
+        lookup = {
+            'date': date,
+            'department': department,
+            'user_id': user_id,
+            'payment_status': payment_status,
+        }
+        changes = {
+            'invoice_count': F('invoice_count') + invoice_count,
+            'total_amount': F('total_amount') + total_amount,
+            'amount_paid': F('amount_paid') + amount_paid,
+        }
+
+        with transaction.atomic():
+            if DailySalesRollup.objects.filter(**lookup).update(**changes):
+                return
+            try:
+                with transaction.atomic():
+                    DailySalesRollup.objects.create(
+                        invoice_count=invoice_count,
+                        total_amount=total_amount,
+                        amount_paid=amount_paid,
+                        **lookup
+                    )
+            except IntegrityError:
+                # Created concurrently by another worker (user-less rows are
+                # unique through the dailysalesrollup_unique_no_user constraint)
+                DailySalesRollup.objects.filter(**lookup).update(**changes)
+
+    @classmethod
+    def release_user(cls, user_id):
+        """
+        Fold a user's rollup rows into the user-less rows of the same keys,
+        before the user is deleted (the rows' user is SET_NULL, like their
+        invoices', and user-less rows are unique per key)
+        """
+        with transaction.atomic():
+            rows = DailySalesRollup.objects.filter(user_id=user_id)
+            for row in list(rows.values('date', 'department', 'payment_status',
+                                        'invoice_count', 'total_amount', 'amount_paid')):
+                key = (row['date'], row['department'], None, row['payment_status'])
+                cls.apply_delta(key, row['invoice_count'], row['total_amount'], row['amount_paid'])
+            rows.delete()
+
+    # === REBUILD ===
+
+    @classmethod
+    def rebuild(cls, start=None, end=None, department=None):
+        """
+        Recompute rollup rows from the invoice tables for the given date range
+        (inclusive; open-ended when omitted). Returns the number of rows written.
+        """
+        departments = [department] if department else list(cls.DEPARTMENTS)
+        written = 0
+
+        with transaction.atomic():
+            for dept in departments:
+                model = cls.DEPARTMENTS[dept]
+                date_filter = Q(date_of_sale__isnull=False)
+                rollup_filter = Q(department=dept)
+                if start:
+                    date_filter &= Q(date_of_sale__gte=start)
+                    rollup_filter &= Q(date__gte=start)
+                if end:
+                    date_filter &= Q(date_of_sale__lte=end)
+                    rollup_filter &= Q(date__lte=end)
+
+                DailySalesRollup.objects.filter(rollup_filter).delete()
+
+                paid_field = 'amount_paid' if model is Invoice else 'total'
+                rows = model.objects.filter(date_filter).order_by().values(
+                    'date_of_sale', 'user_id', 'payment_status'
+                ).annotate(
+                    count=Count('id'),
+                    total_sum=Sum('total'),
+                    paid_sum=Sum(paid_field),
+                )
+
+                rollups = [
+                    DailySalesRollup(
+                        date=row['date_of_sale'],
+                        department=dept,
+                        user_id=row['user_id'],
+                        payment_status=row['payment_status'],
+                        invoice_count=row['count'],
+                        total_amount=row['total_sum'] or 0,
+                        amount_paid=row['paid_sum'] or 0,
+                    )
+                    for row in rows
+                ]
+                DailySalesRollup.objects.bulk_create(rollups, batch_size=1000)
+                written += len(rollups)
+
+        return written
+
+    # === READS ===
+
+    @classmethod
+    def filter(cls, start=None, end=None, department=None, **filters):
+        queryset = DailySalesRollup.objects.filter(**filters)
+        if start:
+            queryset = queryset.filter(date__gte=start)
+        if end:
+            queryset = queryset.filter(date__lte=end)
+        if department:
+            queryset = queryset.filter(department=department)
+        return queryset.order_by()
+
+    @classmethod
+    def totals(cls, start=None, end=None, department=None, **filters):
+        """Aggregate invoice count, total and amount paid over the matching rollup rows"""
+        result = cls.filter(start, end, department, **filters).aggregate(**cls._aggregates())
+        return cls._clean(result)
+
+    @classmethod
+    def totals_by_department(cls, start=None, end=None, **filters):
+        """Return {department: totals} for both departments in one query"""
+        result = {dept: cls._clean({}) for dept in cls.DEPARTMENTS}
+        rows = cls.filter(start, end, **filters).values('department').annotate(**cls._aggregates())
+        for row in rows:
+            result[row['department']] = cls._clean(row)
+        return result
+
+    @classmethod
+    def daily_totals_by_department(cls, start=None, end=None, **filters):
+        """Return {(date, department): totals} for days with invoices, in one query"""
+        rows = cls.filter(start, end, **filters).values('date', 'department').annotate(**cls._aggregates())
+        return {(row['date'], row['department']): cls._clean(row) for row in rows}
+
+    @staticmethod
+    def _aggregates():
+        return {
+            'count_sum': Sum('invoice_count'),
+            'total_sum': Sum('total_amount'),
+            'paid_sum': Sum('amount_paid'),
+            'paid_count_sum': Sum('invoice_count', filter=Q(payment_status='paid')),
+        }
+
+    @staticmethod
+    def _clean(row):
+        return {
+            'invoice_count': row.get('count_sum') or 0,
+            'total_amount': row.get('total_sum') or 0,
+            'amount_paid': row.get('paid_sum') or 0,
+            'paid_count': row.get('paid_count_sum') or 0,
+        }
@@ -0,0 +1,189 @@
+"""
+Product name search for the autocomplete APIs.
+
+`name__icontains` is a sequential scan that the b-tree index on name cannot
+serve, and it runs on every keystroke. ProductSearch answers the query from:
+
+- an in-process prefix/trigram index per model (any database), or
+- on PostgreSQL, the database itself, where the optional pg_trgm GIN indexes
+  (migration 0018) serve the ILIKE '%query%' lookup.
+
+Either way prefix matches rank before word-prefix matches, which rank before
+other substring matches. Final API payloads are cached per query.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .cache_utils import CacheNamespace, SalesCache
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Immutable prefix/trigram index over (id, name) pairs.
+
+    - Full-name and word prefixes are answered by bisecting sorted lists.
+    - Substrings are answered by intersecting trigram posting sets, then
+      confirming the candidates with `in`.
+    """
+
+    def __init__(self, rows):
+        self.names = {}
+        self.full = []
+        self.words = []
+        self.postings = defaultdict(set)
+        for pk, name in rows:
+            key = normalize(name)
+            if not key:
+                continue
+            self.names[pk] = (key, name)
+            self.full.append((key, pk))
+            for word in set(key.split(' ')):
+                self.words.append((word, pk))
+            for gram in trigrams(key):
+                self.postings[gram].add(pk)
+        self.full.sort()
+        self.words.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _prefixed(entries, prefix):
+        start = bisect.bisect_left(entries, (prefix,))
+        for key, pk in entries[start:]:
+            if not key.startswith(prefix):
+                break
+            yield pk
+
+    def search(self, query, limit):
+        """Ids of names containing `query`, best matches first"""
+        query = normalize(query)
+        if not query:
+            return []
+
+        ranked = {}
+
+        def add(pks, rank):
+            for pk in pks:
+                ranked.setdefault(pk, rank)
+
+        add(self._prefixed(self.full, query), 0)
+        if ' ' not in query:
+            add(self._prefixed(self.words, query), 1)
+
+        # Substring matches: candidates share every trigram of the query
+        grams = trigrams(query) if len(query) >= 3 else set()
+        inner = {gram for gram in grams if not gram.startswith(' ') and not gram.endswith(' ')}
+        if inner:
+            posting_sets = sorted((self.postings.get(gram, set()) for gram in inner), key=len)
+            candidates = set.intersection(*posting_sets) if posting_sets else set()
+        else:
+            candidates = self.names.keys()
+        add((pk for pk in candidates if query in self.names[pk][0]), 2)
+
+        return sorted(ranked, key=lambda pk: (ranked[pk], self.names[pk][0], pk))[:limit]
+
+
+class ProductSearch:
+    """Ranked name search over Product and CashProduct with cached results"""
+
+    _indexes = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def backend(cls):
+        """'database' (PostgreSQL trigram path) or 'memory'"""
+        configured = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'auto')
+        if configured == 'auto':
+            return 'database' if connection.vendor == 'postgresql' else 'memory'
+        return configured
+
+    @classmethod
+    def index(cls, model):
+        """The in-process index for `model`, rebuilt when the catalog namespace moves on"""
+        generation = CacheNamespace.generation(CacheNamespace.CATALOG)
+        current = cls._indexes.get(model)
+        if current is not None and current[0] == generation:
+            return current[1]
+        with cls._lock:
+            current = cls._indexes.get(model)
+            if current is None or current[0] != generation:
+                rows = model.objects.exclude(name__isnull=True).values_list('id', 'name')
+                current = (generation, NameIndex(rows.iterator()))
+                cls._indexes[model] = current
+                logger.info(f"Built {model.__name__} search index ({len(current[1])} names)")
+        return current[1]
+
+    @classmethod
+    def search_ids(cls, model, query, limit=20):
+        """Ids of `model` rows whose name contains `query`, ranked"""
+        query = (query or '').strip()
+        if not query:
+            return []
+        if cls.backend() == 'database':
+            return cls._database_search(model, query, limit)
+        return cls.index(model).search(query, limit)
+
+    @staticmethod
+    def _database_search(model, query, limit):
+        rank = Case(
+            When(name__istartswith=query, then=Value(0)),
+            When(Q(name__icontains=f' {query}'), then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+        return list(
+            model.objects.filter(name__icontains=query)
+            .annotate(rank=rank)
+            .order_by('rank', 'name', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+
+    @classmethod
+    def search(cls, model, query, serialize, limit=20):
+        """
+        Return `serialize(obj)` for the ranked matches, cached per query.
+        Product payloads carry stock and price, so they also depend on the
+        products namespace.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        namespaces = [CacheNamespace.CATALOG]
+        if model is Product:
+            namespaces.append(CacheNamespace.PRODUCTS)
+        digest = hashlib.md5(query.encode()).hexdigest()
+        key = CacheNamespace.key(
+            namespaces, f'search_{model._meta.model_name}_{serialize.__name__}_{limit}_{digest}'
+        )
+        data = cache.get(key)
+        if data is None:
+            data = cls._load(model, query, limit, serialize)
+            cache.set(key, data, SalesCache.CACHE_TIMEOUT_SHORT)
+        return data
+
+    @classmethod
+    def _load(cls, model, query, limit, serialize):
+        ids = cls.search_ids(model, query, limit)
+        found = model.objects.in_bulk(ids)
+        return [serialize(found[pk]) for pk in ids if pk in found]
@@ -0,0 +1,266 @@
+"""
+Customer and invoice number search over both departments.
+
+Invoice and CashInvoice carry normalized copies of the customer fields that
+the database keeps current on every write: search_name (trimmed and
+lowercased) and search_phone (without separators). Substring lookups run
+against an index of those columns (migration 0020):
+
+- PostgreSQL: pg_trgm GIN indexes serving LIKE '%q%' on search_name,
+  search_phone and UPPER(invoice_no);
+- SQLite: the FTS5 trigram table `sales_app_invoice_search`, kept in sync
+  by triggers on both invoice tables. Rebuilding an invoice table (e.g. an
+  AlterField migration on SQLite) drops the triggers; `manage.py
+  rebuild_invoice_search` reinstalls them.
+
+Queries shorter than three characters cannot use a trigram index, so the
+ranked search answers them with prefix lookups on the b-tree indexes.
+Without either index the same lookups run as scans, which is still correct.
+"""
+import hashlib
+import logging
+import re
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+from .cache_utils import CacheNamespace, SalesCache
+from .models import CashInvoice, Invoice
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_name(text):
+    """Python counterpart of models.normalized_name, for query strings"""
+    return (text or '').strip().lower()
+
+
+def normalize_phone(text):
+    """Digits of a phone query (stored numbers drop models.PHONE_SEPARATORS)"""
+    return re.sub(r'\D', '', text or '')
+
+
+class InvoiceSearchIndex:
+    """
+    Ranked lookup of invoices by customer name, phone or invoice number:
+
+        InvoiceSearchIndex.search('0712 345')           # both departments
+        InvoiceSearchIndex.search('alice', 'cash', 10)
+
+    Exact invoice number, phone or name matches rank first, then names
+    starting with the query, then names with a word starting with it, then
+    any other substring match; newer invoices first within a rank.
+    """
+
+    FTS_TABLE = 'sales_app_invoice_search'
+    DEPARTMENTS = {
+        # department: (model, rowid parity in the FTS table, detail URL name)
+        'regular': (Invoice, 0, 'invoice_detail'),
+        'cash': (CashInvoice, 1, 'cash_receipt_print'),
+    }
+    MIN_SUBSTRING = 3  # shortest query a trigram index can serve
+
+    _backends = {}
+
+    # === BACKEND ===
+
+    @classmethod
+    def backend(cls):
+        """'fts' when the SQLite FTS5 table is installed, otherwise 'database'"""
+        if connection.vendor != 'sqlite':
+            return 'database'
+        database = connection.settings_dict['NAME']
+        if database not in cls._backends:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [cls.FTS_TABLE]
+                )
+                cls._backends[database] = 'fts' if cursor.fetchone() else 'database'
+        return cls._backends[database]
+
+    @classmethod
+    def rebuild(cls):
+        """
+        (Re)install the SQLite FTS5 table and its triggers and refill it.
+        Returns the number of indexed invoices; 0 on other databases, whose
+        indexes need no maintenance.
+        """
+        if connection.vendor != 'sqlite':
+            return 0
+        cls._backends.clear()
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model, parity, _ in cls.DEPARTMENTS.values():
+                table = model._meta.db_table
+                for suffix in ('ai', 'au', 'ad'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {cls.FTS_TABLE}')
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {cls.FTS_TABLE} "
+                f"USING fts5(invoice_no, name, phone, tokenize='trigram')"
+            )
+            for model, parity, _ in cls.DEPARTMENTS.values():
+                table = model._meta.db_table
+                row = f'new.id * 2 + {parity}, new.invoice_no, new.search_name, new.search_phone'
+                cursor.execute(
+                    f'CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN '
+                    f'INSERT INTO {cls.FTS_TABLE} (rowid, invoice_no, name, phone) VALUES ({row}); END'
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER {table}_search_au '
+                    f'AFTER UPDATE OF invoice_no, customer_name, customer_phone ON {table} BEGIN '
+                    f'DELETE FROM {cls.FTS_TABLE} WHERE rowid = old.id * 2 + {parity}; '
+                    f'INSERT INTO {cls.FTS_TABLE} (rowid, invoice_no, name, phone) VALUES ({row}); END'
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN '
+                    f'DELETE FROM {cls.FTS_TABLE} WHERE rowid = old.id * 2 + {parity}; END'
+                )
+                cursor.execute(
+                    f'INSERT INTO {cls.FTS_TABLE} (rowid, invoice_no, name, phone) '
+                    f'SELECT id * 2 + {parity}, invoice_no, search_name, search_phone FROM {table}'
+                )
+            cursor.execute(f'SELECT COUNT(*) FROM {cls.FTS_TABLE}')
+            indexed = cursor.fetchone()[0]
+        logger.info(f"Rebuilt invoice search index ({indexed} invoices)")
+        return indexed
+
+    # === LOOKUPS ===
+
+    @classmethod
+    def _fts_ids(cls, model, terms):
+        """Subquery of `model` ids whose index row matches any (column, text) term"""
+        parity = next(p for m, p, _ in cls.DEPARTMENTS.values() if m is model)
+        match = ' OR '.join(
+            f'{column} : "{text.replace(chr(34), chr(34) * 2)}"' for column, text in terms
+        )
+        return RawSQL(
+            f'SELECT rowid >> 1 FROM {cls.FTS_TABLE} '
+            f'WHERE {cls.FTS_TABLE} MATCH %s AND (rowid & 1) = %s',
+            [match, parity],
+        )
+
+    @staticmethod
+    def _prefix(field, text):
+        """Prefix lookup; a range on SQLite, whose LIKE cannot use the b-tree index"""
+        if connection.vendor == 'sqlite':
+            return Q(**{f'{field}__gte': text, f'{field}__lt': text + '\uffff'})
+        return Q(**{f'{field}__startswith': text})
+
+    @classmethod
+    def condition(cls, model, field, value):
+        """
+        Q for invoices of `model` whose `field` (customer_name, customer_phone
+        or invoice_no) contains `value`, served by the search index
+        """
+        value = (value or '').strip()
+        if field == 'customer_name':
+            text, column, lookup = normalize_name(value), 'name', 'search_name__contains'
+        elif field == 'customer_phone':
+            text, column, lookup = normalize_phone(value), 'phone', 'search_phone__contains'
+            if not text:
+                return Q(customer_phone__icontains=value)
+        elif field == 'invoice_no':
+            text, column, lookup = value, 'invoice_no', 'invoice_no__icontains'
+        else:
+            raise ValueError(f"Unsupported search field {field}")
+
+        if len(text) >= cls.MIN_SUBSTRING and cls.backend() == 'fts':
+            return Q(pk__in=cls._fts_ids(model, [(column, text)]))
+        return Q(**{lookup: text})
+
+    @classmethod
+    def matches(cls, model, query):
+        """Q for invoices of `model` matching `query` in any searched field"""
+        name, phone = normalize_name(query), normalize_phone(query)
+        if len(name) < cls.MIN_SUBSTRING:
+            match = cls._prefix('search_name', name) | Q(invoice_no__istartswith=query)
+            if phone:
+                match |= cls._prefix('search_phone', phone)
+            return match
+
+        if cls.backend() == 'fts':
+            terms = [('name', name), ('invoice_no', query)]
+            if len(phone) >= cls.MIN_SUBSTRING:
+                terms.append(('phone', phone))
+            return Q(pk__in=cls._fts_ids(model, terms))
+
+        match = Q(search_name__contains=name) | Q(invoice_no__icontains=query)
+        if phone:
+            match |= Q(search_phone__contains=phone)
+        return match
+
+    @classmethod
+    def rank(cls, query):
+        """0 exact, 1 prefix, 2 word prefix, 3 other substring"""
+        name, phone = normalize_name(query), normalize_phone(query)
+        exact = Q(invoice_no__iexact=query) | Q(search_name=name)
+        whens = []
+        if phone:
+            exact |= Q(search_phone=phone)
+            whens.append(When(search_phone__startswith=phone, then=Value(1)))
+        return Case(
+            When(exact, then=Value(0)),
+            When(search_name__startswith=name, then=Value(1)),
+            *whens,
+            When(search_name__contains=f' {name}', then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField(),
+        )
+
+    # === RANKED SEARCH ===
+
+    @classmethod
+    def search(cls, query, department=None, limit=20):
+        """
+        Up to `limit` matching invoices of `department` (both by default)
+        as JSON-ready dicts, best first. Cached per query until invoices of
+        either department change.
+        """
+        query = ' '.join((query or '').split())
+        if not query:
+            return []
+        departments = [department] if department in cls.DEPARTMENTS else list(cls.DEPARTMENTS)
+        digest = hashlib.md5(query.lower().encode()).hexdigest()
+        key = CacheNamespace.key(
+            [CacheNamespace.SALES, CacheNamespace.CASH],
+            f"invoice_lookup_{'_'.join(departments)}_{limit}_{digest}",
+        )
+        data = cache.get(key)
+        if data is None:
+            data = cls._load(query, departments, limit)
+            cache.set(key, data, SalesCache.CACHE_TIMEOUT_SHORT)
+        return data
+
+    @classmethod
+    def _load(cls, query, departments, limit):
+        rows = []
+        for department in departments:
+            model, _, url_name = cls.DEPARTMENTS[department]
+            matches = (
+                model.objects.filter(cls.matches(model, query))
+                .annotate(rank=cls.rank(query))
+                .order_by('rank', '-date_of_sale', '-id')
+                .values('id', 'invoice_no', 'customer_name', 'customer_phone',
+                        'date_of_sale', 'total', 'payment_status', 'rank')[:limit]
+            )
+            for row in matches:
+                row['department'] = department
+                row['url'] = reverse(url_name, args=[row['id']])
+                rows.append(row)
+
+        rows.sort(key=lambda row: (
+            row['rank'],
+            -(row['date_of_sale'].toordinal() if row['date_of_sale'] else 0),
+            -row['id'],
+        ))
+        return [
+            {
+                **row,
+                'date_of_sale': row['date_of_sale'].isoformat() if row['date_of_sale'] else None,
+                'total': float(row['total'] or 0),
+            }
+            for row in rows[:limit]
+        ]
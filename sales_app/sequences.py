@@ -0,0 +1,127 @@
+"""
+Invoice number allocation backed by the InvoiceSequence counter table
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import InvoiceSequence
+
+
+class InvoiceNumberAllocator:
+    """
+    Hands out per-day invoice numbers (e.g. INV-20250101-001) from a counter row.
+
+    Each prefix has one InvoiceSequence row that is bumped with an atomic
+    UPDATE, so concurrent tellers never receive the same number. With
+    INVOICE_NUMBER_BLOCK_SIZE > 1 a worker reserves a range of numbers in one
+    UPDATE and serves the rest of the range from memory, which keeps the
+    counter row lock short at peak hours (numbers are then unique but not
+    strictly in creation order across workers).
+    """
+
+    # Numbers are zero-padded to 3 digits so older invoices keep their format;
+    # from 1000 onwards the suffix simply grows.
+    NUMBER_WIDTH = 3
+
+    _blocks = {}  # {prefix: [next_value, last_value]} reserved by this process
+    _lock = threading.Lock()
+
+    @classmethod
+    def block_size(cls):
+        return max(1, getattr(settings, 'INVOICE_NUMBER_BLOCK_SIZE', 1))
+
+    @classmethod
+    def daily_prefix(cls, code, date=None):
+        """Build the per-day prefix, e.g. 'INV-20250101-'"""
+        date = date or timezone.now()
+        return f"{code}-{date.strftime('%Y%m%d')}-"
+
+    @classmethod
+    def format_number(cls, prefix, value):
+        return f"{prefix}{value:0{cls.NUMBER_WIDTH}d}"
+
+    @classmethod
+    def next_number(cls, model, code):
+        """Allocate the next invoice number for `model` using today's `code` prefix"""
+        prefix = cls.daily_prefix(code)
+        return cls.format_number(prefix, cls.next_value(prefix, model))
+
+    @classmethod
+    def next_value(cls, prefix, model):
+        """Return the next integer in the sequence for `prefix`"""
+        with cls._lock:
+            block = cls._blocks.get(prefix)
+            if block and block[0] <= block[1]:
+                value = block[0]
+                block[0] += 1
+                return value
+
+        first, last = cls.reserve(prefix, model, cls.block_size())
+
+        if last > first:
+            # Only publish the rest of the block once the reservation is
+            # committed; if the surrounding transaction rolls back, the counter
+            # rolls back too and the range must not be reused from memory.
+            def publish():
+                with cls._lock:
+                    cls._blocks[prefix] = [first + 1, last]
+                    # Drop leftover blocks from previous days for the same code
+                    code = prefix.split('-', 1)[0]
+                    for stale in [p for p in cls._blocks if p != prefix and p.split('-', 1)[0] == code]:
+                        del cls._blocks[stale]
+
+            transaction.on_commit(publish)
+
+        return first
+
+    @classmethod
+    def reserve(cls, prefix, model, count=1):
+        """
+        Atomically reserve `count` numbers for `prefix`.
+        Returns the (first, last) values of the reserved range.
+        """
+        with transaction.atomic():
+            updated = InvoiceSequence.objects.filter(prefix=prefix).update(
+                last_value=F('last_value') + count,
+                updated_at=timezone.now(),
+            )
+            if not updated:
+                cls._create_sequence(prefix, model)
+                InvoiceSequence.objects.filter(prefix=prefix).update(
+                    last_value=F('last_value') + count,
+                    updated_at=timezone.now(),
+                )
+            # The UPDATE above holds the row lock, so this read is consistent
+            last = InvoiceSequence.objects.filter(prefix=prefix).values_list('last_value', flat=True).get()
+
+        return last - count + 1, last
+
+    @classmethod
+    def _create_sequence(cls, prefix, model):
+        """
+        Create the counter row for a new prefix, seeded from any invoices that
+        were numbered before the sequence existed. This scan runs once per
+        prefix (i.e. once per day), not on every insert.
+        """
+        existing = model.objects.filter(invoice_no__startswith=prefix).values_list('invoice_no', flat=True)
+        seed = 0
+        for invoice_no in existing:
+            suffix = invoice_no[len(prefix):]
+            if suffix.isdigit():
+                seed = max(seed, int(suffix))
+
+        try:
+            with transaction.atomic():
+                InvoiceSequence.objects.create(prefix=prefix, last_value=seed)
+        except IntegrityError:
+            # Another worker created the row first; its seed is equivalent
+            pass
+
+
+def allocate_invoice_number(model, code):
+    """Shortcut used by Invoice.save() and CashInvoice.save()"""
+    return InvoiceNumberAllocator.next_number(model, code)
@@ -1,101 +1,169 @@
 """
 Django signals to handle cache invalidation and other automated tasks
+
+Cache invalidation is collected by CacheInvalidator and flushed once per
+request or transaction (after commit) instead of once per saved row.
 """
-from django.db.models.signals import post_save, post_delete, pre_save
-from django.dispatch import receiver
-from django.core.cache import cache
-from .models import Invoice, Product, Sale
-from .cache_utils import SalesCache
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.contrib.auth.models import User
+from django.dispatch import receiver, Signal
+from .models import Invoice, Product, Sale, CashInvoice, CashProduct
+from .cache_utils import CacheNamespace
+from .invalidation import CacheInvalidator
+from .rollups import SalesRollup
+from .customers import CustomerLedger
 
 
-@receiver(post_save, sender=Invoice)
-def invoice_post_save(sender, instance, created, **kwargs):
-    """Handle invoice creation/updates"""
-    # Invalidate daily cache for the invoice date
-    if instance.date_of_sale:
-        SalesCache.invalidate_daily_cache(instance.date_of_sale)
-    
-    # Invalidate monthly cache
-    if instance.date_of_sale:
-        cache_key = f'monthly_summary_{instance.date_of_sale.year}_{instance.date_of_sale.month}'
-        cache.delete(cache_key)
-    
-    # Invalidate sales-related caches
-    SalesCache.invalidate_sales_cache()
+# Sent with changes={product_id: (stock_before, stock_after)} whenever stock
+# levels change, once per batch for bulk updates.
+stock_changed = Signal()
+
+# Sent with dates=[date_of_sale, ...] after payment statuses are changed in
+# bulk by sales_app.payment_status (no post_save is sent for those rows).
+invoice_statuses_changed = Signal()
 
+# Sent with dates=[date_of_sale, ...] after invoices are bulk created by the
+# CSV import (sales_app.imports).
+invoices_imported = Signal()
 
+
+@receiver(post_save, sender=Invoice)
 @receiver(post_delete, sender=Invoice)
-def invoice_post_delete(sender, instance, **kwargs):
-    """Handle invoice deletion"""
-    # Invalidate daily cache
-    if instance.date_of_sale:
-        SalesCache.invalidate_daily_cache(instance.date_of_sale)
-    
-    # Invalidate monthly cache
-    if instance.date_of_sale:
-        cache_key = f'monthly_summary_{instance.date_of_sale.year}_{instance.date_of_sale.month}'
-        cache.delete(cache_key)
-    
-    # Invalidate sales-related caches
-    SalesCache.invalidate_sales_cache()
+def invoice_changed(sender, instance, **kwargs):
+    """Handle invoice creation/updates/deletion"""
+    # Daily and monthly summaries, top products, ...
+    CacheInvalidator.mark(CacheNamespace.SALES, dates=[instance.date_of_sale])
+
+
+@receiver(post_save, sender=CashInvoice)
+@receiver(post_delete, sender=CashInvoice)
+def cash_invoice_changed(sender, instance, **kwargs):
+    """Handle cash invoice creation/updates/deletion"""
+    CacheInvalidator.mark(CacheNamespace.CASH)
 
 
 @receiver(post_save, sender=Product)
 def product_post_save(sender, instance, created, **kwargs):
     """Handle product creation/updates"""
-    # Invalidate product-related caches
-    SalesCache.invalidate_product_cache()
-    
-    # If stock changed, invalidate low stock cache
-    if hasattr(instance, '_original_stock'):
-        if instance._original_stock != instance.stock:
-            SalesCache.invalidate_product_cache()
-
-
-@receiver(pre_save, sender=Product)
-def product_pre_save(sender, instance, **kwargs):
-    """Store original stock value before save"""
-    if instance.pk:
-        try:
-            original = Product.objects.get(pk=instance.pk)
-            instance._original_stock = original.stock
-        except Product.DoesNotExist:
-            instance._original_stock = None
-    else:
-        instance._original_stock = None
+    if created:
+        CacheInvalidator.mark(CacheNamespace.PRODUCTS, CacheNamespace.CATALOG)
+        return
+
+    # Compared against the values loaded with the instance (no extra query)
+    changed = instance.changed_fields
+    if 'name' in changed or not instance.has_snapshot:
+        # Search indexes only depend on names
+        CacheInvalidator.mark(CacheNamespace.CATALOG)
+    if 'stock' in changed:
+        stock_changed.send(sender=Product, changes={instance.pk: changed['stock']})
+    elif changed or not instance.has_snapshot:
+        CacheInvalidator.mark(CacheNamespace.PRODUCTS)
+
+
+@receiver(stock_changed)
+def product_stock_changed(sender, changes, **kwargs):
+    """Handle batched stock level changes (single saves and StockLedger bulk updates)"""
+    # Invalidate product-related caches (low stock lists, ...)
+    CacheInvalidator.mark(CacheNamespace.PRODUCTS)
 
 
 @receiver(post_delete, sender=Product)
 def product_post_delete(sender, instance, **kwargs):
     """Handle product deletion"""
-    SalesCache.invalidate_product_cache()
+    CacheInvalidator.mark(CacheNamespace.PRODUCTS, CacheNamespace.CATALOG)
 
 
-@receiver(post_save, sender=Sale)
-def sale_post_save(sender, instance, created, **kwargs):
-    """Handle sale creation/updates"""
-    # Invalidate sales-related caches
-    SalesCache.invalidate_sales_cache()
-    
-    # Invalidate daily cache for the related invoice (with error handling)
-    try:
-        if instance.invoice and instance.invoice.date_of_sale:
-            SalesCache.invalidate_daily_cache(instance.invoice.date_of_sale)
-    except (Invoice.DoesNotExist, AttributeError):
-        # Invoice may not exist or may be in process of deletion
-        pass
+@receiver(post_save, sender=CashProduct)
+@receiver(post_delete, sender=CashProduct)
+def cash_product_changed(sender, instance, **kwargs):
+    """Handle cash product creation/updates/deletion (search index and cached results)"""
+    CacheInvalidator.mark(CacheNamespace.CATALOG)
 
 
+@receiver(post_save, sender=Sale)
 @receiver(post_delete, sender=Sale)
-def sale_post_delete(sender, instance, **kwargs):
-    """Handle sale deletion"""
-    # Invalidate sales-related caches
-    SalesCache.invalidate_sales_cache()
-    
-    # Invalidate daily cache for the related invoice (with error handling)
-    try:
-        if instance.invoice and instance.invoice.date_of_sale:
-            SalesCache.invalidate_daily_cache(instance.invoice.date_of_sale)
-    except (Invoice.DoesNotExist, AttributeError):
-        # Invoice may have been deleted already (cascade delete)
-        pass
+def sale_changed(sender, instance, **kwargs):
+    """Handle sale creation/updates/deletion"""
+    # The sales namespace covers every daily summary, so the related invoice
+    # does not need to be loaded here
+    CacheInvalidator.mark(CacheNamespace.SALES)
+
+
+# === STORED CONTRIBUTIONS ===
+
+def remember_stored_contributions(model, instance):
+    """
+    Read the invoice's stored row once, locked until the save/delete
+    transaction ends, and keep its rollup and customer contributions for
+    the post_save/post_delete handlers below
+    """
+    row = None
+    if instance.pk is not None:
+        fields = list(dict.fromkeys(SalesRollup.tracked_fields(model) + CustomerLedger.tracked_fields(model)))
+        row = model.objects.select_for_update().filter(pk=instance.pk).values(*fields).first()
+    instance._rollup_before = SalesRollup.snapshot_values(model, row) if row else None
+    instance._customer_before = CustomerLedger.snapshot_values(model, row) if row else None
+
+
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_save, sender=CashInvoice)
+def invoice_pre_save(sender, instance, **kwargs):
+    """Remember the invoice's stored contributions before it changes"""
+    remember_stored_contributions(sender, instance)
+
+
+@receiver(pre_delete, sender=Invoice)
+@receiver(pre_delete, sender=CashInvoice)
+def invoice_pre_delete(sender, instance, **kwargs):
+    """Remember the stored contributions of an invoice about to be deleted"""
+    remember_stored_contributions(sender, instance)
+
+
+# === DAILY SALES ROLLUPS ===
+
+@receiver(pre_delete, sender=User)
+def user_rollup_pre_delete(sender, instance, **kwargs):
+    """Move a deleted user's rollup rows to the user-less rows"""
+    SalesRollup.release_user(instance.pk)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=CashInvoice)
+def invoice_rollup_post_save(sender, instance, **kwargs):
+    """Move the invoice's contribution to its new rollup row"""
+    SalesRollup.record_change(getattr(instance, '_rollup_before', None), SalesRollup.snapshot(instance))
+    instance._rollup_before = None
+
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=CashInvoice)
+def invoice_rollup_post_delete(sender, instance, **kwargs):
+    """Remove a deleted invoice's contribution"""
+    SalesRollup.record_change(getattr(instance, '_rollup_before', None), None)
+    instance._rollup_before = None
+
+
+# === CUSTOMERS ===
+
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_save, sender=CashInvoice)
+def invoice_customer_pre_save(sender, instance, update_fields=None, **kwargs):
+    """Link the invoice to its customer from its phone number"""
+    if CustomerLedger.needs_link(instance, update_fields):
+        instance.customer = CustomerLedger.resolve(instance.customer_name, instance.customer_phone)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=CashInvoice)
+def invoice_customer_post_save(sender, instance, **kwargs):
+    """Move the invoice's contribution to its customer's new totals"""
+    CustomerLedger.record_change(getattr(instance, '_customer_before', None), CustomerLedger.snapshot(instance))
+    instance._customer_before = None
+
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=CashInvoice)
+def invoice_customer_post_delete(sender, instance, **kwargs):
+    """Remove a deleted invoice's contribution from its customer"""
+    CustomerLedger.record_change(getattr(instance, '_customer_before', None), None)
+    instance._customer_before = None
@@ -0,0 +1,223 @@
+"""
+Stock ledger service: applies batched stock changes, records StockMovement
+rows and answers point-in-time stock queries from periodic checkpoints
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockCheckpoint
+from .signals import stock_changed
+
+logger = logging.getLogger(__name__)
+
+
+class StockLedger:
+    """
+    Apply stock changes for many products at once.
+
+    Products are given by id (sale lines linked to a product) or by name.
+    All affected products are locked with a single
+    SELECT ... WHERE id IN (...) OR name IN (...) ORDER BY id FOR UPDATE, the
+    new levels are computed in memory, written back with one bulk UPDATE, and
+    the matching StockMovement rows are inserted with one bulk_create.
+    Locking in id order means two cashiers selling overlapping items always
+    acquire row locks in the same order and cannot deadlock.
+    """
+
+    @classmethod
+    def deduct(cls, quantities, reference=None, user=None, movement_type='SALE'):
+        """
+        Deduct {product id or name: quantity} from stock.
+        Stock levels are capped at zero (never goes negative).
+        """
+        return cls.apply(
+            {name: -qty for name, qty in quantities.items()},
+            movement_type, reference=reference, user=user,
+        )
+
+    @classmethod
+    def restore(cls, quantities, reference=None, user=None, movement_type='RETURN'):
+        """Add {product id or name: quantity} back to stock (deleted or edited invoices)"""
+        return cls.apply(quantities, movement_type, reference=reference, user=user)
+
+    @classmethod
+    def apply(cls, changes, movement_type, reference=None, user=None, notes=None):
+        """
+        Apply {product id or name: signed_quantity} changes in one locked batch.
+        Returns {product id or name: new_stock} for the products that were found.
+        """
+        changes = {key: qty for key, qty in changes.items() if key and qty}
+        return cls._write(changes, lambda current, change: current + change,
+                          movement_type, reference, user, notes)
+
+    @classmethod
+    def set_levels(cls, levels, movement_type='ADJUSTMENT', reference=None, user=None, notes=None):
+        """
+        Set absolute stock levels {product id or name: new_stock} (stock takes,
+        imports), recording the difference as a movement.
+        """
+        levels = {key: stock for key, stock in levels.items() if key and stock is not None}
+        return cls._write(levels, lambda current, target: target,
+                          movement_type, reference, user, notes)
+
+    @classmethod
+    def record_change(cls, product, stock_before, movement_type='ADJUSTMENT', reference=None, user=None, notes=None):
+        """
+        Record a movement for a stock level that was already written on
+        `product` (e.g. by ProductForm). Does nothing if the level is unchanged.
+        """
+        stock_before = stock_before or 0
+        stock_after = product.stock or 0
+        if stock_after == stock_before:
+            return None
+        return StockMovement.objects.create(
+            product=product,
+            movement_type=movement_type,
+            quantity_change=stock_after - stock_before,
+            stock_before=stock_before,
+            stock_after=stock_after,
+            reference=reference,
+            notes=notes,
+            created_by=user,
+        )
+
+    @classmethod
+    def _write(cls, targets, compute, movement_type, reference, user, notes):
+        if not targets:
+            return {}
+
+        ids = [key for key in targets if isinstance(key, int)]
+        names = [key for key in targets if not isinstance(key, int)]
+
+        with transaction.atomic():
+            products = {}
+            for product in Product.objects.select_for_update().filter(
+                Q(pk__in=ids) | Q(name__in=names)
+            ).order_by('id'):
+                products[product.pk] = product
+                # Product names are not unique; keep the oldest match, as the
+                # name-based lookups elsewhere do.
+                products.setdefault(product.name, product)
+
+            updated, movements, new_levels = [], [], {}
+            for key, value in targets.items():
+                product = products.get(key)
+                if product is None:
+                    logger.warning(f"Product '{key}' not found during stock update ({movement_type})")
+                    continue
+                name = product.name
+
+                stock_before = product.stock or 0
+                requested = compute(stock_before, value)
+                stock_after = max(0, requested)
+                actual_change = stock_after - stock_before
+
+                if requested < 0:
+                    logger.warning(
+                        f"STOCK CAPPED: {name} - attempted {stock_before - requested}, deducted {-actual_change}, "
+                        f"shortage {-requested}. New stock: {stock_after}"
+                    )
+                else:
+                    logger.info(f"Stock updated: {name} {actual_change:+d} units. New stock: {stock_after}")
+
+                new_levels[key] = stock_after
+                if actual_change == 0:
+                    continue
+
+                product.stock = stock_after
+                updated.append(product)
+                movements.append(StockMovement(
+                    product=product,
+                    movement_type=movement_type,
+                    quantity_change=actual_change,
+                    stock_before=stock_before,
+                    stock_after=stock_after,
+                    reference=reference,
+                    notes=notes,
+                    created_by=user,
+                ))
+
+            if updated:
+                Product.objects.bulk_update(updated, ['stock'])
+                StockMovement.objects.bulk_create(movements)
+                # bulk_update bypasses the Product signals; notify once for the batch
+                stock_changed.send(sender=Product, changes={
+                    movement.product_id: (movement.stock_before, movement.stock_after)
+                    for movement in movements
+                })
+
+        return new_levels
+
+    # === POINT-IN-TIME QUERIES ===
+
+    @classmethod
+    def create_checkpoint(cls, taken_at=None):
+        """Snapshot every product's current stock. Returns the number of rows written."""
+        taken_at = taken_at or timezone.now()
+        with transaction.atomic():
+            levels = Product.objects.select_for_update().values_list('id', 'stock')
+            checkpoints = [
+                StockCheckpoint(product_id=product_id, stock=stock or 0, taken_at=taken_at)
+                for product_id, stock in levels
+            ]
+            StockCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+        return len(checkpoints)
+
+    @classmethod
+    def as_of(cls, when):
+        """
+        Rebuild {product_id: stock} as it was at `when` (a datetime, or a date
+        meaning the end of that day).
+
+        Starts from the latest checkpoint at or before `when` and adds the
+        movements recorded since, so only the movements between the
+        checkpoint and `when` are read. Products with no checkpoint and no
+        movements up to `when` are omitted; take a checkpoint after deploying
+        so products that predate the ledger have a baseline.
+        """
+        if isinstance(when, date) and not isinstance(when, datetime):
+            when = timezone.make_aware(datetime.combine(when + timedelta(days=1), time.min)) - timedelta(microseconds=1)
+        elif timezone.is_naive(when):
+            when = timezone.make_aware(when)
+
+        checkpoint_at = StockCheckpoint.objects.filter(
+            taken_at__lte=when
+        ).aggregate(latest=Max('taken_at'))['latest']
+
+        levels = {}
+        movements = StockMovement.objects.filter(created_at__lte=when)
+        if checkpoint_at is not None:
+            levels = dict(
+                StockCheckpoint.objects.filter(taken_at=checkpoint_at).values_list('product_id', 'stock')
+            )
+            movements = movements.filter(created_at__gt=checkpoint_at)
+
+        for row in movements.order_by().values('product_id').annotate(change=Sum('quantity_change')):
+            levels[row['product_id']] = levels.get(row['product_id'], 0) + row['change']
+
+        return levels
+
+
+def sale_item_quantities(rows):
+    """
+    Sum quantities per product from formset cleaned_data dicts or Sale
+    instances, skipping deleted and empty rows. Lines linked to a product
+    are keyed by its id, unlinked lines by their item name.
+    """
+    quantities = {}
+    for row in rows:
+        if isinstance(row, dict):
+            if not row or row.get('DELETE', False):
+                continue
+            key = row.get('product_id') or row.get('item')
+            quantity = row.get('quantity', 0)
+        else:
+            key, quantity = row.product_id or row.item, row.quantity
+
+        if key and quantity and quantity > 0:
+            quantities[key] = quantities.get(key, 0) + quantity
+    return quantities
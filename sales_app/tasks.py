@@ -0,0 +1,39 @@
+"""
+Background job tasks of the sales app (run by `manage.py run_jobs`)
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from core.jobs import task
+from .cache_utils import SalesCache
+from .imports import SalesImport
+from .payment_status import PaymentStatusSweeper
+
+
+@task(SalesImport.TASK, max_attempts=1)
+def import_sales_csv(job, source, bytes_total=0):
+    """Import an uploaded sales CSV (not retried: committed chunks would be imported twice)"""
+    return SalesImport(source, job=job, bytes_total=bytes_total).run()
+
+
+@task('sales.warmup_cache')
+def warmup_cache(job):
+    """Pre-populate the commonly read dashboard caches"""
+    today = timezone.now().date()
+    warmers = [
+        ('daily_sales', lambda: SalesCache.get_daily_sales_summary(today)),
+        ('low_stock_products', lambda: SalesCache.get_low_stock_products(50)),
+        ('top_products_7d', lambda: SalesCache.get_top_products(days=7, limit=10)),
+        ('top_products_30d', lambda: SalesCache.get_top_products(days=30, limit=10)),
+        ('monthly_summary', SalesCache.get_monthly_summary),
+    ]
+    for done, (name, warm) in enumerate(warmers, start=1):
+        warm()
+        job.set_progress(done=done, total=len(warmers), last=name)
+    return {'warmed': [name for name, _ in warmers]}
+
+
+@task('sales.sweep_overdue', every=getattr(settings, 'OVERDUE_SWEEP_INTERVAL', 0))
+def sweep_overdue(job):
+    """Mark unpaid/partial invoices past their due date as overdue"""
+    return {'marked_overdue': PaymentStatusSweeper.sweep()}
@@ -8,8 +8,12 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('sales_entry/', views.sales_entry, name='sales_entry'),
     path('manager_dashboard/', views.manager_dashboard, name='manager_dashboard'),
+    path('imports/<int:job_id>/errors/', views.sales_import_errors, name='sales_import_errors'),
     path('print_daily/', views.print_daily_invoices, name='print_daily_invoices'),
     path('print_search/', views.print_search_results, name='print_search_results'),
+    path('api/invoices/search/', views.invoice_search_api, name='invoice_search_api'),
+    path('api/customers/', views.top_customers_api, name='top_customers_api'),
+    path('api/customers/<int:customer_id>/', views.customer_history_api, name='customer_history_api'),
     path('edit_sale/<int:sale_id>/', views.edit_sale, name='edit_sale'),
     path('invoice/<int:invoice_id>/', views.invoice_detail, name='invoice_detail'),
     path('edit_invoice/<int:invoice_id>/', views.edit_invoice, name='edit_invoice'),
@@ -1,12 +1,12 @@
-import csv
-import io
 from datetime import datetime
 import logging
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
 from django.db.models import Sum, Q
 from django.utils import timezone
 from django import forms
@@ -14,10 +14,19 @@ from django.db import transaction
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.forms import inlineformset_factory
+from django.core.files.storage import default_storage
 
-from .models import Product, Invoice, Sale, AdminLog, CashInvoice, CashSale, CashProduct
+from .models import Product, Invoice, Sale, AdminLog, CashInvoice, CashSale, CashProduct, Customer
 from .forms import InvoiceForm, SaleForm, ProductForm, SalesCSVImportForm, CashProductForm, CashInvoiceForm, CashSaleForm
 from .cache_utils import SalesCache, get_dashboard_stats, cache_expensive_query
+from .stock import StockLedger, sale_item_quantities
+from .search import ProductSearch
+from .imports import SalesImport
+from .invoice_search import InvoiceSearch
+from .search_index import InvoiceSearchIndex
+from .customers import CustomerLedger
+from core.models import Job
+from core.pagination import InvalidCursor
 
 
 
@@ -36,28 +45,30 @@ def validate_stock_availability(formset_data):
     Returns a list of error messages if validation fails.
     """
     errors = []
-    stock_requirements = {}  # {product_name: total_quantity_needed}
     
     try:
         logger.debug(f"Validating items for {len(formset_data)} entries")
-        for i, form_data in enumerate(formset_data):
-            if form_data and not form_data.get('DELETE', False):
-                item_name = form_data.get('item')
-                quantity = form_data.get('quantity', 0)
-                logger.debug(f"Item {i}: {item_name}, Quantity: {quantity}")
-                if item_name and quantity > 0:
-                    stock_requirements[item_name] = stock_requirements.get(item_name, 0) + quantity
+        # {product id (linked lines) or name: total_quantity_needed}
+        stock_requirements = sale_item_quantities(formset_data)
         logger.debug(f"Stock requirements: {stock_requirements}")
         # Only check that products exist - no longer blocking on stock levels
+        # (one query for all items instead of one per line)
+        ids = [key for key in stock_requirements if isinstance(key, int)]
+        names = [key for key in stock_requirements if not isinstance(key, int)]
+        stock_levels = {}
+        for pk, name, stock in Product.objects.filter(
+            Q(pk__in=ids) | Q(name__in=names)
+        ).order_by('-id').values_list('id', 'name', 'stock'):
+            stock_levels[pk] = stock
+            stock_levels[name] = stock
         for item_name, total_needed in stock_requirements.items():
-            try:
-                product = Product.objects.get(name=item_name)
-                available = product.stock or 0
+            if item_name in stock_levels:
+                available = stock_levels[item_name] or 0
                 logger.debug(f"Product {item_name}: needed {total_needed}, available {available}")
                 # Log low stock warning but don't block the sale
                 if available < total_needed:
                     logger.warning(f"STOCK WARNING: Low stock for '{item_name}'. Needed: {total_needed}, Available: {available} (Sale will proceed, stock will be capped at zero)")
-            except Product.DoesNotExist:
+            else:
                 error_msg = f"Product '{item_name}' not found in inventory."
                 errors.append(error_msg)
                 logger.error(f"PRODUCT ERROR: {error_msg}")
@@ -73,129 +84,20 @@ def validate_stock_availability(formset_data):
 
 
     
-def deduct_stock_for_sale_items(formset_data, invoice_no):
+def deduct_stock_for_sale_items(formset_data, invoice_no, user=None):
     """
     Deduct stock quantities for all items in the sale.
     Stock levels are capped at zero (never goes negative).
     This function should be called within a database transaction.
     """
-    stock_deductions = {}  # {product_name: total_quantity_to_deduct}
-    
-    # Calculate total deductions needed per product
-    for form_data in formset_data:
-        if form_data and not form_data.get('DELETE', False):
-            item_name = form_data.get('item')
-            quantity = form_data.get('quantity', 0)
-            
-            if item_name and quantity > 0:
-                stock_deductions[item_name] = stock_deductions.get(item_name, 0) + quantity
-    
-    # Apply deductions with zero-floor enforcement
-    for item_name, total_deduction in stock_deductions.items():
-        try:
-            product = Product.objects.select_for_update().get(name=item_name)
-            current_stock = product.stock or 0
-            
-            # Calculate actual deduction (never let stock go negative)
-            actual_deduction = min(total_deduction, current_stock)
-            new_stock = max(0, current_stock - total_deduction)
-            
-            product.stock = new_stock
-            product.save()
-            
-            if actual_deduction < total_deduction:
-                shortage = total_deduction - actual_deduction
-                logger.warning(f"STOCK CAPPED: {item_name} - attempted {total_deduction}, deducted {actual_deduction}, shortage {shortage}. New stock: {new_stock}")
-            else:
-                logger.info(f"Stock deducted: {item_name} - {total_deduction} units. New stock: {new_stock}")
-            
-        except Product.DoesNotExist:
-            logger.warning(f"Product '{item_name}' not found during stock deduction")
-def restore_stock_for_sale_items(sale_items, invoice_no):
+    StockLedger.deduct(sale_item_quantities(formset_data), reference=invoice_no, user=user)
+
+
+def restore_stock_for_sale_items(sale_items, invoice_no, user=None):
     """
     Restore stock quantities for sale items (used when deleting/editing invoices).
     """
-    for sale_item in sale_items:
-        if sale_item.item and sale_item.quantity:
-            try:
-                product = Product.objects.select_for_update().get(name=sale_item.item)
-                product.stock = (product.stock or 0) + sale_item.quantity
-                product.save()
-                logger.info(f"Stock restored: {sale_item.item} + {sale_item.quantity} units. New stock: {product.stock}")
-            except Product.DoesNotExist:
-                logger.warning(f"Product '{sale_item.item}' not found during stock restoration")
-
-
-def process_csv_import(csv_file):
-    """Process CSV file import and return results"""
-    from datetime import datetime
-    
-    def parse_csv_date(date_string):
-        """Parse DD/M/YYYY format to proper date object"""
-        if not date_string or date_string.strip() == '' or date_string.strip() == ';':
-            return timezone.now().date()
-        
-        try:
-            # Try DD/M/YYYY format first (from your CSV)
-            return datetime.strptime(date_string.strip(), '%d/%m/%Y').date()
-        except ValueError:
-            try:
-                # Try DD-M-YYYY format
-                return datetime.strptime(date_string.strip(), '%d-%m-%Y').date()
-            except ValueError:
-                try:
-                    # Try YYYY-MM-DD format (standard Django format)
-                    return datetime.strptime(date_string.strip(), '%Y-%m-%d').date()
-                except ValueError:
-                    logger.warning(f"Could not parse date: {date_string}, using current date")
-                    return timezone.now().date()
-    
-    decoded_file = csv_file.read().decode('utf-8')
-    io_string = io.StringIO(decoded_file)
-    reader = csv.DictReader(io_string)
-    imported, errors = 0, []
-    
-    for idx, row in enumerate(reader, start=2):
-        try:
-            # Handle different CSV column name variations
-            date_string = row.get('Date of Sale') or row.get('DATE_TODAY')
-            date_of_sale = parse_csv_date(date_string)
-            invoice_no = row.get('Invoice No') or row.get('INV NO')
-            teller = row.get('User') or row.get('TELLER')
-            customer_name = row.get('Customer Name') or row.get('CUSTOMER NA')
-            customer_phone = row.get('Customer Phone') or row.get('CUSTOMER_PHONE') or row.get('Phone')
-            customer_number = row.get('CUSTOMER NO')
-            item = row.get('Item') or row.get('TYPE OF JOB')
-            quantity = int(float(row.get('Quantity') or row.get('QTY') or 1))
-            unit_price = float(row.get('Unit Price') or row.get('UP') or 0)
-            total_amount = float(row.get('total_amount') or row.get('T AMT') or 0)
-            amount_paid = float(row.get('AMT PAID') or 0)
-            balance = float(row.get('BAL TO BE PAID') or 0)
-
-            invoice, created = Invoice.objects.get_or_create(
-                invoice_no=invoice_no,
-                defaults={
-                    'customer_name': customer_name,
-                    'customer_phone': customer_phone,
-                    'date_of_sale': date_of_sale,  # Now using properly parsed date
-                    'amount_paid': amount_paid,
-                    'total': total_amount,
-                }
-            )
-            
-            Sale.objects.create(
-                invoice=invoice,
-                item=item,
-                unit_price=unit_price,
-                quantity=quantity,
-                total_price=total_amount,
-            )
-            imported += 1
-            
-        except Exception as e:
-            errors.append(f"Row {idx}: {e}")
-    
-    return imported, errors
+    StockLedger.restore(sale_item_quantities(sale_items), reference=invoice_no, user=user)
 
 
 # === AUTHENTICATION VIEWS ===
@@ -276,7 +178,9 @@ def add_product(request):
     if request.method == 'POST':
         form = ProductForm(request.POST)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                product = form.save()
+                StockLedger.record_change(product, 0, user=request.user, notes='Opening stock')
             messages.success(request, 'Product added successfully!')
             return redirect('products_list')
     else:
@@ -292,9 +196,12 @@ def edit_product(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     
     if request.method == 'POST':
+        stock_before = product.stock
         form = ProductForm(request.POST, instance=product)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                product = form.save()
+                StockLedger.record_change(product, stock_before, user=request.user, notes='Product edited')
             messages.success(request, 'Product updated successfully!')
             return redirect('products_list')
     else:
@@ -319,23 +226,39 @@ def delete_product(request, product_id):
 
 # === PRODUCT SEARCH API ===
 
+def _autocomplete_item(p):
+    return {
+        'id': p.id, 
+        'name': p.name, 
+        'price': str(p.price),
+        'unit_price': str(p.price),
+        'stock': p.stock or 0
+    }
+
+
+def _select2_product_item(product):
+    return {
+        'id': product.id,
+        'text': product.name,
+        'price': str(product.price),
+        'unit_price': str(product.price),
+        'stock': product.stock or 0
+    }
+
+
+def _select2_cash_product_item(product):
+    return {
+        'id': product.id,
+        'text': product.name,
+        'name': product.name,
+        'rate': str(product.rate)
+    }
+
+
 def product_autocomplete(request):
-    """Product autocomplete/search API"""
+    """Product autocomplete/search API (ranked: prefix matches first)"""
     query = request.GET.get('q', '')
-    if query:
-        products = Product.objects.filter(name__icontains=query).order_by('name')[:50]
-    else:
-        products = Product.objects.none()
-    data = [
-        {
-            'id': p.id, 
-            'name': p.name, 
-            'price': str(p.price),
-            'unit_price': str(p.price),
-            'stock': p.stock or 0
-        }
-        for p in products
-    ]
+    data = ProductSearch.search(Product, query, _autocomplete_item, limit=50)
     return JsonResponse(data, safe=False)
 
 
@@ -346,18 +269,7 @@ def product_search_api(request):
     """
     if request.method == 'GET':
         query = request.GET.get('q', '').strip()
-        products = Product.objects.filter(name__icontains=query)[:20] if query else Product.objects.none()
-        
-        data = [
-            {
-                'id': product.id,
-                'text': product.name,
-                'price': str(product.price),
-                'unit_price': str(product.price),
-                'stock': product.stock or 0
-            }
-            for product in products
-        ]
+        data = ProductSearch.search(Product, query, _select2_product_item, limit=20)
         return JsonResponse(data, safe=False)
     
     return JsonResponse([], safe=False)
@@ -412,7 +324,7 @@ def sales_entry(request):
                                 logger.debug(f"Invoice created with ID {invoice.id}")
                                 
                                 # Deduct stock (capped at zero) before saving formset
-                                deduct_stock_for_sale_items(formset_data, invoice.invoice_no)
+                                deduct_stock_for_sale_items(formset_data, invoice.invoice_no, user=request.user)
                                 
                                 # Save the formset
                                 formset.instance = invoice
@@ -511,28 +423,21 @@ def sales_entry(request):
 @user_passes_test(is_manager)
 def manager_dashboard(request):
     """Manager dashboard with search functionality and CSV import for both regular and cash departments"""
-    # Handle CSV import
-    import_result = None
-    import_errors = None
+    # Handle CSV import (runs in the background, see sales_app.imports)
     csv_form = SalesCSVImportForm()
-    
-    # Get department filter
-    department = request.GET.get('department', 'regular')  # 'regular' or 'cash'
+    import_id = request.GET.get('import', '')
+    sales_import = None
+    if import_id.isdigit():
+        sales_import = Job.objects.filter(pk=import_id, name=SalesImport.TASK).first()
     
     if request.method == 'POST':
         if 'csv_file' in request.FILES:
             csv_form = SalesCSVImportForm(request.POST, request.FILES)
             if csv_form.is_valid():
                 csv_file = csv_form.cleaned_data['csv_file']
-                import_result, import_errors = process_csv_import(csv_file)
-                
-                if import_result > 0:
-                    messages.success(request, f'Successfully imported {import_result} sales records.')
-                if import_errors:
-                    for error in import_errors[:5]:  # Show first 5 errors
-                        messages.error(request, error)
-                    if len(import_errors) > 5:
-                        messages.warning(request, f'And {len(import_errors) - 5} more errors...')
+                job = SalesImport.start(csv_file, user=request.user)
+                messages.info(request, 'Import queued. Progress is shown on the dashboard.')
+                return redirect(f"{reverse('manager_dashboard')}?import={job.pk}")
         
         elif 'delete_invoice_id' in request.POST:
             # Handle regular invoice deletion with stock restoration
@@ -553,7 +458,7 @@ def manager_dashboard(request):
                     logger.debug(f"Invoice has {len(invoice_items)} items")
                     
                     # Restore stock for all items in the invoice
-                    restore_stock_for_sale_items(invoice_items, invoice_no)
+                    restore_stock_for_sale_items(invoice_items, invoice_no, user=request.user)
                     logger.debug(f"Stock restored for invoice {invoice_no}")
                     
                     # Log the deletion before deleting
@@ -629,123 +534,48 @@ def manager_dashboard(request):
                 messages.error(request, f'Error deleting cash invoice: {str(e)}')
             
             from django.http import HttpResponseRedirect
-            from django.urls import reverse
             return HttpResponseRedirect(reverse('manager_dashboard') + '?department=cash')
     
-    # Handle search and filtering parameters
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    customer_name = request.GET.get('customer_name', '').strip()
-    customer_phone = request.GET.get('customer_phone', '').strip()
-    invoice_no = request.GET.get('invoice_no', '').strip()
-    
-    has_search_params = any([start_date, end_date, customer_name, customer_phone, invoice_no])
-    
-    # Handle different departments
-    if department == 'cash':
-        # Cash department - query CashInvoice model
-        invoices_query = CashInvoice.objects.prefetch_related('items')
-        
-        if has_search_params:
-            search_conditions = Q()
-            
-            # Date range search
-            if start_date and end_date:
-                search_conditions |= Q(date_of_sale__gte=start_date, date_of_sale__lte=end_date)
-            elif start_date:
-                search_conditions |= Q(date_of_sale__gte=start_date)
-            elif end_date:
-                search_conditions |= Q(date_of_sale__lte=end_date)
-            
-            # Customer name search
-            if customer_name:
-                search_conditions |= Q(customer_name__icontains=customer_name)
-            
-            # Customer phone search
-            if customer_phone:
-                search_conditions |= Q(customer_phone__icontains=customer_phone)
-            
-            # Invoice number search
-            if invoice_no:
-                search_conditions |= Q(invoice_no__icontains=invoice_no)
-            
-            if search_conditions:
-                invoices = invoices_query.filter(search_conditions).order_by('-date_of_sale')
-        else:
-            # Default: show today's cash invoices
-            today = timezone.now().date()
-            invoices = invoices_query.filter(date_of_sale=today).order_by('-date_of_sale')
-    
-    else:
-        # Regular department - query Invoice model
-        invoices_query = Invoice.objects.select_related('user').prefetch_related('items')
-        
-        if has_search_params:
-            search_conditions = Q()
-            
-            # Date range search
-            if start_date and end_date:
-                search_conditions |= Q(date_of_sale__gte=start_date, date_of_sale__lte=end_date)
-            elif start_date:
-                search_conditions |= Q(date_of_sale__gte=start_date)
-            elif end_date:
-                search_conditions |= Q(date_of_sale__lte=end_date)
-            
-            # Customer name search
-            if customer_name:
-                search_conditions |= Q(customer_name__icontains=customer_name)
-            
-            # Customer phone search
-            if customer_phone:
-                search_conditions |= Q(customer_phone__icontains=customer_phone)
-            
-            # Invoice number search
-            if invoice_no:
-                search_conditions |= Q(invoice_no__icontains=invoice_no)
-            
-            if search_conditions:
-                invoices = invoices_query.filter(search_conditions).order_by('-date_of_sale')
-        else:
-            # Default: show today's invoices
-            today = timezone.now().date()
-            invoices = invoices_query.filter(date_of_sale=today).order_by('-date_of_sale')
-
-    # Use pagination for large datasets
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    
-    paginator = Paginator(invoices, 25)  # Show 25 invoices per page
-    page = request.GET.get('page')
-    
+    # Search / listing: keyset pages with a cached count and total per search
+    search = InvoiceSearch.from_request(request)
     try:
-        invoices_page = paginator.page(page)
-    except PageNotAnInteger:
-        invoices_page = paginator.page(1)
-    except EmptyPage:
-        invoices_page = paginator.page(paginator.num_pages)
-    
-    # Calculate total sales efficiently
-    total_sales = invoices.aggregate(Sum('total'))['total__sum'] or 0
+        invoices_page = search.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        invoices_page = search.page()
+    search_totals = search.totals()
     
     context = {
         'invoices': invoices_page,
-        'total_sales': total_sales,
-        'department': department,
-        'search_params': {
-            'start_date': start_date,
-            'end_date': end_date,
-            'customer_name': customer_name,
-            'customer_phone': customer_phone,
-            'invoice_no': invoice_no,
-        },
+        'total_sales': search_totals['total'],
+        'invoice_count': search_totals['count'],
+        'department': search.department,
+        'search_params': search.params,
+        'search_match': search.match,
+        'search_query': urlencode(search.query_params()),
         'form': csv_form,
-        'import_result': import_result,
-        'import_errors': import_errors,
-        'has_search_params': has_search_params,
+        'sales_import': sales_import,
+        'has_search_params': search.has_params,
     }
     
     return render(request, 'sales_app/manager_dashboard.html', context)
 
 
+@login_required
+@user_passes_test(is_manager)
+def sales_import_errors(request, job_id):
+    """Download the rejected rows of a CSV import, with the reason per row"""
+    job = get_object_or_404(Job, pk=job_id, name=SalesImport.TASK)
+    error_file = job.progress.get('error_file')
+    if not error_file or not default_storage.exists(error_file):
+        raise Http404("No error report for this import")
+    return FileResponse(
+        default_storage.open(error_file, 'rb'),
+        as_attachment=True,
+        filename=f'import_{job.pk}_errors.csv',
+        content_type='text/csv',
+    )
+
+
 @login_required
 @user_passes_test(is_manager)
 def invoice_detail(request, invoice_id, print_mode=False):
@@ -777,23 +607,15 @@ def edit_invoice(request, invoice_id):
                 with transaction.atomic():
                     # Restore stock for original invoice items
                     original_items = list(invoice.items.all())
-                    restore_stock_for_sale_items(original_items, invoice.invoice_no)
+                    restore_stock_for_sale_items(original_items, invoice.invoice_no, user=request.user)
                     
                     # Validate stock for new/updated items
                     formset_data = [form.cleaned_data for form in formset if form.cleaned_data]
                     stock_errors = validate_stock_availability(formset_data)
                     
                     if stock_errors:
-                        # Restore original stock deductions if validation fails
-                        for sale_item in original_items:
-                            if sale_item.item and sale_item.quantity:
-                                try:
-                                    product = Product.objects.select_for_update().get(name=sale_item.item)
-                                    product.stock = (product.stock or 0) - sale_item.quantity
-                                    product.save()
-                                except Product.DoesNotExist:
-                                    pass
-                        
+                        # Raising below rolls back the atomic block, which
+                        # also undoes the stock restoration above
                         for error in stock_errors:
                             messages.error(request, error)
                         raise ValidationError("Stock validation failed")
@@ -805,7 +627,7 @@ def edit_invoice(request, invoice_id):
                     formset.save()
                     
                     # Deduct stock for new/updated items
-                    deduct_stock_for_sale_items(formset_data, invoice.invoice_no)
+                    deduct_stock_for_sale_items(formset_data, invoice.invoice_no, user=request.user)
                     
                     # Recalculate total
                     items_total = sum(item.total_price or 0 for item in invoice.items.all())
@@ -885,67 +707,80 @@ def print_daily_invoices(request):
     return render(request, template_name, context)
 
 
+@login_required
+@user_passes_test(is_manager)
+def invoice_search_api(request):
+    """
+    Ranked customer/invoice number lookup across both departments.
+    Optional `department` ('regular' or 'cash') restricts it to one.
+    """
+    query = request.GET.get('q', '')
+    department = request.GET.get('department')
+    return JsonResponse(InvoiceSearchIndex.search(query, department), safe=False)
+
+
+def _customer_item(customer):
+    return {
+        'id': customer.id,
+        'name': customer.name,
+        'phone': customer.phone,
+        'invoice_count': customer.invoice_count,
+        'lifetime_spend': float(customer.lifetime_spend),
+        'outstanding': float(customer.outstanding),
+        'first_purchase': customer.first_purchase.isoformat() if customer.first_purchase else None,
+        'last_purchase': customer.last_purchase.isoformat() if customer.last_purchase else None,
+    }
+
+
+@login_required
+@user_passes_test(is_manager)
+def top_customers_api(request):
+    """Customers ranked by `order` ('spend', 'outstanding' or 'recent')"""
+    order = request.GET.get('order', 'spend')
+    if order not in CustomerLedger.ORDERINGS:
+        order = 'spend'
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+    return JsonResponse([_customer_item(c) for c in CustomerLedger.top(order, limit)], safe=False)
+
+
+@login_required
+@user_passes_test(is_manager)
+def customer_history_api(request, customer_id):
+    """A customer's totals and latest invoices of both departments"""
+    customer = get_object_or_404(Customer, pk=customer_id)
+    invoices = [
+        {
+            'department': department,
+            'id': invoice.id,
+            'invoice_no': invoice.invoice_no,
+            'date_of_sale': invoice.date_of_sale.isoformat() if invoice.date_of_sale else None,
+            'total': float(invoice.total or 0),
+            'payment_status': invoice.payment_status,
+        }
+        for department, invoice in CustomerLedger.history(customer)
+    ]
+    return JsonResponse({'customer': _customer_item(customer), 'invoices': invoices})
+
+
 @login_required
 @user_passes_test(is_manager)
 def print_search_results(request):
     """Print search results from manager dashboard (supports both regular and cash departments)"""
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    customer_name = request.GET.get('customer_name', '').strip()
-    customer_phone = request.GET.get('customer_phone', '').strip()
-    invoice_no = request.GET.get('invoice_no', '').strip()
-    department = request.GET.get('department', 'regular')
-    
-    # Select appropriate model based on department
-    if department == 'cash':
-        invoices = CashInvoice.objects.all().prefetch_related('items').order_by('-date_of_sale')
+    search = InvoiceSearch.from_request(request)
+    if search.department == 'cash':
         template_name = 'sales_app/cash_invoices_print.html'
     else:
-        invoices = Invoice.objects.all().prefetch_related('items').order_by('-date_of_sale')
         template_name = 'sales_app/invoices_print.html'
     
-    has_search_params = any([start_date, end_date, customer_name, customer_phone, invoice_no])
-    
-    if has_search_params:
-        search_conditions = Q()
-        
-        if start_date and end_date:
-            search_conditions |= Q(date_of_sale__gte=start_date, date_of_sale__lte=end_date)
-        elif start_date:
-            search_conditions |= Q(date_of_sale__gte=start_date)
-        elif end_date:
-            search_conditions |= Q(date_of_sale__lte=end_date)
-        
-        if customer_name:
-            search_conditions |= Q(customer_name__icontains=customer_name)
-        
-        if customer_phone:
-            search_conditions |= Q(customer_phone__icontains=customer_phone)
-        
-        if invoice_no:
-            search_conditions |= Q(invoice_no__icontains=invoice_no)
-        
-        if search_conditions:
-            invoices = invoices.filter(search_conditions)
-    else:
-        # Show today's invoices if no search params
-        today = timezone.now().date()
-        invoices = invoices.filter(date_of_sale=today)
-    
-    total_sales = invoices.aggregate(Sum('total'))['total__sum'] or 0
-    
     context = {
-        'invoices': invoices,
-        'total_sales': total_sales,
-        'search_params': {
-            'start_date': start_date,
-            'end_date': end_date,
-            'customer_name': customer_name,
-            'customer_phone': customer_phone,
-            'invoice_no': invoice_no,
-        },
+        'invoices': search.queryset(),
+        'total_sales': search.totals()['total'],
+        'search_params': search.params,
         'print_type': 'search',
-        'department': department
+        'department': search.department
     }
     return render(request, template_name, context)
 
@@ -1037,17 +872,7 @@ def cash_product_search_api(request):
     """
     if request.method == 'GET':
         query = request.GET.get('q', '').strip()
-        products = CashProduct.objects.filter(name__icontains=query)[:20] if query else CashProduct.objects.none()
-        
-        data = [
-            {
-                'id': product.id,
-                'text': product.name,
-                'name': product.name,
-                'rate': str(product.rate)
-            }
-            for product in products
-        ]
+        data = ProductSearch.search(CashProduct, query, _select2_cash_product_item, limit=20)
         return JsonResponse(data, safe=False)
     
     return JsonResponse([], safe=False)
@@ -1196,7 +1021,6 @@ def edit_cash_invoice(request, invoice_id):
                     
                     messages.success(request, f'Cash Invoice {cash_invoice.invoice_no} updated successfully!')
                     from django.http import HttpResponseRedirect
-                    from django.urls import reverse
                     return HttpResponseRedirect(reverse('manager_dashboard') + '?department=cash')
                     
             except Exception as e:
@@ -42,6 +42,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'sales_app.middleware.CacheInvalidationMiddleware',
 ]
 
 ROOT_URLCONF = 'sales_management_project.urls'
@@ -78,6 +79,15 @@ DATABASES = {
     'default': dj_database_url.parse(database_url, conn_max_age=600)
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Web and job worker processes write concurrently: take the write lock
+    # when a transaction starts (waiting up to `timeout` seconds) instead of
+    # failing with "database is locked" when a read transaction upgrades.
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    })
+
 # Log active DB (remove or disable in production if needed)
 print(f"[ENV DEBUG] Active DB URL: {database_url}", file=sys.stderr)
 
@@ -105,17 +115,36 @@ USE_TZ = True
 # CACHE CONFIGURATION
 # =============================================================================
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'TIMEOUT': 300,  # Default timeout of 5 minutes
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
-            'CULL_FREQUENCY': 3,  # Remove 1/3 of cache when MAX_ENTRIES is reached
+# The default backend is a SQLite file shared by every worker process on the
+# host, so invalidations reach all gunicorn workers and hit/miss/eviction
+# counters are available (see core.cache). CACHE_BACKEND=locmem restores the
+# old per-process cache.
+CACHE_BACKEND = config("CACHE_BACKEND", default="sqlite")
+
+if CACHE_BACKEND == "locmem":
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+            'TIMEOUT': 300,  # Default timeout of 5 minutes
+            'OPTIONS': {
+                'MAX_ENTRIES': 1000,
+                'CULL_FREQUENCY': 3,  # Remove 1/3 of cache when MAX_ENTRIES is reached
+            }
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': config("CACHE_LOCATION", default=str(BASE_DIR / 'cache.sqlite3')),
+            'TIMEOUT': 300,  # Default timeout of 5 minutes
+            'OPTIONS': {
+                'MAX_ENTRIES': config("CACHE_MAX_ENTRIES", default=5000, cast=int),
+                'CULL_FREQUENCY': 3,  # Remove 1/3 of cache when MAX_ENTRIES is reached
+            }
         }
     }
-}
 
 # For production, consider using Redis or Memcached:
 # CACHES = {
@@ -129,6 +158,57 @@ CACHES = {
 #     }
 # }
 
+# =============================================================================
+# INVOICE NUMBERING
+# =============================================================================
+
+# Numbers reserved per counter UPDATE by each worker. 1 keeps numbers strictly
+# sequential; larger blocks reduce contention on the counter row at peak hours.
+INVOICE_NUMBER_BLOCK_SIZE = config("INVOICE_NUMBER_BLOCK_SIZE", default=1, cast=int)
+
+# =============================================================================
+# SCHEDULED TASKS
+# =============================================================================
+
+# Seconds between overdue sweeps run as a periodic background job by
+# `manage.py run_jobs` (0 disables it; run `manage.py sweep_overdue_invoices`
+# from cron instead).
+OVERDUE_SWEEP_INTERVAL = config("OVERDUE_SWEEP_INTERVAL", default=0, cast=int)
+
+# =============================================================================
+# BACKGROUND JOBS
+# =============================================================================
+
+# Imports, analytics refreshes and cache warming are queued as core.Job rows
+# and run by `manage.py run_jobs` (one or more worker processes).
+JOB_WORKER_PROCESSES = config("JOB_WORKER_PROCESSES", default=2, cast=int)
+JOB_POLL_INTERVAL = config("JOB_POLL_INTERVAL", default=2, cast=float)
+# Failed attempts are retried after JOB_RETRY_BASE_DELAY * 2 ** (attempt - 1)
+# seconds, at most JOB_RETRY_MAX_DELAY
+JOB_RETRY_BASE_DELAY = config("JOB_RETRY_BASE_DELAY", default=30, cast=int)
+JOB_RETRY_MAX_DELAY = config("JOB_RETRY_MAX_DELAY", default=3600, cast=int)
+# Workers touch their running jobs every JOB_HEARTBEAT_INTERVAL seconds; running
+# jobs without a heartbeat for JOB_STALE_AFTER seconds are assumed lost and requeued
+JOB_HEARTBEAT_INTERVAL = config("JOB_HEARTBEAT_INTERVAL", default=30, cast=int)
+JOB_STALE_AFTER = config("JOB_STALE_AFTER", default=300, cast=int)
+
+# =============================================================================
+# PRODUCT SEARCH
+# =============================================================================
+
+# "auto" searches through the database (pg_trgm indexes) on PostgreSQL and an
+# in-process prefix/trigram index elsewhere; "database" or "memory" forces one.
+PRODUCT_SEARCH_BACKEND = config("PRODUCT_SEARCH_BACKEND", default="auto")
+
+# =============================================================================
+# CUSTOMERS
+# =============================================================================
+
+# Invoices are linked to a Customer by phone number. Numbers are compared on
+# their last CUSTOMER_PHONE_DIGITS digits so that local (0712...) and
+# international (+254 712...) spellings of the same number match.
+CUSTOMER_PHONE_DIGITS = config("CUSTOMER_PHONE_DIGITS", default=9, cast=int)
+
 # =============================================================================
 # STATIC & MEDIA FILES
 # =============================================================================